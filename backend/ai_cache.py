@@ -0,0 +1,276 @@
+"""
+StudyVerse AI Response Cache
+Content-addressed cache for OpenAI-backed generators with an in-process LRU
+tier and an optional shared SQLite/PostgreSQL tier
+"""
+
+import os
+import json
+import time
+import hashlib
+import threading
+from ttl_cache import TTLCache
+
+
+def normalize_text(text):
+    """Collapse whitespace so trivially different pastes share a cache entry"""
+    return ' '.join((text or '').split())
+
+
+def make_cache_key(kind, text, age_group, count, model, prompt_version):
+    """Stable SHA-256 key over the normalized generator inputs"""
+    material = json.dumps({
+        'kind': kind,
+        'text': normalize_text(text),
+        'age_group': (age_group or '').strip().lower(),
+        'count': count,
+        'model': model,
+        'prompt_version': prompt_version,
+    }, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+
+def create_sqlite_cache_schema(cursor):
+    """DDL for the SQLite cache tier, applied by migrations.py"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS ai_response_cache (
+            cache_key TEXT PRIMARY KEY,
+            value TEXT NOT NULL,
+            created_at REAL NOT NULL
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_ai_response_cache_created
+        ON ai_response_cache (created_at)
+    ''')
+
+
+class SQLiteCacheBackend:
+    """Shared cache tier stored in the embedded SQLite database"""
+
+    name = 'sqlite'
+
+    def __init__(self, connection):
+        # ``connection`` is a context-manager factory such as auth_sqlite.db_connection,
+        # which applies the migrations (create_sqlite_cache_schema) on first use
+        self._connection = connection
+
+    def get(self, key):
+        with self._connection() as conn:
+            row = conn.execute(
+                'SELECT value, created_at FROM ai_response_cache WHERE cache_key = ?', (key,)
+            ).fetchone()
+        return (json.loads(row['value']), row['created_at']) if row else None
+
+    def set(self, key, value):
+        with self._connection() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO ai_response_cache (cache_key, value, created_at) VALUES (?, ?, ?)',
+                (key, json.dumps(value), time.time())
+            )
+            conn.commit()
+
+    def prune(self, max_age, limit):
+        """Delete up to ``limit`` entries older than ``max_age`` seconds; returns how many"""
+        with self._connection() as conn:
+            cursor = conn.execute('''
+                DELETE FROM ai_response_cache WHERE cache_key IN (
+                    SELECT cache_key FROM ai_response_cache WHERE created_at < ? LIMIT ?
+                )
+            ''', (time.time() - max_age, limit))
+            conn.commit()
+        return cursor.rowcount
+
+
+def create_cache_schema(cursor):
+    """DDL for the shared Postgres cache tier, applied by migrations.py"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS ai_response_cache (
+            cache_key CHAR(64) PRIMARY KEY,
+            value JSONB NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+
+def create_cache_expiry_index(cursor):
+    """Index that lets prune() find expired Postgres cache entries"""
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_ai_response_cache_created
+        ON ai_response_cache (created_at)
+    ''')
+
+
+class PostgresCacheBackend:
+    """Shared cache tier stored in the application's PostgreSQL database"""
+
+    name = 'postgres'
+
+    def __init__(self, connection):
+        # ``connection`` is a context-manager factory such as auth_postgresql.db_connection;
+        # the table comes from migrations.py (create_cache_schema)
+        self._connection = connection
+
+    def get(self, key):
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT value, EXTRACT(EPOCH FROM created_at) AS created_at
+                FROM ai_response_cache WHERE cache_key = %s
+            ''', (key,))
+            row = cursor.fetchone()
+            cursor.close()
+        return (row['value'], float(row['created_at'])) if row else None
+
+    def set(self, key, value):
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT INTO ai_response_cache (cache_key, value, created_at)
+                VALUES (%s, %s, CURRENT_TIMESTAMP)
+                ON CONFLICT (cache_key) DO UPDATE
+                SET value = EXCLUDED.value, created_at = EXCLUDED.created_at
+            ''', (key, json.dumps(value)))
+            conn.commit()
+            cursor.close()
+
+    def prune(self, max_age, limit):
+        """Delete up to ``limit`` entries older than ``max_age`` seconds; returns how many"""
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            # SKIP LOCKED so workers pruning at the same time split the work
+            cursor.execute('''
+                DELETE FROM ai_response_cache WHERE cache_key IN (
+                    SELECT cache_key FROM ai_response_cache
+                    WHERE created_at < CURRENT_TIMESTAMP - make_interval(secs => %s)
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                )
+            ''', (max_age, limit))
+            deleted = cursor.rowcount
+            conn.commit()
+            cursor.close()
+        return deleted
+
+
+class AIResponseCache:
+    """Two-tier cache: in-process LRU in front of an optional shared backend.
+
+    Backend failures are logged and treated as misses so a cache outage never
+    fails a request. Every ``prune_every`` stores, up to ``prune_limit``
+    expired backend entries are deleted so the shared table stays bounded.
+    """
+
+    def __init__(self, maxsize=2048, ttl=86400, backend=None, prune_every=500, prune_limit=1000):
+        self.ttl = ttl
+        self.backend = backend
+        self.prune_every = prune_every
+        self.prune_limit = prune_limit
+        self.pruned = 0
+        self._memory = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        self.backend_hits = 0
+        self.backend_misses = 0
+        self.backend_errors = 0
+        self.stores = 0
+
+    def get(self, key):
+        value = self._memory.get(key)
+        if value is not None or self.backend is None:
+            return value
+
+        try:
+            entry = self.backend.get(key)
+        except Exception as e:
+            print(f"AI cache backend read error: {e}")
+            with self._lock:
+                self.backend_errors += 1
+            return None
+
+        if entry is not None:
+            value, created_at = entry
+            if self.ttl is None or time.time() - created_at < self.ttl:
+                with self._lock:
+                    self.backend_hits += 1
+                self._memory.set(key, value)
+                return value
+
+        with self._lock:
+            self.backend_misses += 1
+        return None
+
+    def set(self, key, value):
+        self._memory.set(key, value)
+        with self._lock:
+            self.stores += 1
+            prune = bool(self.prune_every) and self.stores % self.prune_every == 0
+        if self.backend is not None:
+            try:
+                self.backend.set(key, value)
+            except Exception as e:
+                print(f"AI cache backend write error: {e}")
+                with self._lock:
+                    self.backend_errors += 1
+            if prune:
+                self.prune()
+
+    def prune(self):
+        """Delete a bounded batch of expired backend entries; returns how many"""
+        if self.backend is None or self.ttl is None:
+            return 0
+        try:
+            deleted = self.backend.prune(self.ttl, self.prune_limit)
+        except Exception as e:
+            print(f"AI cache backend prune error: {e}")
+            with self._lock:
+                self.backend_errors += 1
+            return 0
+        with self._lock:
+            self.pruned += deleted
+        return deleted
+
+    def clear(self):
+        self._memory.clear()
+
+    def stats(self):
+        memory = self._memory.stats()
+        with self._lock:
+            hits = memory['hits'] + self.backend_hits
+            lookups = memory['hits'] + memory['misses']
+            return {
+                'memory': memory,
+                'backend': self.backend.name if self.backend else None,
+                'backend_hits': self.backend_hits,
+                'backend_misses': self.backend_misses,
+                'backend_errors': self.backend_errors,
+                'stores': self.stores,
+                'pruned': self.pruned,
+                'hits': hits,
+                'misses': lookups - hits,
+                'hit_rate': round(hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+def ai_cache_from_env():
+    """Build the response cache described by AI_CACHE_* environment variables"""
+    backend_name = os.environ.get('AI_CACHE_BACKEND', 'memory').lower()
+    backend = None
+    try:
+        if backend_name == 'sqlite':
+            from auth_sqlite import db_connection
+            backend = SQLiteCacheBackend(db_connection)
+        elif backend_name == 'postgres':
+            from auth_postgresql import db_connection
+            backend = PostgresCacheBackend(db_connection)
+    except Exception as e:
+        print(f"⚠️ AI cache backend '{backend_name}' unavailable, using memory only: {e}")
+        backend = None
+
+    ttl = float(os.environ.get('AI_CACHE_TTL', 86400))
+    return AIResponseCache(
+        maxsize=int(os.environ.get('AI_CACHE_MAX_SIZE', 2048)),
+        ttl=ttl if ttl > 0 else None,
+        backend=backend,
+        prune_every=int(os.environ.get('AI_CACHE_PRUNE_EVERY', 500)),
+        prune_limit=int(os.environ.get('AI_CACHE_PRUNE_LIMIT', 1000)),
+    )
@@ -0,0 +1,360 @@
+"""
+StudyVerse Resilient AI Client
+Wraps the OpenAI client with per-task deadlines, bounded retries with
+jittered exponential backoff, a circuit breaker that fails fast while the
+upstream is unhealthy, and optional hedged requests for tail latency
+"""
+
+import os
+import time
+import random
+import threading
+from collections import Counter
+from contextvars import ContextVar
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import openai
+
+# Seconds each task may spend on the API, across all retries and hedges
+DEFAULT_DEADLINES = {
+    'analysis': 30.0,
+    'flashcards': 30.0,
+    'quiz': 30.0,
+    'study_pack': 60.0,
+    'syllabus': 45.0,
+    'report_card': 45.0,
+}
+
+
+class AIUnavailableError(Exception):
+    """Raised instead of calling the API (circuit open or no API key configured)"""
+
+    def __init__(self, message, reason='circuit_open'):
+        super().__init__(message)
+        self.reason = reason
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a task's deadline passes before any attempt succeeds"""
+
+
+def is_retryable(error):
+    """Timeouts, connection failures, rate limits and 5xx responses"""
+    if isinstance(error, (openai.APIConnectionError, openai.RateLimitError, DeadlineExceeded)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in (408, 409) or error.status_code >= 500
+    return False
+
+
+def degraded_reason(error):
+    """Short label for why a fallback replaced a generated result"""
+    if isinstance(error, AIUnavailableError):
+        return error.reason
+    if isinstance(error, (openai.APITimeoutError, DeadlineExceeded)):
+        return 'timeout'
+    return 'ai_error'
+
+
+# Fallbacks served during the current request: routes set a list, the
+# generators append the reason (e.g. 'circuit_open', 'ai_error')
+degraded_reasons = ContextVar('ai_degraded_reasons', default=None)
+_fallback_lock = threading.Lock()
+fallback_counts = Counter()
+
+def note_degraded(reason):
+    """Record that a degraded (fallback) result is being served"""
+    with _fallback_lock:
+        fallback_counts[reason] += 1
+    reasons = degraded_reasons.get()
+    if reasons is not None:
+        reasons.append(reason)
+
+def fallback_totals():
+    """Fallback results served so far, by reason"""
+    with _fallback_lock:
+        return dict(fallback_counts)
+
+
+class CircuitBreaker:
+    """Opens after ``failure_threshold`` consecutive upstream failures.
+
+    While open, calls are refused for ``reset_timeout`` seconds; then a
+    single probe is let through (half-open) and its outcome closes or
+    re-opens the circuit.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self.opened = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == self.OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def allow(self):
+        """Whether a call may go upstream now (claims the probe when half-open)"""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN:
+                if self._clock() - self._opened_at < self.reset_timeout:
+                    return False
+                self._state = self.HALF_OPEN
+                self._probing = False
+            if self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probing = False
+
+    def release(self):
+        """Give up a claimed probe without an outcome (the call was abandoned)"""
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    self.opened += 1
+                self._state = self.OPEN
+                self._opened_at = self._clock()
+                self._probing = False
+
+
+class ResilientChatClient:
+    """Chat completions with deadlines, retries, a circuit breaker and hedging.
+
+    ``client`` is an ``openai.OpenAI`` instance, ideally built with
+    ``max_retries=0`` so retry policy lives here. Each call gets the task's
+    deadline; every attempt's HTTP timeout is what remains of it. Retryable
+    failures are retried up to ``max_retries`` times with full-jitter
+    exponential backoff. With ``hedge_after`` set, an attempt still running
+    after that many seconds is raced against a duplicate request and the
+    first success wins (this costs the extra tokens of the duplicate).
+    """
+
+    def __init__(self, client, deadlines=None, max_retries=2, backoff_base=0.5, backoff_max=8.0,
+                 breaker=None, hedge_after=0.0, hedge_workers=8):
+        self.client = client
+        self.deadlines = dict(DEFAULT_DEADLINES, **(deadlines or {}))
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker()
+        self.hedge_after = hedge_after
+        self._hedge_pool = ThreadPoolExecutor(max_workers=hedge_workers, thread_name_prefix='ai-hedge') if hedge_after else None
+        self._lock = threading.Lock()
+        self._stats = Counter()
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._stats[name] += amount
+
+    def deadline_for(self, task):
+        return self.deadlines.get(task, max(self.deadlines.values()))
+
+    def is_open(self):
+        """True while calls would be refused (does not claim a half-open probe)"""
+        return self.breaker.state == CircuitBreaker.OPEN
+
+    def _refuse(self):
+        self._count('short_circuited')
+        raise AIUnavailableError("AI service temporarily unavailable")
+
+    def _backoff(self, attempt, error, remaining):
+        """Seconds to wait before retry ``attempt`` (1-based), honoring Retry-After"""
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** (attempt - 1))))
+        response = getattr(error, 'response', None)
+        retry_after = response.headers.get('retry-after') if response is not None else None
+        if retry_after:
+            try:
+                delay = max(delay, float(retry_after))
+            except ValueError:
+                pass
+        return delay if delay < remaining else None
+
+    def _attempt(self, kwargs, timeout):
+        return self.client.chat.completions.create(timeout=timeout, **kwargs)
+
+    def _hedged_attempt(self, kwargs, deadline):
+        """Run one attempt, racing a duplicate if it is slower than hedge_after"""
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise DeadlineExceeded("AI request deadline exceeded")
+        if not self._hedge_pool or remaining <= self.hedge_after:
+            return self._attempt(kwargs, remaining)
+        primary = self._hedge_pool.submit(self._attempt, kwargs, remaining)
+        done, _ = wait([primary], timeout=self.hedge_after)
+        if done:
+            return primary.result()
+        self._count('hedged')
+        hedge = self._hedge_pool.submit(self._attempt, kwargs, deadline - time.monotonic())
+        pending, error = {primary, hedge}, None
+        while pending:
+            done, pending = wait(pending, timeout=max(0.0, deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                if future.exception() is None:
+                    if future is hedge:
+                        self._count('hedge_wins')
+                    return future.result()
+                error = future.exception()
+        raise error or DeadlineExceeded("AI request deadline exceeded")
+
+    def create(self, task, **kwargs):
+        """Non-streaming chat completion for ``task`` within its deadline"""
+        if not self.breaker.allow():
+            self._refuse()
+        self._count('calls')
+        deadline = time.monotonic() + self.deadline_for(task)
+        attempt = 0
+        while True:
+            attempt += 1
+            self._count('attempts')
+            try:
+                response = self._hedged_attempt(kwargs, deadline)
+            except Exception as e:
+                if not is_retryable(e):
+                    # The upstream answered; the request itself was bad
+                    self.breaker.record_success()
+                    self._count('errors')
+                    raise
+                self._count('timeouts' if isinstance(e, (openai.APITimeoutError, DeadlineExceeded)) else 'upstream_errors')
+                remaining = deadline - time.monotonic()
+                delay = self._backoff(attempt, e, remaining) if attempt <= self.max_retries else None
+                if delay is None:
+                    self.breaker.record_failure()
+                    self._count('failed')
+                    raise
+                self._count('retries')
+                time.sleep(delay)
+                continue
+            self.breaker.record_success()
+            return response
+
+    def stream(self, task, **kwargs):
+        """Start a streaming completion (one attempt; retries could duplicate output).
+
+        Returns an iterator of chunks; the breaker is updated when it is
+        exhausted or fails. The HTTP timeout only bounds each read, so the
+        iterator closes the stream and raises DeadlineExceeded once the
+        task's deadline has passed.
+        """
+        if not self.breaker.allow():
+            self._refuse()
+        self._count('calls')
+        self._count('attempts')
+        deadline = time.monotonic() + self.deadline_for(task)
+        try:
+            stream = self.client.chat.completions.create(timeout=self.deadline_for(task), stream=True, **kwargs)
+        except Exception as e:
+            self._record_stream_failure(e)
+            raise
+        return self._watch_stream(stream, deadline)
+
+    def _watch_stream(self, stream, deadline):
+        settled = False
+        try:
+            for chunk in stream:
+                if time.monotonic() > deadline:
+                    self._count('timeouts')
+                    raise DeadlineExceeded("AI stream deadline exceeded")
+                yield chunk
+        except Exception as e:
+            settled = True
+            self._record_stream_failure(e)
+            raise
+        else:
+            settled = True
+            self.breaker.record_success()
+        finally:
+            if not settled:
+                # Abandoned by the consumer (e.g. the client disconnected):
+                # no verdict on the upstream, but a claimed probe must be freed
+                self.breaker.release()
+                self._count('abandoned')
+            close = getattr(stream, 'close', None)
+            if close:
+                close()
+
+    def _record_stream_failure(self, error):
+        if is_retryable(error):
+            self.breaker.record_failure()
+            self._count('failed')
+        else:
+            self.breaker.record_success()
+            self._count('errors')
+
+    def ping(self, model, timeout=3.0):
+        """Cheap upstream check (retrieves a model, no tokens); refused while the circuit is open"""
+        if self.is_open():
+            raise AIUnavailableError("Circuit breaker open")
+        self.client.models.retrieve(model, timeout=timeout)
+        return {'circuit_state': self.breaker.state}
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        fallbacks = fallback_totals()
+        stats.update({
+            'circuit_state': self.breaker.state,
+            'circuit_opened': self.breaker.opened,
+            'deadlines': self.deadlines,
+            'max_retries': self.max_retries,
+            'hedge_after': self.hedge_after,
+            'fallbacks': fallbacks,
+        })
+        return stats
+
+
+def parse_deadlines(spec):
+    """Parse ``"analysis=20,study_pack=45"`` into {task: seconds}"""
+    deadlines = {}
+    for part in (spec or '').split(','):
+        task, _, seconds = part.partition('=')
+        if task.strip() and seconds.strip():
+            deadlines[task.strip()] = float(seconds)
+    return deadlines
+
+def resilient_client_from_env():
+    """Build the wrapped OpenAI client from OPENAI_* and AI_* environment variables, or None without a key"""
+    if not os.environ.get('OPENAI_API_KEY'):
+        return None
+    client = openai.OpenAI(
+        api_key=os.environ.get('OPENAI_API_KEY'),
+        base_url=os.environ.get('OPENAI_API_BASE', 'https://api.openai.com/v1'),
+        max_retries=0,
+    )
+    breaker = CircuitBreaker(
+        failure_threshold=int(os.environ.get('AI_CIRCUIT_FAILURES', 5)),
+        reset_timeout=float(os.environ.get('AI_CIRCUIT_RESET', 30)),
+    )
+    return ResilientChatClient(
+        client,
+        deadlines=parse_deadlines(os.environ.get('AI_DEADLINES')),
+        max_retries=int(os.environ.get('AI_MAX_RETRIES', 2)),
+        backoff_base=float(os.environ.get('AI_RETRY_BACKOFF', 0.5)),
+        breaker=breaker,
+        hedge_after=float(os.environ.get('AI_HEDGE_AFTER', 0)),
+    )
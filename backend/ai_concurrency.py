@@ -0,0 +1,103 @@
+"""
+StudyVerse AI Concurrency Control
+Bounds how many OpenAI calls a worker process runs at once and how many
+requests may queue for a slot, so slow generations cannot take every thread
+"""
+
+import os
+import time
+import threading
+from contextlib import contextmanager
+
+
+class AIBusyError(Exception):
+    """Raised when the AI queue is full or a slot could not be acquired in time"""
+
+    def __init__(self, message, retry_after=5):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class ConcurrencyLimiter:
+    """Admission control for upstream model calls.
+
+    At most ``max_concurrency`` calls run at once; up to ``max_queue`` more
+    wait for at most ``queue_timeout`` seconds. Anything beyond that is
+    rejected immediately with AIBusyError so the caller can answer 503 and
+    the worker thread is freed for health checks and auth routes.
+    """
+
+    def __init__(self, max_concurrency=8, max_queue=4, queue_timeout=10.0):
+        if max_concurrency < 1 or max_queue < 0:
+            raise ValueError("Invalid limits: max_concurrency=%s max_queue=%s" % (max_concurrency, max_queue))
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._waiting = 0
+        self._stats = {
+            'admitted': 0,
+            'rejected_queue_full': 0,
+            'rejected_timeout': 0,
+            'queue_wait_total': 0.0,
+        }
+
+    @contextmanager
+    def slot(self):
+        """Hold one concurrency slot for the duration of a with-block"""
+        start = time.monotonic()
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                if self._waiting >= self.max_queue:
+                    self._stats['rejected_queue_full'] += 1
+                    raise AIBusyError("AI service is busy, please retry shortly",
+                                      retry_after=max(1, int(self.queue_timeout)))
+                self._waiting += 1
+            try:
+                acquired = self._slots.acquire(timeout=self.queue_timeout)
+            finally:
+                with self._lock:
+                    self._waiting -= 1
+            if not acquired:
+                with self._lock:
+                    self._stats['rejected_timeout'] += 1
+                raise AIBusyError("Timed out waiting for an AI slot, please retry shortly",
+                                  retry_after=max(1, int(self.queue_timeout)))
+
+        with self._lock:
+            self._in_flight += 1
+            self._stats['admitted'] += 1
+            self._stats['queue_wait_total'] += time.monotonic() - start
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+            self._slots.release()
+
+    def run(self, fn, *args, **kwargs):
+        """Call ``fn`` while holding a slot"""
+        with self.slot():
+            return fn(*args, **kwargs)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['in_flight'] = self._in_flight
+            stats['waiting'] = self._waiting
+        stats['max_concurrency'] = self.max_concurrency
+        stats['max_queue'] = self.max_queue
+        admitted = stats['admitted']
+        stats['avg_queue_wait_ms'] = round(stats.pop('queue_wait_total') / admitted * 1000, 3) if admitted else 0.0
+        return stats
+
+
+def limiter_from_env():
+    """Build the AI limiter from AI_MAX_CONCURRENCY/AI_MAX_QUEUE/AI_QUEUE_TIMEOUT"""
+    return ConcurrencyLimiter(
+        max_concurrency=int(os.environ.get('AI_MAX_CONCURRENCY', 8)),
+        max_queue=int(os.environ.get('AI_MAX_QUEUE', 4)),
+        queue_timeout=float(os.environ.get('AI_QUEUE_TIMEOUT', 10)),
+    )
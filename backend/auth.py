@@ -1,94 +1,206 @@
 """
 StudyVerse Authentication Module
-Handles user registration, login, and session management
+Handles user registration, login, and session management on top of a
+pluggable storage backend (auth_postgresql or auth_sqlite)
 """
 
 import os
 import jwt
-import bcrypt
-import sqlite3
+import hmac
+import time
+import importlib
 from datetime import datetime, timedelta
 from functools import wraps
 from flask import request, jsonify, current_app
+from principal_cache import principal_cache_from_env
+from password_hashing import password_hasher
+from metrics import DB_BUCKETS, Histogram, registry
+from profiler import record_span
 
-# Database setup
-def init_db():
-    """Initialize the user database"""
-    conn = sqlite3.connect('studyverse_users.db')
-    cursor = conn.cursor()
-    
-    # Users table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            email TEXT UNIQUE NOT NULL,
-            password_hash TEXT NOT NULL,
-            first_name TEXT NOT NULL,
-            last_name TEXT NOT NULL,
-            age_group TEXT NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            last_login TIMESTAMP,
-            is_active BOOLEAN DEFAULT 1,
-            profile_data TEXT DEFAULT '{}'
-        )
-    ''')
-    
-    # User progress table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS user_progress (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            subject TEXT NOT NULL,
-            activity_type TEXT NOT NULL,
-            content TEXT,
-            score INTEGER,
-            completed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users (id)
-        )
-    ''')
-    
-    # User sessions table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS user_sessions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            session_token TEXT UNIQUE NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            expires_at TIMESTAMP NOT NULL,
-            is_active BOOLEAN DEFAULT 1,
-            FOREIGN KEY (user_id) REFERENCES users (id)
-        )
-    ''')
-    
-    conn.commit()
-    conn.close()
-
-def hash_password(password):
-    """Hash a password using bcrypt"""
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
-
-def verify_password(password, password_hash):
-    """Verify a password against its hash"""
-    return bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
-
-def generate_token(user_id, email):
-    """Generate JWT token for user authentication"""
-    payload = {
-        'user_id': user_id,
-        'email': email,
-        'exp': datetime.utcnow() + timedelta(days=7),  # Token expires in 7 days
-        'iat': datetime.utcnow()
-    }
-    return jwt.encode(payload, current_app.config['SECRET_KEY'], algorithm='HS256')
-
-def verify_token(token):
-    """Verify JWT token and return user data"""
+# Storage backends and the functions each must provide. Both return plain
+# dicts (or lists of dicts) and None for "not found", never driver rows.
+BACKENDS = {
+    'postgres': 'auth_postgresql',
+    'sqlite': 'auth_sqlite',
+}
+REPOSITORY_FUNCTIONS = (
+    'init_db',
+    'create_user',
+    'authenticate_user',
+    'get_user_profile',
+    'update_user_profile',
+    'deactivate_user',
+    'save_user_progress',
+    'save_progress_events',
+    'get_user_progress',
+    'get_progress_version',
+    'save_syllabus_upload',
+    'save_report_card',
+    'find_stored_analysis',
+    'list_stored_analyses',
+    'reserve_token_usage',
+    'add_token_usage',
+    'get_token_usage',
+    'ping',
+)
+
+def backend_name_from_env():
+    """AUTH_BACKEND if set, otherwise PostgreSQL when DATABASE_URL is configured"""
+    default = 'postgres' if os.environ.get('DATABASE_URL') else 'sqlite'
+    return os.environ.get('AUTH_BACKEND', default).lower()
+
+def load_repository(name):
+    """Import a storage backend module and check it implements the interface"""
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown AUTH_BACKEND '{name}', expected one of {', '.join(BACKENDS)}")
+    module = importlib.import_module(BACKENDS[name])
+    missing = [fn for fn in REPOSITORY_FUNCTIONS if not callable(getattr(module, fn, None))]
+    if missing:
+        raise TypeError(f"{module.__name__} does not implement: {', '.join(missing)}")
+    return module
+
+# Verified principals for require_auth, keyed by user id and token
+principal_cache = principal_cache_from_env()
+
+def get_principal_cache_stats():
+    """Export principal cache statistics including the hit rate"""
+    return principal_cache.stats()
+
+def get_password_hashing_stats():
+    """Export password hashing pool statistics including queue wait times"""
+    return password_hasher.stats()
+
+# Latency of every storage call (including password hashing for
+# create_user/authenticate_user), exported at /api/metrics
+db_query_seconds = registry.register(Histogram(
+    'db_query_duration_seconds', 'Storage backend call latency', DB_BUCKETS, ('backend', 'operation')
+))
+
+class TimedRepository:
+    """Storage backend proxy that records each interface call in db_query_seconds and the request profile"""
+
+    def __init__(self, module):
+        self.module = module
+        self.backend = {module_name: name for name, module_name in BACKENDS.items()}.get(module.__name__, module.__name__)
+
+    def __getattr__(self, attr):
+        value = getattr(self.module, attr)
+        if attr not in REPOSITORY_FUNCTIONS:
+            return value
+
+        @wraps(value)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return value(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                db_query_seconds.observe(elapsed, backend=self.backend, operation=attr)
+                record_span('db', attr, start, elapsed)
+
+        # Cache the wrapper so later lookups skip __getattr__
+        setattr(self, attr, timed)
+        return timed
+
+repository = TimedRepository(load_repository(backend_name_from_env()))
+
+def set_repository(module):
+    """Swap the storage backend (e.g. to run the same checks against both)"""
+    global repository
+    repository = TimedRepository(module)
+    principal_cache.clear()
+
+# Repository interface
+def create_user(email, password, first_name, last_name, age_group):
+    """Create a new user account; returns the user, or None if the email is taken"""
+    return repository.create_user(email, password, first_name, last_name, age_group)
+
+def authenticate_user(email, password):
+    """Return the user for valid credentials of an active account, else None"""
+    return repository.authenticate_user(email, password)
+
+def get_user_profile(user_id):
+    """Get an active user's profile, or None"""
+    return repository.get_user_profile(user_id)
+
+def update_user_profile(user_id, **fields):
+    """Update editable profile fields and drop the user's cached principals"""
     try:
-        payload = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=['HS256'])
-        return payload
-    except jwt.ExpiredSignatureError:
-        return None
-    except jwt.InvalidTokenError:
+        return repository.update_user_profile(user_id, **fields)
+    finally:
+        principal_cache.invalidate_user(user_id)
+
+def deactivate_user(user_id):
+    """Deactivate a user account and revoke its cached principals"""
+    try:
+        return repository.deactivate_user(user_id)
+    finally:
+        principal_cache.invalidate_user(user_id)
+
+def save_user_progress(user_id, subject, activity_type, content=None, score=None):
+    """Save one progress event; returns its id and completed_at"""
+    return repository.save_user_progress(user_id, subject, activity_type, content, score)
+
+def save_progress_events(events):
+    """Save a batch of progress events in one transaction; returns the count"""
+    return repository.save_progress_events(events)
+
+def get_user_progress(user_id):
+    """Progress statistics and the ten most recent activities"""
+    return repository.get_user_progress(user_id)
+
+def get_progress_version(user_id):
+    """total_sessions and last_activity, for cheap change detection"""
+    return repository.get_progress_version(user_id)
+
+def save_syllabus_upload(user_id, filename, content, analysis, content_hash=None):
+    """Store an analyzed syllabus upload; returns its id and uploaded_at"""
+    return repository.save_syllabus_upload(user_id, filename, content, analysis, content_hash)
+
+def save_report_card(user_id, filename, analysis, content_hash=None):
+    """Store an analyzed report card; returns its id and uploaded_at"""
+    return repository.save_report_card(user_id, filename, analysis, content_hash)
+
+def find_stored_analysis(table, content_hash, user_id=None):
+    """Most recent stored analysis of an upload with this content hash"""
+    return repository.find_stored_analysis(table, content_hash, user_id)
+
+def list_stored_analyses(table, user_id, limit=20, before=None):
+    """One page of a user's stored analyses, newest first; returns (rows, has_more)"""
+    return repository.list_stored_analyses(table, user_id, limit, before)
+
+def reserve_token_usage(subject, day, tokens, limit):
+    """Atomically add to a subject's daily AI token usage unless it would exceed the limit"""
+    return repository.reserve_token_usage(subject, day, tokens, limit)
+
+def add_token_usage(subject, day, tokens):
+    """Adjust a subject's daily AI token usage; returns the new total"""
+    return repository.add_token_usage(subject, day, tokens)
+
+def get_token_usage(subject, day):
+    """A subject's AI token usage for one day"""
+    return repository.get_token_usage(subject, day)
+
+def ping_database():
+    """Check the storage backend answers a trivial query; raises otherwise"""
+    repository.ping()
+
+# Tokens and route protection
+def generate_token(user_data):
+    """Generate JWT token for user"""
+    try:
+        payload = {
+            'user_id': user_data['id'],
+            'email': user_data['email'],
+            'exp': datetime.utcnow() + timedelta(days=7)  # Token expires in 7 days
+        }
+        
+        secret_key = current_app.config['SECRET_KEY']
+        token = jwt.encode(payload, secret_key, algorithm='HS256')
+        return token
+    
+    except Exception as e:
+        print(f"Token generation error: {e}")
         return None
 
 def require_auth(f):
@@ -96,165 +208,71 @@ def require_auth(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
         token = request.headers.get('Authorization')
+        
         if not token:
             return jsonify({'error': 'No token provided'}), 401
         
-        if token.startswith('Bearer '):
-            token = token[7:]
-        
-        payload = verify_token(token)
-        if not payload:
-            return jsonify({'error': 'Invalid or expired token'}), 401
+        try:
+            # Remove 'Bearer ' prefix if present
+            if token.startswith('Bearer '):
+                token = token[7:]
+            
+            secret_key = current_app.config['SECRET_KEY']
+            payload = jwt.decode(token, secret_key, algorithms=['HS256'])
+            
+            # Get current user data, served from the principal cache when possible
+            user = principal_cache.get(payload['user_id'], token)
+            if user is None:
+                user = get_user_profile(payload['user_id'])
+                if not user:
+                    return jsonify({'error': 'Invalid token'}), 401
+                principal_cache.set(payload['user_id'], token, user)
+            user = dict(user)
+            
+            # Add user to request context
+            request.current_user = user
         
-        # Add user info to request context
-        request.user_id = payload['user_id']
-        request.user_email = payload['email']
+        except jwt.ExpiredSignatureError:
+            return jsonify({'error': 'Token has expired'}), 401
+        except jwt.InvalidTokenError:
+            return jsonify({'error': 'Invalid token'}), 401
+        except Exception as e:
+            print(f"Auth decorator error: {e}")
+            return jsonify({'error': 'Authentication failed'}), 401
         
         return f(*args, **kwargs)
+    
     return decorated_function
 
-def create_user(email, password, first_name, last_name, age_group):
-    """Create a new user account"""
-    try:
-        conn = sqlite3.connect('studyverse_users.db')
-        cursor = conn.cursor()
-        
-        # Check if user already exists
-        cursor.execute('SELECT id FROM users WHERE email = ?', (email,))
-        if cursor.fetchone():
-            conn.close()
-            return None, "User already exists"
-        
-        # Hash password and create user
-        password_hash = hash_password(password)
-        cursor.execute('''
-            INSERT INTO users (email, password_hash, first_name, last_name, age_group)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (email, password_hash, first_name, last_name, age_group))
+def require_admin(f):
+    """Decorator for operator routes: requires the ADMIN_TOKEN in X-Admin-Token (404 when unset)"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        admin_token = os.environ.get('ADMIN_TOKEN')
+        if not admin_token:
+            return jsonify({'error': 'Endpoint not found'}), 404
         
-        user_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
+        token = request.headers.get('X-Admin-Token', '')
+        if not hmac.compare_digest(token.encode('utf-8'), admin_token.encode('utf-8')):
+            return jsonify({'error': 'Invalid admin token'}), 401
         
-        return user_id, None
-    except Exception as e:
-        return None, str(e)
+        return f(*args, **kwargs)
+    
+    return decorated_function
 
-def authenticate_user(email, password):
-    """Authenticate user login"""
-    try:
-        conn = sqlite3.connect('studyverse_users.db')
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT id, password_hash, first_name, last_name, age_group, is_active
-            FROM users WHERE email = ?
-        ''', (email,))
-        
-        user = cursor.fetchone()
-        if not user:
-            conn.close()
-            return None, "Invalid email or password"
-        
-        user_id, password_hash, first_name, last_name, age_group, is_active = user
-        
-        if not is_active:
-            conn.close()
-            return None, "Account is deactivated"
-        
-        if not verify_password(password, password_hash):
-            conn.close()
-            return None, "Invalid email or password"
-        
-        # Update last login
-        cursor.execute('UPDATE users SET last_login = CURRENT_TIMESTAMP WHERE id = ?', (user_id,))
-        conn.commit()
-        conn.close()
-        
-        return {
-            'id': user_id,
-            'email': email,
-            'first_name': first_name,
-            'last_name': last_name,
-            'age_group': age_group
-        }, None
-    except Exception as e:
-        return None, str(e)
+def token_user_id():
+    """User id from a valid bearer token on the current request, else None.
 
-def get_user_profile(user_id):
-    """Get user profile information"""
-    try:
-        conn = sqlite3.connect('studyverse_users.db')
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT email, first_name, last_name, age_group, created_at, last_login, profile_data
-            FROM users WHERE id = ? AND is_active = 1
-        ''', (user_id,))
-        
-        user = cursor.fetchone()
-        conn.close()
-        
-        if not user:
-            return None
-        
-        return {
-            'id': user_id,
-            'email': user[0],
-            'first_name': user[1],
-            'last_name': user[2],
-            'age_group': user[3],
-            'created_at': user[4],
-            'last_login': user[5],
-            'profile_data': json.loads(user[6] or '{}')
-        }
-    except Exception as e:
+    For routes that work signed out but attribute usage to the account when
+    a token is sent; the account itself is not looked up.
+    """
+    token = request.headers.get('Authorization', '')
+    if token.startswith('Bearer '):
+        token = token[7:]
+    if not token:
         return None
-
-def save_user_progress(user_id, subject, activity_type, content, score=None):
-    """Save user learning progress"""
     try:
-        conn = sqlite3.connect('studyverse_users.db')
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT INTO user_progress (user_id, subject, activity_type, content, score)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (user_id, subject, activity_type, content, score))
-        
-        conn.commit()
-        conn.close()
-        return True
-    except Exception as e:
-        return False
-
-def get_user_progress(user_id, limit=50):
-    """Get user learning progress history"""
-    try:
-        conn = sqlite3.connect('studyverse_users.db')
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT subject, activity_type, content, score, completed_at
-            FROM user_progress 
-            WHERE user_id = ?
-            ORDER BY completed_at DESC
-            LIMIT ?
-        ''', (user_id, limit))
-        
-        progress = cursor.fetchall()
-        conn.close()
-        
-        return [{
-            'subject': row[0],
-            'activity_type': row[1],
-            'content': row[2],
-            'score': row[3],
-            'completed_at': row[4]
-        } for row in progress]
-    except Exception as e:
-        return []
-
-# Initialize database when module is imported
-init_db()
-
+        payload = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=['HS256'])
+        return payload.get('user_id')
+    except jwt.InvalidTokenError:
+        return None
@@ -1,21 +1,21 @@
 """
 StudyVerse Authentication Module - PostgreSQL Version
-Handles user registration, login, and session management with PostgreSQL
+PostgreSQL storage backend for users, progress and analyses (selected
+through auth.py)
 """
 
 import os
-import jwt
-import bcrypt
 import psycopg2
-from psycopg2.extras import RealDictCursor
-from datetime import datetime, timedelta
-from functools import wraps
-from flask import request, jsonify, current_app
+from psycopg2.extras import RealDictCursor, execute_values
+from contextlib import contextmanager
+import threading
 import json
+from db_pool import ConnectionPool, pool_config_from_env
+from password_hashing import PasswordHashingBusyError, password_hasher
 
 # Database connection
 def get_db_connection():
-    """Get PostgreSQL database connection"""
+    """Open a new PostgreSQL database connection (used by the pool)"""
     database_url = os.environ.get('DATABASE_URL')
     if not database_url:
         raise Exception("DATABASE_URL environment variable not set")
@@ -27,156 +27,262 @@ def get_db_connection():
         print(f"Database connection error: {e}")
         raise
 
-# Database setup
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """Get the process-wide connection pool, creating it on first use"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(get_db_connection, **pool_config_from_env())
+    return _pool
+
+def set_pool(pool):
+    """Replace the connection pool (e.g. with a stand-in for tests)"""
+    global _pool
+    with _pool_lock:
+        old, _pool = _pool, pool
+    if old is not None and old is not pool:
+        old.close()
+
+@contextmanager
+def db_connection():
+    """Check out a pooled connection for the duration of a with-block"""
+    with get_pool().connection() as conn:
+        yield conn
+
+def get_pool_stats():
+    """Export connection pool statistics"""
+    return get_pool().stats() if _pool is not None else {}
+
+# Database setup (schema changes are versioned in migrations.py)
 def init_db():
-    """Initialize the user database tables"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    """Apply any pending schema migrations"""
+    from migrations import upgrade
+    upgrade('postgres')
+
+def create_core_tables(cursor):
+    """Users, progress, sessions, syllabus uploads and report cards"""
+    # Users table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id SERIAL PRIMARY KEY,
+            email VARCHAR(255) UNIQUE NOT NULL,
+            password_hash VARCHAR(255) NOT NULL,
+            first_name VARCHAR(100) NOT NULL,
+            last_name VARCHAR(100) NOT NULL,
+            age_group VARCHAR(50) NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_login TIMESTAMP,
+            is_active BOOLEAN DEFAULT TRUE,
+            profile_data JSONB DEFAULT '{}'
+        )
+    ''')
     
-    try:
-        # Users table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                id SERIAL PRIMARY KEY,
-                email VARCHAR(255) UNIQUE NOT NULL,
-                password_hash VARCHAR(255) NOT NULL,
-                first_name VARCHAR(100) NOT NULL,
-                last_name VARCHAR(100) NOT NULL,
-                age_group VARCHAR(50) NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                last_login TIMESTAMP,
-                is_active BOOLEAN DEFAULT TRUE,
-                profile_data JSONB DEFAULT '{}'
-            )
-        ''')
-        
-        # User progress table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS user_progress (
-                id SERIAL PRIMARY KEY,
-                user_id INTEGER NOT NULL,
-                subject VARCHAR(100) NOT NULL,
-                activity_type VARCHAR(100) NOT NULL,
-                content TEXT,
-                score INTEGER,
-                completed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
-            )
-        ''')
-        
-        # User sessions table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS user_sessions (
-                id SERIAL PRIMARY KEY,
-                user_id INTEGER NOT NULL,
-                session_start TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                session_end TIMESTAMP,
-                duration_minutes INTEGER,
-                activities_completed INTEGER DEFAULT 0,
-                FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
-            )
+    # User progress table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS user_progress (
+            id SERIAL PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            subject VARCHAR(100) NOT NULL,
+            activity_type VARCHAR(100) NOT NULL,
+            content TEXT,
+            score INTEGER,
+            completed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+        )
+    ''')
+    
+    # User sessions table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS user_sessions (
+            id SERIAL PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            session_start TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            session_end TIMESTAMP,
+            duration_minutes INTEGER,
+            activities_completed INTEGER DEFAULT 0,
+            FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+        )
+    ''')
+    
+    # Syllabus uploads table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS syllabus_uploads (
+            id SERIAL PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            filename VARCHAR(255) NOT NULL,
+            content TEXT,
+            analysis JSONB,
+            uploaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+        )
+    ''')
+    
+    # Report card analysis table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS report_cards (
+            id SERIAL PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            filename VARCHAR(255) NOT NULL,
+            grades JSONB,
+            analysis JSONB,
+            recommendations JSONB,
+            uploaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+        )
+    ''')
+    
+def add_analysis_hashes(cursor):
+    """Content hashes for deduplicating analyses, plus keyset pagination indexes"""
+    for table in ('syllabus_uploads', 'report_cards'):
+        cursor.execute(f'''
+            ALTER TABLE {table} ADD COLUMN IF NOT EXISTS content_hash CHAR(64)
         ''')
-        
-        # Syllabus uploads table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS syllabus_uploads (
-                id SERIAL PRIMARY KEY,
-                user_id INTEGER NOT NULL,
-                filename VARCHAR(255) NOT NULL,
-                content TEXT,
-                analysis JSONB,
-                uploaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
-            )
+        cursor.execute(f'''
+            CREATE INDEX IF NOT EXISTS idx_{table}_content_hash
+            ON {table} (content_hash, uploaded_at DESC)
         ''')
-        
-        # Report card analysis table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS report_cards (
-                id SERIAL PRIMARY KEY,
-                user_id INTEGER NOT NULL,
-                filename VARCHAR(255) NOT NULL,
-                grades JSONB,
-                analysis JSONB,
-                recommendations JSONB,
-                uploaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
-            )
+        cursor.execute(f'''
+            CREATE INDEX IF NOT EXISTS idx_{table}_user_uploaded
+            ON {table} (user_id, uploaded_at DESC, id DESC)
         ''')
-        
-        conn.commit()
-        print("✅ PostgreSQL database tables initialized successfully")
-        
-    except Exception as e:
-        conn.rollback()
-        print(f"❌ Database initialization error: {e}")
-        raise
-    finally:
-        cursor.close()
-        conn.close()
+
+def migrate_progress_rollup(cursor):
+    """Add progress indexes and the per-user rollup tables, backfilling once.
+
+    user_progress_stats holds running totals per user and
+    user_progress_subjects the distinct subjects each user has studied, so
+    dashboard statistics are a primary-key lookup instead of an aggregate
+    over the user's whole history.
+    """
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_user_progress_user_completed
+        ON user_progress (user_id, completed_at DESC)
+    ''')
+    
+    # Serialize concurrent workers so only one performs the backfill
+    cursor.execute("SELECT pg_advisory_xact_lock(hashtext('user_progress_rollup'))")
+    cursor.execute("SELECT to_regclass('user_progress_stats') IS NOT NULL AS present")
+    if cursor.fetchone()['present']:
+        return
+    
+    cursor.execute('''
+        CREATE TABLE user_progress_subjects (
+            user_id INTEGER NOT NULL,
+            subject VARCHAR(100) NOT NULL,
+            PRIMARY KEY (user_id, subject),
+            FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE user_progress_stats (
+            user_id INTEGER PRIMARY KEY,
+            total_sessions BIGINT NOT NULL DEFAULT 0,
+            subjects_studied INTEGER NOT NULL DEFAULT 0,
+            score_sum BIGINT NOT NULL DEFAULT 0,
+            score_count BIGINT NOT NULL DEFAULT 0,
+            last_activity TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+        )
+    ''')
+    cursor.execute('''
+        INSERT INTO user_progress_subjects (user_id, subject)
+        SELECT DISTINCT user_id, subject FROM user_progress
+    ''')
+    cursor.execute('''
+        INSERT INTO user_progress_stats
+            (user_id, total_sessions, subjects_studied, score_sum, score_count, last_activity)
+        SELECT user_id, COUNT(*), COUNT(DISTINCT subject), COALESCE(SUM(score), 0),
+               COUNT(score), MAX(completed_at)
+        FROM user_progress
+        GROUP BY user_id
+    ''')
+    print("✅ Progress rollup tables created and backfilled")
+
+def create_token_usage_table(cursor):
+    """Daily AI token usage per budget subject ("user:<id>" or "ip:<address>")"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS ai_token_usage (
+            subject VARCHAR(128) NOT NULL,
+            day DATE NOT NULL,
+            tokens BIGINT NOT NULL DEFAULT 0,
+            PRIMARY KEY (subject, day)
+        )
+    ''')
 
 def create_user(email, password, first_name, last_name, age_group):
-    """Create a new user account"""
+    """Create a new user account; returns None if the email is already registered"""
+    # Hash password
+    password_hash = password_hasher.hash(password)
+    
     try:
-        # Hash password
-        password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
-        
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT INTO users (email, password_hash, first_name, last_name, age_group)
-            VALUES (%s, %s, %s, %s, %s)
-            RETURNING id, email, first_name, last_name, age_group, created_at
-        ''', (email, password_hash, first_name, last_name, age_group))
-        
-        user = cursor.fetchone()
-        conn.commit()
-        
-        cursor.close()
-        conn.close()
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT INTO users (email, password_hash, first_name, last_name, age_group)
+                VALUES (%s, %s, %s, %s, %s)
+                RETURNING id, email, first_name, last_name, age_group, created_at
+            ''', (email, password_hash, first_name, last_name, age_group))
+            
+            user = cursor.fetchone()
+            conn.commit()
+            cursor.close()
         
         return dict(user) if user else None
         
     except psycopg2.IntegrityError:
         return None  # User already exists
-    except Exception as e:
-        print(f"Create user error: {e}")
-        return None
 
 def authenticate_user(email, password):
     """Authenticate user login"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT id, email, password_hash, first_name, last_name, age_group, is_active
-            FROM users WHERE email = %s
-        ''', (email,))
-        
-        user = cursor.fetchone()
-        
-        if user and user['is_active']:
-            if bcrypt.checkpw(password.encode('utf-8'), user['password_hash'].encode('utf-8')):
-                # Update last login
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                SELECT id, email, password_hash, first_name, last_name, age_group, is_active
+                FROM users WHERE email = %s
+            ''', (email,))
+            
+            user = cursor.fetchone()
+            cursor.close()
+        
+        # Verify without holding a pooled connection
+        if not user or not user['is_active']:
+            return None
+        if not password_hasher.verify(password, user['password_hash']):
+            return None
+        
+        # Transparently upgrade hashes made with a different cost factor
+        new_hash = None
+        if password_hasher.needs_rehash(user['password_hash']):
+            new_hash = password_hasher.hash(password)
+        
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            if new_hash:
+                cursor.execute('''
+                    UPDATE users SET last_login = CURRENT_TIMESTAMP, password_hash = %s
+                    WHERE id = %s AND password_hash = %s
+                ''', (new_hash, user['id'], user['password_hash']))
+                password_hasher.record_rehash()
+            else:
                 cursor.execute('''
                     UPDATE users SET last_login = CURRENT_TIMESTAMP WHERE id = %s
                 ''', (user['id'],))
-                conn.commit()
-                
-                cursor.close()
-                conn.close()
-                
-                # Remove password hash from returned data
-                user_data = dict(user)
-                del user_data['password_hash']
-                return user_data
+            conn.commit()
+            cursor.close()
         
-        cursor.close()
-        conn.close()
-        return None
+        # Remove password hash from returned data
+        user_data = dict(user)
+        del user_data['password_hash']
+        return user_data
         
+    except PasswordHashingBusyError:
+        raise
     except Exception as e:
         print(f"Authentication error: {e}")
         return None
@@ -184,17 +290,16 @@ def authenticate_user(email, password):
 def get_user_profile(user_id):
     """Get user profile information"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT id, email, first_name, last_name, age_group, created_at, last_login, profile_data
-            FROM users WHERE id = %s AND is_active = TRUE
-        ''', (user_id,))
-        
-        user = cursor.fetchone()
-        cursor.close()
-        conn.close()
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                SELECT id, email, first_name, last_name, age_group, created_at, last_login, profile_data
+                FROM users WHERE id = %s AND is_active = TRUE
+            ''', (user_id,))
+            
+            user = cursor.fetchone()
+            cursor.close()
         
         return dict(user) if user else None
         
@@ -202,23 +307,100 @@ def get_user_profile(user_id):
         print(f"Get user profile error: {e}")
         return None
 
-def save_user_progress(user_id, subject, activity_type, content=None, score=None):
-    """Save user learning progress"""
+def update_user_profile(user_id, **fields):
+    """Update editable profile fields"""
+    allowed = ('first_name', 'last_name', 'age_group', 'profile_data')
+    updates = {k: v for k, v in fields.items() if k in allowed}
+    if not updates:
+        return get_user_profile(user_id)
+    
+    if 'profile_data' in updates:
+        updates['profile_data'] = json.dumps(updates['profile_data'])
+    
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        assignments = ', '.join(f"{column} = %s" for column in updates)
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                UPDATE users SET {assignments}
+                WHERE id = %s AND is_active = TRUE
+                RETURNING id, email, first_name, last_name, age_group, created_at, last_login, profile_data
+            ''', (*updates.values(), user_id))
+            
+            user = cursor.fetchone()
+            conn.commit()
+            cursor.close()
         
-        cursor.execute('''
-            INSERT INTO user_progress (user_id, subject, activity_type, content, score)
-            VALUES (%s, %s, %s, %s, %s)
-            RETURNING id, completed_at
-        ''', (user_id, subject, activity_type, content, score))
+        return dict(user) if user else None
         
-        result = cursor.fetchone()
-        conn.commit()
+    except Exception as e:
+        print(f"Update user profile error: {e}")
+        return None
+
+def deactivate_user(user_id):
+    """Deactivate a user account"""
+    try:
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                UPDATE users SET is_active = FALSE WHERE id = %s
+            ''', (user_id,))
+            
+            updated = cursor.rowcount
+            conn.commit()
+            cursor.close()
         
-        cursor.close()
-        conn.close()
+        return updated > 0
+        
+    except Exception as e:
+        print(f"Deactivate user error: {e}")
+        return False
+
+def apply_progress_rollup(cursor, user_id, rows):
+    """Fold newly inserted progress rows into the user's rollup, in the caller's transaction.
+
+    ``rows`` are dicts with subject, score and completed_at.
+    """
+    subjects = sorted({row['subject'] for row in rows})
+    cursor.execute('''
+        INSERT INTO user_progress_subjects (user_id, subject)
+        SELECT %s, unnest(%s::varchar[])
+        ON CONFLICT DO NOTHING
+    ''', (user_id, subjects))
+    new_subjects = cursor.rowcount
+    
+    scores = [row['score'] for row in rows if row['score'] is not None]
+    cursor.execute('''
+        INSERT INTO user_progress_stats AS s
+            (user_id, total_sessions, subjects_studied, score_sum, score_count, last_activity)
+        VALUES (%s, %s, %s, %s, %s, %s)
+        ON CONFLICT (user_id) DO UPDATE SET
+            total_sessions = s.total_sessions + EXCLUDED.total_sessions,
+            subjects_studied = s.subjects_studied + EXCLUDED.subjects_studied,
+            score_sum = s.score_sum + EXCLUDED.score_sum,
+            score_count = s.score_count + EXCLUDED.score_count,
+            last_activity = GREATEST(s.last_activity, EXCLUDED.last_activity)
+    ''', (user_id, len(rows), new_subjects, sum(scores), len(scores),
+          max(row['completed_at'] for row in rows)))
+
+def save_user_progress(user_id, subject, activity_type, content=None, score=None):
+    """Save user learning progress and update the user's rollup"""
+    try:
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                INSERT INTO user_progress (user_id, subject, activity_type, content, score)
+                VALUES (%s, %s, %s, %s, %s)
+                RETURNING id, completed_at
+            ''', (user_id, subject, activity_type, content, score))
+            
+            result = cursor.fetchone()
+            apply_progress_rollup(cursor, user_id, [{
+                'subject': subject, 'score': score, 'completed_at': result['completed_at']
+            }])
+            conn.commit()
+            cursor.close()
         
         return dict(result) if result else None
         
@@ -226,41 +408,77 @@ def save_user_progress(user_id, subject, activity_type, content=None, score=None
         print(f"Save progress error: {e}")
         return None
 
-def get_user_progress(user_id):
-    """Get user learning progress and statistics"""
-    try:
-        conn = get_db_connection()
+def save_progress_events(events):
+    """Insert many progress events with one multi-row INSERT in one transaction.
+
+    Each event is a dict with user_id, subject, activity_type and optional
+    content, score and completed_at. Rollups are updated per user in the
+    same transaction. Returns the number of rows written.
+    """
+    if not events:
+        return 0
+    
+    with db_connection() as conn:
         cursor = conn.cursor()
+        rows = execute_values(cursor, '''
+            INSERT INTO user_progress (user_id, subject, activity_type, content, score, completed_at)
+            VALUES %s
+            RETURNING user_id, subject, score, completed_at
+        ''', [
+            (e['user_id'], e['subject'], e['activity_type'], e.get('content'),
+             e.get('score'), e.get('completed_at'))
+            for e in events
+        ], template='(%s, %s, %s, %s, %s, COALESCE(%s, CURRENT_TIMESTAMP))',
+           page_size=len(events), fetch=True)
+        
+        by_user = {}
+        for row in rows:
+            by_user.setdefault(row['user_id'], []).append(row)
+        # Fixed lock order so concurrent batches can't deadlock on rollup rows
+        for user_id in sorted(by_user):
+            apply_progress_rollup(cursor, user_id, by_user[user_id])
         
-        # Get progress statistics
-        cursor.execute('''
-            SELECT 
-                COUNT(*) as total_sessions,
-                COUNT(DISTINCT subject) as subjects_studied,
-                AVG(score) as average_score,
-                MAX(completed_at) as last_activity
-            FROM user_progress 
-            WHERE user_id = %s
-        ''', (user_id,))
-        
-        stats = cursor.fetchone()
-        
-        # Get recent activities
-        cursor.execute('''
-            SELECT subject, activity_type, score, completed_at
-            FROM user_progress 
-            WHERE user_id = %s 
-            ORDER BY completed_at DESC 
-            LIMIT 10
-        ''', (user_id,))
-        
-        recent_activities = cursor.fetchall()
-        
+        conn.commit()
         cursor.close()
-        conn.close()
+    
+    return len(rows)
+
+def get_user_progress(user_id):
+    """Get user learning progress and statistics"""
+    try:
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            
+            # Get progress statistics from the precomputed rollup
+            cursor.execute('''
+                SELECT 
+                    total_sessions,
+                    subjects_studied,
+                    score_sum::float / NULLIF(score_count, 0) as average_score,
+                    last_activity
+                FROM user_progress_stats 
+                WHERE user_id = %s
+            ''', (user_id,))
+            
+            stats = cursor.fetchone()
+            if stats is None:
+                stats = {'total_sessions': 0, 'subjects_studied': 0,
+                         'average_score': None, 'last_activity': None}
+            
+            # Get recent activities (served by idx_user_progress_user_completed)
+            cursor.execute('''
+                SELECT subject, activity_type, score, completed_at
+                FROM user_progress 
+                WHERE user_id = %s 
+                ORDER BY completed_at DESC 
+                LIMIT 10
+            ''', (user_id,))
+            
+            recent_activities = cursor.fetchall()
+            cursor.close()
         
         return {
-            'stats': dict(stats) if stats else {},
+            'stats': dict(stats),
             'recent_activities': [dict(activity) for activity in recent_activities]
         }
         
@@ -268,64 +486,222 @@ def get_user_progress(user_id):
         print(f"Get progress error: {e}")
         return {'stats': {}, 'recent_activities': []}
 
-def generate_token(user_data):
-    """Generate JWT token for user"""
+def get_progress_version(user_id):
+    """Cheap primary-key lookup of the values that change whenever progress does"""
     try:
-        payload = {
-            'user_id': user_data['id'],
-            'email': user_data['email'],
-            'exp': datetime.utcnow() + timedelta(days=7)  # Token expires in 7 days
-        }
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT total_sessions, last_activity
+                FROM user_progress_stats
+                WHERE user_id = %s
+            ''', (user_id,))
+            
+            version = cursor.fetchone()
+            cursor.close()
         
-        secret_key = current_app.config['SECRET_KEY']
-        token = jwt.encode(payload, secret_key, algorithm='HS256')
-        return token
+        return dict(version) if version else {'total_sessions': 0, 'last_activity': None}
         
     except Exception as e:
-        print(f"Token generation error: {e}")
+        print(f"Get progress version error: {e}")
         return None
 
-def require_auth(f):
-    """Decorator to require authentication for routes"""
-    @wraps(f)
-    def decorated_function(*args, **kwargs):
-        token = request.headers.get('Authorization')
+def save_syllabus_upload(user_id, filename, content, analysis, content_hash=None):
+    """Store an analyzed syllabus upload"""
+    try:
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                INSERT INTO syllabus_uploads (user_id, filename, content, analysis, content_hash)
+                VALUES (%s, %s, %s, %s, %s)
+                RETURNING id, uploaded_at
+            ''', (user_id, filename, content, json.dumps(analysis), content_hash))
+            
+            result = cursor.fetchone()
+            conn.commit()
+            cursor.close()
         
-        if not token:
-            return jsonify({'error': 'No token provided'}), 401
+        return dict(result) if result else None
         
-        try:
-            # Remove 'Bearer ' prefix if present
-            if token.startswith('Bearer '):
-                token = token[7:]
+    except Exception as e:
+        print(f"Save syllabus upload error: {e}")
+        return None
+
+def save_report_card(user_id, filename, analysis, content_hash=None):
+    """Store an analyzed report card"""
+    try:
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                INSERT INTO report_cards (user_id, filename, grades, analysis, recommendations, content_hash)
+                VALUES (%s, %s, %s, %s, %s, %s)
+                RETURNING id, uploaded_at
+            ''', (user_id, filename, json.dumps(analysis.get('subjects')),
+                  json.dumps(analysis), json.dumps(analysis.get('recommendations')), content_hash))
             
-            secret_key = current_app.config['SECRET_KEY']
-            payload = jwt.decode(token, secret_key, algorithms=['HS256'])
+            result = cursor.fetchone()
+            conn.commit()
+            cursor.close()
+        
+        return dict(result) if result else None
+        
+    except Exception as e:
+        print(f"Save report card error: {e}")
+        return None
+
+ANALYSIS_TABLES = ('syllabus_uploads', 'report_cards')
+
+def find_stored_analysis(table, content_hash, user_id=None):
+    """Most recent stored analysis of an upload with this content hash.
+
+    Restricted to ``user_id``'s uploads when given, otherwise any user's.
+    """
+    if table not in ANALYSIS_TABLES:
+        raise ValueError(f"Unknown analysis table: {table}")
+    try:
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            if user_id is None:
+                cursor.execute(f'''
+                    SELECT id, user_id, filename, analysis, uploaded_at FROM {table}
+                    WHERE content_hash = %s AND analysis IS NOT NULL
+                    ORDER BY uploaded_at DESC LIMIT 1
+                ''', (content_hash,))
+            else:
+                cursor.execute(f'''
+                    SELECT id, user_id, filename, analysis, uploaded_at FROM {table}
+                    WHERE content_hash = %s AND user_id = %s AND analysis IS NOT NULL
+                    ORDER BY uploaded_at DESC LIMIT 1
+                ''', (content_hash, user_id))
             
-            # Get current user data
-            user = get_user_profile(payload['user_id'])
-            if not user:
-                return jsonify({'error': 'Invalid token'}), 401
+            row = cursor.fetchone()
+            cursor.close()
+        
+        return dict(row) if row else None
+        
+    except Exception as e:
+        print(f"Find stored analysis error: {e}")
+        return None
+
+def list_stored_analyses(table, user_id, limit=20, before=None):
+    """One page of a user's stored analyses, newest first.
+
+    Uses keyset pagination: ``before`` is the (uploaded_at, id) of the last
+    row of the previous page. Returns (rows, has_more).
+    """
+    if table not in ANALYSIS_TABLES:
+        raise ValueError(f"Unknown analysis table: {table}")
+    try:
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            if before is None:
+                cursor.execute(f'''
+                    SELECT id, filename, analysis, uploaded_at FROM {table}
+                    WHERE user_id = %s
+                    ORDER BY uploaded_at DESC, id DESC
+                    LIMIT %s
+                ''', (user_id, limit + 1))
+            else:
+                cursor.execute(f'''
+                    SELECT id, filename, analysis, uploaded_at FROM {table}
+                    WHERE user_id = %s AND (uploaded_at, id) < (%s, %s)
+                    ORDER BY uploaded_at DESC, id DESC
+                    LIMIT %s
+                ''', (user_id, before[0], before[1], limit + 1))
             
-            # Add user to request context
-            request.current_user = user
+            rows = [dict(row) for row in cursor.fetchall()]
+            cursor.close()
+        
+        return rows[:limit], len(rows) > limit
+        
+    except Exception as e:
+        print(f"List stored analyses error: {e}")
+        return [], False
+
+# Daily AI token budgets
+def reserve_token_usage(subject, day, tokens, limit):
+    """Add ``tokens`` to the subject's usage for ``day`` unless that would exceed ``limit``.
+
+    Returns {'allowed', 'tokens'} with the usage after the call, or None on
+    a database error.
+    """
+    try:
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            result = None
+            if tokens <= limit:
+                # The conditional upsert makes check-and-add one atomic step
+                cursor.execute('''
+                    INSERT INTO ai_token_usage (subject, day, tokens) VALUES (%s, %s, %s)
+                    ON CONFLICT (subject, day) DO UPDATE
+                    SET tokens = ai_token_usage.tokens + EXCLUDED.tokens
+                    WHERE ai_token_usage.tokens + EXCLUDED.tokens <= %s
+                    RETURNING tokens
+                ''', (subject, day, tokens, limit))
+                result = cursor.fetchone()
+            if result is None:
+                cursor.execute('''
+                    SELECT tokens FROM ai_token_usage WHERE subject = %s AND day = %s
+                ''', (subject, day))
+                current = cursor.fetchone()
+            conn.commit()
+            cursor.close()
+        
+        if result is not None:
+            return {'allowed': True, 'tokens': result['tokens']}
+        return {'allowed': False, 'tokens': current['tokens'] if current else 0}
+    
+    except Exception as e:
+        print(f"Reserve token usage error: {e}")
+        return None
+
+def add_token_usage(subject, day, tokens):
+    """Adjust the subject's usage for ``day`` by ``tokens`` (may be negative); returns the new total"""
+    try:
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT INTO ai_token_usage (subject, day, tokens) VALUES (%s, %s, GREATEST(%s, 0))
+                ON CONFLICT (subject, day) DO UPDATE
+                SET tokens = GREATEST(ai_token_usage.tokens + %s, 0)
+                RETURNING tokens
+            ''', (subject, day, tokens, tokens))
             
-        except jwt.ExpiredSignatureError:
-            return jsonify({'error': 'Token has expired'}), 401
-        except jwt.InvalidTokenError:
-            return jsonify({'error': 'Invalid token'}), 401
-        except Exception as e:
-            print(f"Auth decorator error: {e}")
-            return jsonify({'error': 'Authentication failed'}), 401
-        
-        return f(*args, **kwargs)
+            result = cursor.fetchone()
+            conn.commit()
+            cursor.close()
+        
+        return result['tokens']
     
-    return decorated_function
+    except Exception as e:
+        print(f"Add token usage error: {e}")
+        return None
 
-# Initialize database on module import
-try:
-    init_db()
-except Exception as e:
-    print(f"⚠️ Database initialization failed: {e}")
-    print("Database will be initialized when first accessed")
+def get_token_usage(subject, day):
+    """Tokens the subject has used on ``day``"""
+    try:
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT tokens FROM ai_token_usage WHERE subject = %s AND day = %s
+            ''', (subject, day))
+            
+            result = cursor.fetchone()
+            cursor.close()
+        
+        return result['tokens'] if result else 0
+    
+    except Exception as e:
+        print(f"Get token usage error: {e}")
+        return None
 
+# Readiness
+def ping():
+    """Run a trivial query; raises if the database is unreachable"""
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT 1')
+        cursor.fetchone()
+        cursor.close()
@@ -0,0 +1,701 @@
+"""
+StudyVerse Authentication Module - SQLite Version
+Embedded storage backend for local development, load tests and small
+deployments; implements the same functions and return values as
+auth_postgresql
+"""
+
+import os
+import json
+import sqlite3
+import threading
+from datetime import datetime
+from contextlib import contextmanager
+from password_hashing import PasswordHashingBusyError, password_hasher
+
+DATABASE_PATH = os.environ.get('SQLITE_PATH', 'studyverse_users.db')
+
+# Connection tuning; see .env.example
+BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))
+CACHE_SIZE_KB = int(os.environ.get('SQLITE_CACHE_SIZE_KB', 16384))
+SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL').upper()
+STATEMENT_CACHE_SIZE = 256
+
+# Millisecond timestamps so newest-first ordering and keyset pagination
+# behave like PostgreSQL's TIMESTAMP columns
+NOW = "strftime('%Y-%m-%d %H:%M:%f', 'now')"
+
+sqlite3.register_converter('TIMESTAMP', lambda value: datetime.fromisoformat(value.decode()))
+
+def format_timestamp(value):
+    """Store datetimes in the same text format as NOW so comparisons line up"""
+    if not isinstance(value, datetime):
+        return value
+    return value.strftime('%Y-%m-%d %H:%M:%S.') + f"{value.microsecond // 1000:03d}"
+
+def _dict_factory(cursor, row):
+    return {column[0]: row[index] for index, column in enumerate(cursor.description)}
+
+def get_db_connection():
+    """Open a tuned SQLite connection returning rows as dicts with parsed timestamps.
+
+    WAL lets readers proceed while a writer commits, synchronous=NORMAL is
+    durable across application crashes in WAL mode, and the busy timeout
+    makes writers wait for the lock instead of failing with "database is
+    locked". Statements are prepared once per connection and reused.
+    """
+    conn = sqlite3.connect(
+        DATABASE_PATH,
+        timeout=BUSY_TIMEOUT_MS / 1000,
+        detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES,
+        cached_statements=STATEMENT_CACHE_SIZE,
+    )
+    conn.row_factory = _dict_factory
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute(f'PRAGMA synchronous = {SYNCHRONOUS}')
+    conn.execute(f'PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}')
+    conn.execute(f'PRAGMA cache_size = -{CACHE_SIZE_KB}')
+    conn.execute('PRAGMA temp_store = MEMORY')
+    conn.execute('PRAGMA foreign_keys = ON')
+    return conn
+
+# One persistent connection per thread (and per process, so forked
+# gunicorn workers never share a connection with their parent)
+_local = threading.local()
+_generation = 0
+
+# The embedded database migrates itself on first use in each process
+AUTO_MIGRATE = os.environ.get('SQLITE_AUTO_MIGRATE', 'true').lower() in ('1', 'true', 'yes')
+_migrated = set()
+_migrate_lock = threading.Lock()
+
+def _thread_connection():
+    key = (os.getpid(), DATABASE_PATH, _generation)
+    if getattr(_local, 'key', None) != key:
+        close_thread_connection()
+        _local.conn = get_db_connection()
+        _local.key = key
+        if AUTO_MIGRATE and key not in _migrated:
+            with _migrate_lock:
+                if key not in _migrated:
+                    _migrated.add(key)
+                    try:
+                        init_db()
+                    except Exception:
+                        _migrated.discard(key)
+                        raise
+    return _local.conn
+
+def close_thread_connection():
+    """Close the calling thread's connection, if it has one"""
+    conn, key = getattr(_local, 'conn', None), getattr(_local, 'key', None)
+    _local.conn = _local.key = None
+    # A connection inherited from a parent process is dropped, not closed
+    if conn is not None and key[0] == os.getpid():
+        conn.close()
+
+def set_database_path(path):
+    """Point the backend at another database file; threads reconnect on next use"""
+    global DATABASE_PATH, _generation
+    DATABASE_PATH = path
+    _generation += 1
+
+@contextmanager
+def db_connection():
+    """The thread's connection for a with-block; rolled back on exceptions"""
+    conn = _thread_connection()
+    try:
+        yield conn
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        # Never leave a write transaction (and its lock) open between calls
+        if conn.in_transaction:
+            conn.rollback()
+
+def _user(row):
+    """Normalize a users row to the shapes PostgreSQL returns"""
+    if row is None:
+        return None
+    if 'is_active' in row:
+        row['is_active'] = bool(row['is_active'])
+    if 'profile_data' in row:
+        row['profile_data'] = json.loads(row['profile_data'] or '{}')
+    return row
+
+def _analysis(row):
+    if row is not None and row.get('analysis') is not None:
+        row['analysis'] = json.loads(row['analysis'])
+    return row
+
+# Database setup (schema changes are versioned in migrations.py)
+def init_db():
+    """Apply any pending schema migrations"""
+    from migrations import upgrade
+    upgrade('sqlite')
+
+def create_schema(cursor):
+    """Tables and indexes of the embedded database"""
+    # Users table
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            email TEXT UNIQUE NOT NULL,
+            password_hash TEXT NOT NULL,
+            first_name TEXT NOT NULL,
+            last_name TEXT NOT NULL,
+            age_group TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT ({NOW}),
+            last_login TIMESTAMP,
+            is_active BOOLEAN DEFAULT 1,
+            profile_data TEXT DEFAULT '{{}}'
+        )
+    ''')
+    
+    # User progress table
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS user_progress (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            subject TEXT NOT NULL,
+            activity_type TEXT NOT NULL,
+            content TEXT,
+            score INTEGER,
+            completed_at TIMESTAMP DEFAULT ({NOW}),
+            FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_user_progress_user_completed
+        ON user_progress (user_id, completed_at DESC)
+    ''')
+    
+    # User sessions table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS user_sessions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            session_token TEXT UNIQUE NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            expires_at TIMESTAMP NOT NULL,
+            is_active BOOLEAN DEFAULT 1,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
+    
+    # Syllabus uploads and report card analyses
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS syllabus_uploads (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            filename TEXT NOT NULL,
+            content TEXT,
+            analysis TEXT,
+            content_hash TEXT,
+            uploaded_at TIMESTAMP DEFAULT ({NOW}),
+            FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+        )
+    ''')
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS report_cards (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            filename TEXT NOT NULL,
+            grades TEXT,
+            analysis TEXT,
+            recommendations TEXT,
+            content_hash TEXT,
+            uploaded_at TIMESTAMP DEFAULT ({NOW}),
+            FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+        )
+    ''')
+    for table in ANALYSIS_TABLES:
+        cursor.execute(f'''
+            CREATE INDEX IF NOT EXISTS idx_{table}_content_hash
+            ON {table} (content_hash, uploaded_at DESC)
+        ''')
+        cursor.execute(f'''
+            CREATE INDEX IF NOT EXISTS idx_{table}_user_uploaded
+            ON {table} (user_id, uploaded_at DESC, id DESC)
+        ''')
+
+def create_token_usage_table(cursor):
+    """Daily AI token usage per budget subject ("user:<id>" or "ip:<address>")"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS ai_token_usage (
+            subject TEXT NOT NULL,
+            day TEXT NOT NULL,
+            tokens INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (subject, day)
+        )
+    ''')
+
+def create_progress_version_table(cursor):
+    """Per-user session count and latest activity, so conditional progress
+    polls are a primary-key lookup instead of an aggregate over the history"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS user_progress_stats (
+            user_id INTEGER PRIMARY KEY,
+            total_sessions INTEGER NOT NULL DEFAULT 0,
+            last_activity TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+        )
+    ''')
+    cursor.execute('''
+        INSERT OR REPLACE INTO user_progress_stats (user_id, total_sessions, last_activity)
+        SELECT user_id, COUNT(*), MAX(completed_at)
+        FROM user_progress
+        GROUP BY user_id
+    ''')
+
+def apply_progress_version(cursor, user_id, sessions, last_activity):
+    """Add sessions to the user's version row (``last_activity`` in the stored text format)"""
+    cursor.execute('''
+        INSERT INTO user_progress_stats (user_id, total_sessions, last_activity)
+        VALUES (?, ?, ?)
+        ON CONFLICT (user_id) DO UPDATE SET
+            total_sessions = total_sessions + excluded.total_sessions,
+            last_activity = MAX(COALESCE(last_activity, ''), excluded.last_activity)
+    ''', (user_id, sessions, last_activity))
+
+def create_user(email, password, first_name, last_name, age_group):
+    """Create a new user account; returns None if the email is already registered"""
+    password_hash = password_hasher.hash(password)
+    
+    try:
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT INTO users (email, password_hash, first_name, last_name, age_group)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (email, password_hash, first_name, last_name, age_group))
+            
+            cursor.execute('''
+                SELECT id, email, first_name, last_name, age_group, created_at
+                FROM users WHERE id = ?
+            ''', (cursor.lastrowid,))
+            
+            user = cursor.fetchone()
+            conn.commit()
+            cursor.close()
+        
+        return user
+    
+    except sqlite3.IntegrityError:
+        return None  # User already exists
+
+def authenticate_user(email, password):
+    """Authenticate user login"""
+    try:
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                SELECT id, email, password_hash, first_name, last_name, age_group, is_active
+                FROM users WHERE email = ?
+            ''', (email,))
+            
+            user = _user(cursor.fetchone())
+            cursor.close()
+        
+        if not user or not user['is_active']:
+            return None
+        if not password_hasher.verify(password, user['password_hash']):
+            return None
+        
+        # Transparently upgrade hashes made with a different cost factor
+        new_hash = None
+        if password_hasher.needs_rehash(user['password_hash']):
+            new_hash = password_hasher.hash(password)
+        
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            if new_hash:
+                cursor.execute(f'''
+                    UPDATE users SET last_login = {NOW}, password_hash = ?
+                    WHERE id = ? AND password_hash = ?
+                ''', (new_hash, user['id'], user['password_hash']))
+                password_hasher.record_rehash()
+            else:
+                cursor.execute(f'''
+                    UPDATE users SET last_login = {NOW} WHERE id = ?
+                ''', (user['id'],))
+            conn.commit()
+            cursor.close()
+        
+        # Remove password hash from returned data
+        del user['password_hash']
+        return user
+    
+    except PasswordHashingBusyError:
+        raise
+    except Exception as e:
+        print(f"Authentication error: {e}")
+        return None
+
+def get_user_profile(user_id):
+    """Get user profile information"""
+    try:
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                SELECT id, email, first_name, last_name, age_group, created_at, last_login, profile_data
+                FROM users WHERE id = ? AND is_active = 1
+            ''', (user_id,))
+            
+            user = _user(cursor.fetchone())
+            cursor.close()
+        
+        return user
+    
+    except Exception as e:
+        print(f"Get user profile error: {e}")
+        return None
+
+def update_user_profile(user_id, **fields):
+    """Update editable profile fields"""
+    allowed = ('first_name', 'last_name', 'age_group', 'profile_data')
+    updates = {k: v for k, v in fields.items() if k in allowed}
+    if not updates:
+        return get_user_profile(user_id)
+    
+    if 'profile_data' in updates:
+        updates['profile_data'] = json.dumps(updates['profile_data'])
+    
+    try:
+        assignments = ', '.join(f"{column} = ?" for column in updates)
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                UPDATE users SET {assignments}
+                WHERE id = ? AND is_active = 1
+            ''', (*updates.values(), user_id))
+            
+            conn.commit()
+            cursor.close()
+        
+        return get_user_profile(user_id)
+    
+    except Exception as e:
+        print(f"Update user profile error: {e}")
+        return None
+
+def deactivate_user(user_id):
+    """Deactivate a user account"""
+    try:
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('UPDATE users SET is_active = 0 WHERE id = ?', (user_id,))
+            
+            updated = cursor.rowcount
+            conn.commit()
+            cursor.close()
+        
+        return updated > 0
+    
+    except Exception as e:
+        print(f"Deactivate user error: {e}")
+        return False
+
+def save_user_progress(user_id, subject, activity_type, content=None, score=None):
+    """Save user learning progress and bump the user's version row"""
+    try:
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                INSERT INTO user_progress (user_id, subject, activity_type, content, score)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (user_id, subject, activity_type, content, score))
+            
+            cursor.execute('SELECT id, completed_at FROM user_progress WHERE id = ?', (cursor.lastrowid,))
+            result = cursor.fetchone()
+            apply_progress_version(cursor, user_id, 1, format_timestamp(result['completed_at']))
+            conn.commit()
+            cursor.close()
+        
+        return result
+    
+    except Exception as e:
+        print(f"Save progress error: {e}")
+        return None
+
+def save_progress_events(events):
+    """Insert many progress events in one transaction; returns the number written"""
+    if not events:
+        return 0
+    
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        # One timestamp for the events without one, so the version rows get
+        # exactly the values stored
+        cursor.execute(f'SELECT {NOW} AS now')
+        now = cursor.fetchone()['now']
+        rows = [
+            (e['user_id'], e['subject'], e['activity_type'], e.get('content'),
+             e.get('score'), format_timestamp(e.get('completed_at')) or now)
+            for e in events
+        ]
+        cursor.executemany('''
+            INSERT INTO user_progress (user_id, subject, activity_type, content, score, completed_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', rows)
+        
+        versions = {}
+        for row in rows:
+            sessions, last_activity = versions.get(row[0], (0, row[5]))
+            versions[row[0]] = (sessions + 1, max(last_activity, row[5]))
+        for user_id, (sessions, last_activity) in versions.items():
+            apply_progress_version(cursor, user_id, sessions, last_activity)
+        
+        conn.commit()
+        cursor.close()
+    
+    return len(events)
+
+def get_user_progress(user_id):
+    """Get user learning progress and statistics"""
+    try:
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            
+            # Aggregates over the user's rows (served by idx_user_progress_user_completed)
+            cursor.execute('''
+                SELECT
+                    COUNT(*) as total_sessions,
+                    COUNT(DISTINCT subject) as subjects_studied,
+                    AVG(score) as average_score,
+                    MAX(completed_at) as "last_activity [timestamp]"
+                FROM user_progress
+                WHERE user_id = ?
+            ''', (user_id,))
+            
+            stats = cursor.fetchone()
+            
+            cursor.execute('''
+                SELECT subject, activity_type, score, completed_at
+                FROM user_progress
+                WHERE user_id = ?
+                ORDER BY completed_at DESC
+                LIMIT 10
+            ''', (user_id,))
+            
+            recent_activities = cursor.fetchall()
+            cursor.close()
+        
+        return {
+            'stats': stats,
+            'recent_activities': recent_activities
+        }
+    
+    except Exception as e:
+        print(f"Get progress error: {e}")
+        return {'stats': {}, 'recent_activities': []}
+
+def get_progress_version(user_id):
+    """Cheap primary-key lookup of the values that change whenever progress does"""
+    try:
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT total_sessions, last_activity
+                FROM user_progress_stats
+                WHERE user_id = ?
+            ''', (user_id,))
+            
+            version = cursor.fetchone()
+            cursor.close()
+        
+        return dict(version) if version else {'total_sessions': 0, 'last_activity': None}
+    
+    except Exception as e:
+        print(f"Get progress version error: {e}")
+        return None
+
+def save_syllabus_upload(user_id, filename, content, analysis, content_hash=None):
+    """Store an analyzed syllabus upload"""
+    try:
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                INSERT INTO syllabus_uploads (user_id, filename, content, analysis, content_hash)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (user_id, filename, content, json.dumps(analysis), content_hash))
+            
+            cursor.execute('SELECT id, uploaded_at FROM syllabus_uploads WHERE id = ?', (cursor.lastrowid,))
+            result = cursor.fetchone()
+            conn.commit()
+            cursor.close()
+        
+        return result
+    
+    except Exception as e:
+        print(f"Save syllabus upload error: {e}")
+        return None
+
+def save_report_card(user_id, filename, analysis, content_hash=None):
+    """Store an analyzed report card"""
+    try:
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                INSERT INTO report_cards (user_id, filename, grades, analysis, recommendations, content_hash)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (user_id, filename, json.dumps(analysis.get('subjects')),
+                  json.dumps(analysis), json.dumps(analysis.get('recommendations')), content_hash))
+            
+            cursor.execute('SELECT id, uploaded_at FROM report_cards WHERE id = ?', (cursor.lastrowid,))
+            result = cursor.fetchone()
+            conn.commit()
+            cursor.close()
+        
+        return result
+    
+    except Exception as e:
+        print(f"Save report card error: {e}")
+        return None
+
+ANALYSIS_TABLES = ('syllabus_uploads', 'report_cards')
+
+def find_stored_analysis(table, content_hash, user_id=None):
+    """Most recent stored analysis of an upload with this content hash"""
+    if table not in ANALYSIS_TABLES:
+        raise ValueError(f"Unknown analysis table: {table}")
+    try:
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            if user_id is None:
+                cursor.execute(f'''
+                    SELECT id, user_id, filename, analysis, uploaded_at FROM {table}
+                    WHERE content_hash = ? AND analysis IS NOT NULL
+                    ORDER BY uploaded_at DESC LIMIT 1
+                ''', (content_hash,))
+            else:
+                cursor.execute(f'''
+                    SELECT id, user_id, filename, analysis, uploaded_at FROM {table}
+                    WHERE content_hash = ? AND user_id = ? AND analysis IS NOT NULL
+                    ORDER BY uploaded_at DESC LIMIT 1
+                ''', (content_hash, user_id))
+            
+            row = _analysis(cursor.fetchone())
+            cursor.close()
+        
+        return row
+    
+    except Exception as e:
+        print(f"Find stored analysis error: {e}")
+        return None
+
+def list_stored_analyses(table, user_id, limit=20, before=None):
+    """One page of a user's stored analyses, newest first; returns (rows, has_more)"""
+    if table not in ANALYSIS_TABLES:
+        raise ValueError(f"Unknown analysis table: {table}")
+    try:
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            if before is None:
+                cursor.execute(f'''
+                    SELECT id, filename, analysis, uploaded_at FROM {table}
+                    WHERE user_id = ?
+                    ORDER BY uploaded_at DESC, id DESC
+                    LIMIT ?
+                ''', (user_id, limit + 1))
+            else:
+                cursor.execute(f'''
+                    SELECT id, filename, analysis, uploaded_at FROM {table}
+                    WHERE user_id = ? AND (uploaded_at, id) < (?, ?)
+                    ORDER BY uploaded_at DESC, id DESC
+                    LIMIT ?
+                ''', (user_id, format_timestamp(before[0]), before[1], limit + 1))
+            
+            rows = [_analysis(row) for row in cursor.fetchall()]
+            cursor.close()
+        
+        return rows[:limit], len(rows) > limit
+    
+    except Exception as e:
+        print(f"List stored analyses error: {e}")
+        return [], False
+
+# Daily AI token budgets
+def reserve_token_usage(subject, day, tokens, limit):
+    """Add ``tokens`` to the subject's usage for ``day`` unless that would exceed ``limit``"""
+    try:
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            allowed = False
+            if tokens <= limit:
+                cursor.execute('''
+                    INSERT INTO ai_token_usage (subject, day, tokens) VALUES (?, ?, ?)
+                    ON CONFLICT (subject, day) DO UPDATE
+                    SET tokens = tokens + excluded.tokens
+                    WHERE tokens + excluded.tokens <= ?
+                ''', (subject, str(day), tokens, limit))
+                allowed = cursor.rowcount == 1
+            cursor.execute('''
+                SELECT tokens FROM ai_token_usage WHERE subject = ? AND day = ?
+            ''', (subject, str(day)))
+            current = cursor.fetchone()
+            conn.commit()
+            cursor.close()
+        
+        return {'allowed': allowed, 'tokens': current['tokens'] if current else 0}
+    
+    except Exception as e:
+        print(f"Reserve token usage error: {e}")
+        return None
+
+def add_token_usage(subject, day, tokens):
+    """Adjust the subject's usage for ``day`` by ``tokens`` (may be negative); returns the new total"""
+    try:
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT INTO ai_token_usage (subject, day, tokens) VALUES (?, ?, MAX(?, 0))
+                ON CONFLICT (subject, day) DO UPDATE
+                SET tokens = MAX(tokens + ?, 0)
+            ''', (subject, str(day), tokens, tokens))
+            cursor.execute('''
+                SELECT tokens FROM ai_token_usage WHERE subject = ? AND day = ?
+            ''', (subject, str(day)))
+            
+            result = cursor.fetchone()
+            conn.commit()
+            cursor.close()
+        
+        return result['tokens']
+    
+    except Exception as e:
+        print(f"Add token usage error: {e}")
+        return None
+
+def get_token_usage(subject, day):
+    """Tokens the subject has used on ``day``"""
+    try:
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT tokens FROM ai_token_usage WHERE subject = ? AND day = ?
+            ''', (subject, str(day)))
+            
+            result = cursor.fetchone()
+            cursor.close()
+        
+        return result['tokens'] if result else 0
+    
+    except Exception as e:
+        print(f"Get token usage error: {e}")
+        return None
+
+# Readiness
+def ping():
+    """Run a trivial query; raises if the database is unreachable"""
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT 1')
+        cursor.fetchone()
+        cursor.close()
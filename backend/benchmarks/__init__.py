@@ -0,0 +1,5 @@
+"""
+StudyVerse Benchmarks
+Standalone scripts that measure backend latency, throughput and cost.
+Run them from the backend directory, e.g. ``python -m benchmarks.study_pack_bench``.
+"""
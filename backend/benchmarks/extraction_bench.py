@@ -0,0 +1,135 @@
+"""
+Syllabus text extraction benchmark
+Measures extraction throughput for .txt, .docx and .pdf syllabi, both
+reading the whole document and stopping at the SYLLABUS_MAX_CHARS budget.
+A synthetic corpus is generated unless --corpus points at a directory of
+real sample syllabi.
+
+Usage: python -m benchmarks.extraction_bench [--corpus DIR] [--pages 40] [--repeat 5]
+"""
+
+import argparse
+import io
+import os
+import statistics
+import time
+import zipfile
+
+from text_extraction import DEFAULT_MAX_CHARS, ExtractionError, extract_text
+
+TOPICS = ['Algebra', 'Geometry', 'Trigonometry', 'Statistics', 'Probability',
+          'Functions', 'Sequences', 'Vectors', 'Matrices', 'Limits']
+
+
+def syllabus_paragraphs(pages):
+    for week in range(1, pages + 1):
+        topic = TOPICS[week % len(TOPICS)]
+        yield f"Week {week}: {topic}"
+        yield (f"Students will study {topic.lower()} through guided practice, worked examples and "
+               f"independent problem sets. Assessment includes a quiz on {topic.lower()} and a short "
+               f"written reflection connecting the unit to earlier material.") * 3
+
+
+def make_txt(pages):
+    return '\n\n'.join(syllabus_paragraphs(pages)).encode('utf-8')
+
+
+def make_docx(pages):
+    body = ''.join(
+        f'<w:p><w:r><w:t>{p}</w:t></w:r></w:p>' for p in syllabus_paragraphs(pages)
+    )
+    document = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+        f'<w:body>{body}</w:body></w:document>'
+    )
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('[Content_Types].xml', '<?xml version="1.0"?><Types/>')
+        archive.writestr('word/document.xml', document)
+    return buffer.getvalue()
+
+
+def make_pdf(pages):
+    """Build a minimal multi-page PDF with one text paragraph per page"""
+    paragraphs = list(syllabus_paragraphs(pages))
+    objects = ['<< /Type /Catalog /Pages 2 0 R >>', None,
+               '<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>']
+    page_ids = []
+    for i in range(pages):
+        text = ' '.join(paragraphs[2 * i:2 * i + 2]).replace('(', '').replace(')', '')
+        lines = [text[j:j + 90] for j in range(0, len(text), 90)]
+        ops = 'BT /F1 10 Tf 40 780 Td 12 TL ' + ' '.join(f'({line}) Tj T*' for line in lines) + ' ET'
+        objects.append(f'<< /Length {len(ops)} >>\nstream\n{ops}\nendstream')
+        content_id = len(objects)
+        objects.append(f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] '
+                       f'/Resources << /Font << /F1 3 0 R >> >> /Contents {content_id} 0 R >>')
+        page_ids.append(len(objects))
+    kids = ' '.join(f'{pid} 0 R' for pid in page_ids)
+    objects[1] = f'<< /Type /Pages /Kids [{kids}] /Count {len(page_ids)} >>'
+
+    out = io.BytesIO()
+    out.write(b'%PDF-1.4\n')
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(out.tell())
+        out.write(f'{number} 0 obj\n{body}\nendobj\n'.encode('latin-1'))
+    xref = out.tell()
+    out.write(f'xref\n0 {len(objects) + 1}\n0000000000 65535 f \n'.encode('latin-1'))
+    for offset in offsets:
+        out.write(f'{offset:010d} 00000 n \n'.encode('latin-1'))
+    out.write(f'trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n'.encode('latin-1'))
+    return out.getvalue()
+
+
+def synthetic_corpus(pages):
+    return {
+        f'syllabus_{pages}p.txt': make_txt(pages),
+        f'syllabus_{pages}p.docx': make_docx(pages),
+        f'syllabus_{pages}p.pdf': make_pdf(pages),
+    }
+
+
+def load_corpus(directory):
+    corpus = {}
+    for name in sorted(os.listdir(directory)):
+        if os.path.splitext(name)[1].lower() in ('.txt', '.docx', '.pdf', '.doc'):
+            with open(os.path.join(directory, name), 'rb') as f:
+                corpus[name] = f.read()
+    return corpus
+
+
+def measure(data, name, max_chars, repeat):
+    timings = []
+    result = None
+    for _ in range(repeat):
+        stream = io.BytesIO(data)
+        start = time.perf_counter()
+        result = extract_text(stream, name, max_chars=max_chars)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings), len(result['text'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--corpus', help='directory of real syllabi to benchmark instead of the synthetic set')
+    parser.add_argument('--pages', type=int, default=40, help='pages/weeks in each synthetic syllabus')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus) if args.corpus else synthetic_corpus(args.pages)
+
+    print(f"{'file':<28}{'size KB':>9}{'mode':>8}{'chars':>9}{'median ms':>11}{'MB/s':>8}")
+    for name, data in corpus.items():
+        for mode, max_chars in (('full', 10 ** 9), ('budget', DEFAULT_MAX_CHARS)):
+            try:
+                seconds, chars = measure(data, name, max_chars, args.repeat)
+            except ExtractionError as e:
+                print(f"{name:<28} skipped: {e}")
+                break
+            mb_per_s = len(data) / (1024 * 1024) / seconds if seconds else float('inf')
+            print(f"{name:<28}{len(data) / 1024:>9.1f}{mode:>8}{chars:>9}{seconds * 1000:>11.2f}{mb_per_s:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,295 @@
+"""
+Fake OpenAI
+Stand-ins for the OpenAI API with well-formed StudyVerse responses, so the
+AI routes, streaming and the app's retry, circuit breaker and hedging
+behavior can be exercised without network access or API spend:
+
+- FakeOpenAIServer: a local HTTP server implementing POST
+  /v1/chat/completions (plain and streamed) and GET /v1/models, with
+  configurable latency, slow-request tail and error rate
+- FakeOpenAIClient: an in-process replacement for ``OpenAI()`` for tests
+  and benchmarks
+
+Run the server and point the app at it:
+
+    python -m benchmarks.fake_openai --port 8089 --latency 0.2 --error-rate 0.1
+    OPENAI_API_KEY=fake OPENAI_API_BASE=http://127.0.0.1:8089/v1 python main.py
+
+or start it in-process with FakeOpenAIServer(...).start().
+"""
+
+import argparse
+import json
+import random
+import re
+import sys
+import threading
+import time
+import types
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from map_reduce import estimate_tokens
+
+
+def fake_content(prompt):
+    """A JSON reply of the shape the prompt asks for"""
+    counts = [int(n) for n in re.findall(r'(\d+) (?:flashcards|multiple choice)', prompt)]
+    flashcards = lambda n: [{'question': f'Question {i + 1}?', 'answer': f'Answer {i + 1}',
+                             'hint': 'Think about the text', 'difficulty': 'Medium'} for i in range(n)]
+    questions = lambda n: [{'question': f'Question {i + 1}?', 'options': ['A', 'B', 'C', 'D'],
+                            'correct_answer': i % 4, 'explanation': 'Because of the text'} for i in range(n)]
+    analysis = {'reading_level': 'Middle School', 'complexity_score': 5, 'key_topics': ['science', 'energy'],
+                'estimated_reading_time': 3, 'recommendations': ['Review key terms']}
+    if 'study pack' in prompt:
+        body = {'analysis': analysis, 'flashcards': flashcards(counts[0] if counts else 5),
+                'questions': questions(counts[1] if len(counts) > 1 else 3)}
+    elif 'flashcards' in prompt:
+        body = {'flashcards': flashcards(counts[0] if counts else 5)}
+    elif 'multiple choice' in prompt:
+        body = {'questions': questions(counts[0] if counts else 3)}
+    elif 'syllabus' in prompt:
+        body = {'subject': 'Biology', 'level': 'High School', 'duration': '1 semester',
+                'topics': ['Cells', 'Genetics', 'Evolution'], 'learning_objectives': ['Explain cell structure']}
+    elif 'report card' in prompt:
+        body = {'overall_gpa': 3.4, 'subjects': [{'name': 'Math', 'grade': 'B+'}], 'strengths': ['Reading'],
+                'areas_for_improvement': ['Math'], 'recommendations': ['Practice fractions']}
+    else:
+        body = analysis
+    return json.dumps(body)
+
+
+def _message_response(content, prompt_tokens=0, completion_tokens=0):
+    message = types.SimpleNamespace(role='assistant', content=content)
+    choice = types.SimpleNamespace(index=0, message=message, finish_reason='stop')
+    usage = types.SimpleNamespace(
+        prompt_tokens=prompt_tokens,
+        completion_tokens=completion_tokens,
+        total_tokens=prompt_tokens + completion_tokens,
+    )
+    return types.SimpleNamespace(choices=[choice], usage=usage)
+
+
+def _stream_chunk(content, finish_reason=None):
+    delta = types.SimpleNamespace(role='assistant', content=content)
+    choice = types.SimpleNamespace(index=0, delta=delta, finish_reason=finish_reason)
+    return types.SimpleNamespace(choices=[choice], usage=None)
+
+
+class _FakeCompletions:
+    def __init__(self, owner):
+        self._owner = owner
+
+    def create(self, model=None, messages=None, stream=False, **kwargs):
+        owner = self._owner
+        owner.calls.append({'model': model, 'messages': messages, 'stream': stream, **kwargs})
+        prompt = ''.join(m.get('content', '') for m in (messages or []))
+        content = owner.responder(prompt) if callable(owner.responder) else owner.responder
+        prompt_tokens = max(1, len(prompt) // 4)
+        completion_tokens = max(1, len(content) // 4)
+
+        if owner.error is not None:
+            raise owner.error
+
+        if not stream:
+            time.sleep(owner.latency + owner.token_delay * completion_tokens)
+            return _message_response(content, prompt_tokens, completion_tokens)
+
+        def chunks():
+            time.sleep(owner.latency)
+            size = owner.chunk_size
+            for start in range(0, len(content), size):
+                piece = content[start:start + size]
+                time.sleep(owner.token_delay * max(1, len(piece) // 4))
+                yield _stream_chunk(piece)
+            yield _stream_chunk(None, finish_reason='stop')
+        return chunks()
+
+
+class FakeOpenAIClient:
+    """Mimics ``OpenAI().chat.completions.create`` in-process.
+
+    ``responder`` is either a fixed completion string or a callable that maps
+    the prompt text to one (by default ``fake_content``). ``latency`` is the
+    time to first token, ``token_delay`` the per-token generation time and
+    ``chunk_size`` the number of characters per streamed chunk. Set
+    ``error`` to make every call raise that exception.
+    """
+
+    def __init__(self, responder=fake_content, latency=0.0, token_delay=0.0, chunk_size=16, error=None):
+        self.responder = responder
+        self.latency = latency
+        self.token_delay = token_delay
+        self.chunk_size = chunk_size
+        self.error = error
+        self.calls = []
+        self.chat = types.SimpleNamespace(completions=_FakeCompletions(self))
+
+
+class FakeOpenAIServer(ThreadingHTTPServer):
+    """Threaded fake of the chat completions endpoint.
+
+    Each request sleeps ``latency`` (+/- ``jitter``) seconds, or
+    ``slow_latency`` with probability ``slow_rate``, then fails with a 500
+    with probability ``error_rate``. Options can be changed while running
+    with ``configure``.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.05, jitter=0.0, slow_rate=0.0,
+                 slow_latency=5.0, error_rate=0.0, seed=None):
+        super().__init__((host, port), FakeOpenAIHandler)
+        self.options = {}
+        self.configure(latency=latency, jitter=jitter, slow_rate=slow_rate,
+                       slow_latency=slow_latency, error_rate=error_rate)
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def configure(self, **options):
+        self.options.update(options)
+
+    def plan(self):
+        """(delay, fail) for the next request"""
+        with self.lock:
+            self.requests += 1
+            options = self.options
+            if self.random.random() < options['slow_rate']:
+                delay = options['slow_latency']
+            else:
+                delay = max(0.0, options['latency'] + self.random.uniform(-options['jitter'], options['jitter']))
+            fail = self.random.random() < options['error_rate']
+            if fail:
+                self.errors += 1
+        return delay, fail
+
+    def handle_error(self, request, client_address):
+        # Clients that gave up (deadline passed, hedge lost) close early
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, name='fake-openai', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        path = self.path.rstrip('/')
+        if '/models' not in path:
+            self._send_json(404, {'error': {'message': 'Not found', 'type': 'invalid_request_error'}})
+            return
+        delay, fail = self.server.plan()
+        time.sleep(delay)
+        if fail:
+            self._send_json(500, {'error': {'message': 'Injected failure', 'type': 'server_error'}})
+            return
+        model = {'id': path.rsplit('/', 1)[-1], 'object': 'model', 'created': 0, 'owned_by': 'fake'}
+        if path.endswith('/models'):
+            self._send_json(200, {'object': 'list', 'data': [dict(model, id='gpt-4'), dict(model, id='gpt-3.5-turbo')]})
+        else:
+            self._send_json(200, model)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        request = json.loads(self.rfile.read(length) or b'{}')
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self._send_json(404, {'error': {'message': 'Not found', 'type': 'invalid_request_error'}})
+            return
+
+        delay, fail = self.server.plan()
+        time.sleep(delay)
+        if fail:
+            self._send_json(500, {'error': {'message': 'Injected failure', 'type': 'server_error'}})
+            return
+
+        prompt = ' '.join(message.get('content') or '' for message in request.get('messages', []))
+        content = fake_content(prompt)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        model = request.get('model', 'gpt-4')
+        if request.get('stream'):
+            self._stream(completion_id, model, content)
+            return
+        prompt_tokens, completion_tokens = estimate_tokens(prompt), estimate_tokens(content)
+        self._send_json(200, {
+            'id': completion_id,
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': model,
+            'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content}, 'finish_reason': 'stop'}],
+            'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens,
+                      'total_tokens': prompt_tokens + completion_tokens},
+        })
+
+    def _stream(self, completion_id, model, content):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        pieces = [content[i:i + 16] for i in range(0, len(content), 16)]
+        for index, piece in enumerate(pieces):
+            chunk = {
+                'id': completion_id,
+                'object': 'chat.completion.chunk',
+                'created': int(time.time()),
+                'model': model,
+                'choices': [{'index': 0, 'delta': {'content': piece},
+                             'finish_reason': 'stop' if index == len(pieces) - 1 else None}],
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            self.wfile.flush()
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+        self.close_connection = True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds per request')
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--slow-rate', type=float, default=0.0, help='fraction of requests that take --slow-latency')
+    parser.add_argument('--slow-latency', type=float, default=5.0)
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of requests answered with 500')
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+
+    server = FakeOpenAIServer(args.host, args.port, latency=args.latency, jitter=args.jitter,
+                              slow_rate=args.slow_rate, slow_latency=args.slow_latency,
+                              error_rate=args.error_rate, seed=args.seed)
+    print(f"Fake OpenAI listening on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+Benchmark fixtures
+Seeds the configured storage backend (SQLite at SQLITE_PATH, or PostgreSQL
+with AUTH_BACKEND=postgres and DATABASE_URL) with deterministic users,
+progress history and stored syllabus analyses, so load runs start from the
+same data. Seeding is idempotent: accounts that already exist are reused
+and not seeded again.
+
+Usage: python -m benchmarks.fixtures [--users 20] [--events 200] [--uploads 3] [--seed 1234]
+"""
+
+import argparse
+import hashlib
+import random
+import time
+from datetime import datetime, timedelta
+
+import auth
+
+PASSWORD = 'bench-password-1'
+AGE_GROUPS = ('preschool', 'elementary', 'middle', 'high')
+SUBJECTS = ('Math', 'Science', 'Reading', 'History', 'Geography', 'Art', 'Music', 'Spanish')
+ACTIVITIES = ('quiz', 'flashcards', 'text_analysis')
+
+
+def bench_email(index):
+    return f'bench{index}@example.com'
+
+
+def sample_analysis(rng, subject):
+    return {
+        'subject': subject,
+        'level': rng.choice(['Elementary', 'Middle School', 'High School']),
+        'duration': '1 semester',
+        'topics': [f'{subject} topic {n}' for n in range(1, 6)],
+        'learning_objectives': [f'Understand {subject.lower()} concept {n}' for n in range(1, 4)],
+    }
+
+
+def seed_user(index, events, uploads, seed):
+    """Create bench user ``index`` with its history; returns (account, created)"""
+    email = bench_email(index)
+    user = auth.create_user(email, PASSWORD, 'Bench', f'User{index}', AGE_GROUPS[index % len(AGE_GROUPS)])
+    if user is None:
+        user = auth.authenticate_user(email, PASSWORD)
+        if user is None:
+            raise RuntimeError(f"{email} exists with a different password; use a fresh database")
+        return {'id': user['id'], 'email': email, 'password': PASSWORD}, False
+
+    # One generator per user so the data does not depend on seeding order
+    rng = random.Random(f'{seed}-{index}')
+    start = datetime(2024, 1, 1)
+    auth.save_progress_events([{
+        'user_id': user['id'],
+        'subject': rng.choice(SUBJECTS),
+        'activity_type': rng.choice(ACTIVITIES),
+        'content': None,
+        'score': rng.randint(40, 100) if rng.random() < 0.8 else None,
+        'completed_at': start + timedelta(minutes=rng.randint(0, 365 * 24 * 60)),
+    } for _ in range(events)])
+    for n in range(uploads):
+        subject = rng.choice(SUBJECTS)
+        content_hash = hashlib.sha256(f'{email}-syllabus-{n}'.encode()).hexdigest()
+        auth.save_syllabus_upload(user['id'], f'{subject.lower()}-syllabus-{n}.txt', None,
+                                  sample_analysis(rng, subject), content_hash)
+    return {'id': user['id'], 'email': email, 'password': PASSWORD}, True
+
+
+def seed(users=20, events=200, uploads=3, seed=1234):
+    """Seed ``users`` bench accounts; returns their ids, emails and passwords"""
+    accounts = []
+    created = 0
+    for index in range(users):
+        account, was_created = seed_user(index, events, uploads, seed)
+        accounts.append(account)
+        created += was_created
+    return accounts, created
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--events', type=int, default=200, help='progress events per user')
+    parser.add_argument('--uploads', type=int, default=3, help='stored syllabus analyses per user')
+    parser.add_argument('--seed', type=int, default=1234)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    accounts, created = seed(args.users, args.events, args.uploads, args.seed)
+    print(f"{len(accounts)} bench users ({created} created) in {time.perf_counter() - start:.1f}s "
+          f"on {auth.backend_name_from_env()}; password '{PASSWORD}'")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,362 @@
+"""
+Load test suite
+Runs scenario workloads against the API and reports requests/sec and
+p50/p95/p99 latency per endpoint, optionally saving the results as a
+baseline or comparing them with a saved one.
+
+By default the app is served in-process on a threaded WSGI server over a
+scratch SQLite database seeded by benchmarks.fixtures, with OpenAI replaced
+by the local server in benchmarks.fake_openai; rate limits and token
+budgets are turned off unless set in the environment. Pass --backend
+postgres to use DATABASE_URL instead, or --url to load a server that is
+already running (e.g. gunicorn) after seeding its database with
+`python -m benchmarks.fixtures`.
+
+Scenarios:
+  login       login storm: concurrent logins of the seeded users
+  ai          AI burst: analysis, flashcards (plain and streamed), quiz and study pack on distinct texts
+  uploads     syllabus uploads, each followed by polling its job until it finishes
+  dashboard   dashboard polling: profile and conditional progress reads, with an occasional new event
+
+Usage:
+  python -m benchmarks.load_suite [--scenarios login,ai,uploads,dashboard] [--requests 200] [--concurrency 8]
+  python -m benchmarks.load_suite --save-baseline benchmarks/baselines/v1.4.json
+  python -m benchmarks.load_suite --baseline benchmarks/baselines/v1.4.json [--threshold 0.15]
+"""
+
+import argparse
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import requests
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCENARIOS = ('login', 'ai', 'uploads', 'dashboard')
+SAMPLE_TEXT = (
+    "Photosynthesis is the process plants use to turn light energy into chemical energy. "
+    "Chlorophyll in the chloroplasts absorbs sunlight, which drives the conversion of carbon "
+    "dioxide and water into glucose and oxygen. The light-dependent reactions happen in the "
+    "thylakoid membranes, while the Calvin cycle takes place in the stroma. "
+) * 4
+AI_REQUESTS = (
+    ('/api/ai/analyze-text', {}),
+    ('/api/ai/generate-flashcards', {'count': 5}),
+    ('/api/ai/generate-flashcards?stream=1', {'count': 5}),
+    ('/api/ai/generate-quiz', {'count': 3}),
+    ('/api/ai/study-pack', {'flashcard_count': 5, 'quiz_count': 3}),
+)
+
+
+def percentile(ordered, q):
+    """Nearest-rank percentile of a sorted list"""
+    if not ordered:
+        return None
+    return ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+
+
+class Recorder:
+    """Latency samples and status codes per endpoint label"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+
+    def record(self, endpoint, status, seconds):
+        with self._lock:
+            self.samples[endpoint].append(seconds)
+            self.statuses[endpoint][str(status)] += 1
+
+    def summary(self, wall):
+        endpoints = {}
+        for endpoint, samples in sorted(self.samples.items()):
+            ordered = sorted(samples)
+            statuses = dict(self.statuses[endpoint])
+            errors = sum(count for status, count in statuses.items() if not status.isdigit() or int(status) >= 400)
+            endpoints[endpoint] = {
+                'count': len(ordered),
+                'errors': errors,
+                'statuses': statuses,
+                'rps': round(len(ordered) / wall, 2) if wall else 0.0,
+                'p50_ms': round(percentile(ordered, 0.50) * 1000, 2),
+                'p95_ms': round(percentile(ordered, 0.95) * 1000, 2),
+                'p99_ms': round(percentile(ordered, 0.99) * 1000, 2),
+            }
+        return endpoints
+
+
+class LoadContext:
+    """Shared state for one run: target URL, seeded accounts and their tokens"""
+
+    def __init__(self, base_url, accounts, nonce):
+        self.base_url = base_url.rstrip('/')
+        self.accounts = accounts
+        self.nonce = nonce
+        self.recorder = Recorder()
+        self.etags = {}
+        self._local = threading.local()
+
+    @property
+    def session(self):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session
+
+    def request(self, endpoint, method, path, **kwargs):
+        """Send one request and record its latency under ``endpoint``"""
+        start = time.perf_counter()
+        try:
+            response = self.session.request(method, self.base_url + path, timeout=120, **kwargs)
+            # Streamed bodies count until the last byte
+            response.content
+            status = response.status_code
+        except requests.RequestException:
+            response, status = None, 'error'
+        self.recorder.record(endpoint, status, time.perf_counter() - start)
+        return response
+
+    def account(self, index):
+        return self.accounts[index % len(self.accounts)]
+
+    def auth_headers(self, index):
+        return {'Authorization': f"Bearer {self.account(index)['token']}"}
+
+
+def login_storm(ctx, index):
+    account = ctx.account(index)
+    ctx.request('POST /api/auth/login', 'POST', '/api/auth/login',
+                json={'email': account['email'], 'password': account['password']})
+
+
+def ai_burst(ctx, index):
+    path, params = AI_REQUESTS[index % len(AI_REQUESTS)]
+    # Distinct texts so the response cache does not answer for the model
+    body = dict(params, text=f"{SAMPLE_TEXT} (run {ctx.nonce}, request {index})", age_group='middle')
+    ctx.request(f'POST {path}', 'POST', path, json=body)
+
+
+def upload_syllabus(ctx, index):
+    text = f"Course syllabus {ctx.nonce}-{index}\nUnit 1: Cells\nUnit 2: Genetics\nUnit 3: Evolution\n" + SAMPLE_TEXT
+    files = {'syllabus': (f'syllabus-{index}.txt', text.encode(), 'text/plain')}
+    start = time.perf_counter()
+    response = ctx.request('POST /api/syllabus/upload', 'POST', '/api/syllabus/upload',
+                           files=files, headers=ctx.auth_headers(index))
+    if response is None or response.status_code != 202:
+        return
+    # Time from upload to a finished analysis, as the frontend would see it
+    status_url = response.json()['status_url']
+    status = 'timeout'
+    while time.perf_counter() - start < 120:
+        time.sleep(0.1)
+        poll = ctx.request('GET /api/jobs/<id>', 'GET', status_url, headers=ctx.auth_headers(index))
+        job = poll.json().get('job', {}) if poll is not None and poll.ok else {}
+        if job.get('status') in ('completed', 'failed'):
+            status = 200 if job['status'] == 'completed' else 'failed'
+            break
+    ctx.recorder.record('job completion (upload to result)', status, time.perf_counter() - start)
+
+
+def dashboard_polling(ctx, index):
+    headers = ctx.auth_headers(index)
+    account = ctx.account(index)
+    ctx.request('GET /api/auth/profile', 'GET', '/api/auth/profile', headers=headers)
+    if index % 10 == 9:
+        ctx.request('POST /api/auth/progress', 'POST', '/api/auth/progress', headers=headers,
+                    json={'subject': 'Math', 'activity_type': 'quiz', 'score': 80})
+    conditional = dict(headers)
+    if account['email'] in ctx.etags:
+        conditional['If-None-Match'] = ctx.etags[account['email']]
+    response = ctx.request('GET /api/auth/progress', 'GET', '/api/auth/progress', headers=conditional)
+    if response is not None and response.headers.get('ETag'):
+        ctx.etags[account['email']] = response.headers['ETag']
+
+
+SCENARIO_FUNCTIONS = {
+    'login': login_storm,
+    'ai': ai_burst,
+    'uploads': upload_syllabus,
+    'dashboard': dashboard_polling,
+}
+
+
+def run_scenario(ctx, name, iterations, concurrency):
+    ctx.recorder = Recorder()
+    iteration = SCENARIO_FUNCTIONS[name]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix=f'load-{name}') as pool:
+        list(pool.map(lambda index: iteration(ctx, index), range(iterations)))
+    wall = time.perf_counter() - start
+    return {
+        'iterations': iterations,
+        'concurrency': concurrency,
+        'wall_s': round(wall, 3),
+        'endpoints': ctx.recorder.summary(wall),
+    }
+
+
+def print_scenario(name, result):
+    print(f"\n{name}: {result['iterations']} iterations, concurrency {result['concurrency']}, {result['wall_s']:.1f}s")
+    print(f"{'endpoint':<46}{'count':>7}{'errors':>8}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for endpoint, stats in result['endpoints'].items():
+        print(f"{endpoint:<46}{stats['count']:>7}{stats['errors']:>8}{stats['rps']:>9.1f}"
+              f"{stats['p50_ms']:>10.1f}{stats['p95_ms']:>10.1f}{stats['p99_ms']:>10.1f}")
+
+
+def compare(results, baseline, threshold):
+    """Print changes against a baseline; returns the number of regressions"""
+    regressions = 0
+    print(f"\nChanges against baseline {baseline['meta'].get('commit') or ''} "
+          f"({baseline['meta'].get('created', 'unknown date')}), threshold {threshold:.0%}")
+    for key in ('target', 'requests', 'concurrency', 'users', 'openai_latency'):
+        if baseline['meta'].get(key) != results['meta'][key]:
+            print(f"⚠️ {key} differs from the baseline ({baseline['meta'].get(key)} vs {results['meta'][key]})")
+    print(f"{'scenario / endpoint':<58}{'rps':>10}{'p50':>10}{'p95':>10}{'p99':>10}")
+    for name, result in results['scenarios'].items():
+        old_result = baseline['scenarios'].get(name)
+        if not old_result:
+            continue
+        for endpoint, stats in result['endpoints'].items():
+            old = old_result['endpoints'].get(endpoint)
+            if not old:
+                continue
+            cells, regressed = [], False
+            for field, higher_is_worse in (('rps', False), ('p50_ms', True), ('p95_ms', True), ('p99_ms', True)):
+                if not old[field]:
+                    cells.append('n/a')
+                    continue
+                change = (stats[field] - old[field]) / old[field]
+                cells.append(f"{change:+.0%}")
+                if (change > threshold) if higher_is_worse else (change < -threshold):
+                    regressed = True
+            regressions += regressed
+            label = f"{name} / {endpoint}"
+            print(f"{label:<58}" + ''.join(f"{cell:>10}" for cell in cells) + ('  REGRESSION' if regressed else ''))
+    return regressions
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def start_local_app(args):
+    """Serve the app in-process on a seeded database; returns (base_url, accounts)"""
+    from benchmarks.fake_openai import FakeOpenAIServer
+
+    fake = FakeOpenAIServer(latency=args.openai_latency, jitter=args.openai_latency / 4,
+                            error_rate=args.openai_error_rate, seed=args.seed).start()
+    os.environ['OPENAI_API_KEY'] = 'fake'
+    os.environ['OPENAI_API_BASE'] = fake.base_url
+    os.environ.setdefault('RATE_LIMIT_ENABLED', 'false')
+    os.environ.setdefault('AI_TOKEN_BUDGET_ENABLED', 'false')
+    if args.backend == 'postgres':
+        if not os.environ.get('DATABASE_URL'):
+            sys.exit("--backend postgres needs DATABASE_URL")
+        os.environ['AUTH_BACKEND'] = 'postgres'
+    else:
+        os.environ['AUTH_BACKEND'] = 'sqlite'
+        os.environ['SQLITE_PATH'] = os.path.join(tempfile.mkdtemp(prefix='studyverse-bench-'), 'bench.db')
+
+    from werkzeug.serving import WSGIRequestHandler, make_server
+    import main
+    from benchmarks.fixtures import seed
+
+    start = time.perf_counter()
+    accounts, created = seed(args.users, args.events, seed=args.seed)
+    print(f"Seeded {len(accounts)} users ({created} new) on {args.backend} in {time.perf_counter() - start:.1f}s")
+
+    class QuietRequestHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    server = make_server('127.0.0.1', 0, main.app, threaded=True, request_handler=QuietRequestHandler)
+    threading.Thread(target=server.serve_forever, name='load-app', daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}", accounts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS))
+    parser.add_argument('--requests', type=int, default=200, help='iterations per scenario')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--url', help='load a running server instead of an in-process one')
+    parser.add_argument('--backend', choices=('sqlite', 'postgres'), default='sqlite')
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--events', type=int, default=200, help='seeded progress events per user')
+    parser.add_argument('--seed', type=int, default=1234)
+    parser.add_argument('--openai-latency', type=float, default=0.2, help='seconds per fake OpenAI call')
+    parser.add_argument('--openai-error-rate', type=float, default=0.0)
+    parser.add_argument('--save-baseline', metavar='PATH', help='write the results as JSON')
+    parser.add_argument('--baseline', metavar='PATH', help='compare with saved results; exit 1 on regressions')
+    parser.add_argument('--threshold', type=float, default=0.15, help='relative change counted as a regression')
+    args = parser.parse_args()
+
+    scenarios = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    if args.url:
+        from benchmarks.fixtures import PASSWORD, bench_email
+        base_url = args.url
+        accounts = [{'email': bench_email(index), 'password': PASSWORD} for index in range(args.users)]
+    else:
+        base_url, accounts = start_local_app(args)
+
+    ctx = LoadContext(base_url, accounts, nonce=int(time.time()))
+    # Sign every account in once, outside the measurements
+    for account in accounts:
+        response = ctx.session.post(f"{ctx.base_url}/api/auth/login", timeout=60,
+                                    json={'email': account['email'], 'password': account['password']})
+        if response.status_code != 200:
+            sys.exit(f"Login of {account['email']} failed ({response.status_code}); seed with benchmarks.fixtures")
+        account['token'] = response.json()['token']
+
+    results = {
+        'meta': {
+            'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'target': args.url or f'in-process ({args.backend})',
+            'requests': args.requests,
+            'concurrency': args.concurrency,
+            'users': args.users,
+            'openai_latency': None if args.url else args.openai_latency,
+        },
+        'scenarios': {},
+    }
+    for name in scenarios:
+        results['scenarios'][name] = run_scenario(ctx, name, args.requests, args.concurrency)
+        print_scenario(name, results['scenarios'][name])
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save_baseline)), exist_ok=True)
+        with open(args.save_baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nSaved baseline to {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{regressions} endpoint(s) regressed by more than {args.threshold:.0%}")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""
+Login throughput benchmark
+Simulates a start-of-day login storm: many threads verify bcrypt passwords
+while a probe thread measures how long a cheap request (JSON encode of a
+small payload) takes in the same process. Compares inline hashing on the
+request thread with the bounded process pool, and reports the cost of
+each BCRYPT_ROUNDS setting.
+
+Usage: python -m benchmarks.login_bench [--logins 200] [--threads 16] [--workers 2] [--rounds 10 12]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from password_hashing import PasswordHasher
+
+PASSWORD = 'correct horse battery staple'
+PROBE_PAYLOAD = {'status': 'healthy', 'items': [{'id': i, 'name': f'item {i}'} for i in range(200)]}
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))] if values else 0.0
+
+
+def probe(stop, latencies, interval=0.01):
+    """Time a small CPU-bound request repeatedly until stopped"""
+    while not stop.is_set():
+        start = time.perf_counter()
+        json.dumps(PROBE_PAYLOAD)
+        latencies.append(time.perf_counter() - start)
+        time.sleep(interval)
+
+
+def run_storm(hasher, stored_hash, logins, threads):
+    latencies, probe_latencies = [], []
+    stop = threading.Event()
+    prober = threading.Thread(target=probe, args=(stop, probe_latencies), daemon=True)
+    prober.start()
+
+    def login(_):
+        start = time.perf_counter()
+        assert hasher.verify(PASSWORD, stored_hash)
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(login, range(logins)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    prober.join()
+    return {
+        'logins_per_s': logins / elapsed,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+        'probe_p95_ms': percentile(probe_latencies, 95) * 1000,
+        'avg_queue_wait_ms': hasher.stats()['avg_queue_wait_ms'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--logins', type=int, default=200)
+    parser.add_argument('--threads', type=int, default=16, help='concurrent request threads')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 2, help='hashing processes')
+    parser.add_argument('--rounds', type=int, nargs='+', default=[10, 12])
+    args = parser.parse_args()
+
+    print(f"{args.logins} logins over {args.threads} threads, {os.cpu_count()} CPUs\n")
+    print(f"{'mode':<16}{'rounds':>7}{'logins/s':>10}{'p50 ms':>9}{'p95 ms':>9}"
+          f"{'queue ms':>10}{'probe p95 ms':>14}")
+    for rounds in args.rounds:
+        for name, workers in (('inline', 0), (f'pool x{args.workers}', args.workers)):
+            hasher = PasswordHasher(rounds=rounds, workers=workers, max_queue=args.threads,
+                                    queue_timeout=600)
+            stored_hash = hasher.hash(PASSWORD)
+            result = run_storm(hasher, stored_hash, args.logins, args.threads)
+            hasher.close()
+            print(f"{name:<16}{rounds:>7}{result['logins_per_s']:>10.1f}{result['p50_ms']:>9.1f}"
+                  f"{result['p95_ms']:>9.1f}{result['avg_queue_wait_ms']:>10.1f}{result['probe_p95_ms']:>14.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+"""
+Progress statistics benchmark
+Seeds a scratch schema with millions of user_progress rows and compares the
+old dashboard read (full aggregate over the user's history) with the rollup
+read, plus the cost of an incremental save.
+
+Needs a PostgreSQL database in DATABASE_URL; everything is created in the
+schema given by --schema and dropped afterwards unless --keep is passed.
+
+Usage: DATABASE_URL=... python -m benchmarks.progress_bench [--rows 2000000] [--users 50]
+"""
+
+import argparse
+import os
+import statistics
+import time
+
+import psycopg2
+from psycopg2.extras import RealDictCursor
+
+from auth_postgresql import apply_progress_rollup, migrate_progress_rollup
+
+OLD_STATS_QUERY = '''
+    SELECT COUNT(*) as total_sessions, COUNT(DISTINCT subject) as subjects_studied,
+           AVG(score) as average_score, MAX(completed_at) as last_activity
+    FROM user_progress WHERE user_id = %s
+'''
+ROLLUP_STATS_QUERY = '''
+    SELECT total_sessions, subjects_studied,
+           score_sum::float / NULLIF(score_count, 0) as average_score, last_activity
+    FROM user_progress_stats WHERE user_id = %s
+'''
+RECENT_QUERY = '''
+    SELECT subject, activity_type, score, completed_at FROM user_progress
+    WHERE user_id = %s ORDER BY completed_at DESC LIMIT 10
+'''
+
+
+def timed(cursor, query, params, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        cursor.execute(query, params)
+        cursor.fetchall()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def seed(cursor, rows, users):
+    cursor.execute('''
+        CREATE TABLE users (
+            id SERIAL PRIMARY KEY, email VARCHAR(255) UNIQUE NOT NULL
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE user_progress (
+            id SERIAL PRIMARY KEY,
+            user_id INTEGER NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+            subject VARCHAR(100) NOT NULL,
+            activity_type VARCHAR(100) NOT NULL,
+            content TEXT,
+            score INTEGER,
+            completed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute('''
+        INSERT INTO users (email) SELECT 'bench' || g || '@example.com' FROM generate_series(1, %s) g
+    ''', (users,))
+    # Half of all rows belong to user 1, the "heavy" user; the rest are spread out
+    cursor.execute('''
+        INSERT INTO user_progress (user_id, subject, activity_type, score, completed_at)
+        SELECT CASE WHEN g %% 2 = 0 THEN 1 ELSE 1 + (g %% %s) END,
+               'Subject ' || (g %% 12),
+               (ARRAY['quiz', 'flashcards', 'text_analysis'])[1 + g %% 3],
+               CASE WHEN g %% 5 = 0 THEN NULL ELSE g %% 101 END,
+               TIMESTAMP '2024-01-01' + (g || ' seconds')::interval
+        FROM generate_series(1, %s) g
+    ''', (users, rows))
+    cursor.execute('ANALYZE user_progress')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=2_000_000)
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--schema', default='bench_progress')
+    parser.add_argument('--keep', action='store_true', help='keep the scratch schema afterwards')
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(os.environ['DATABASE_URL'], cursor_factory=RealDictCursor)
+    conn.autocommit = True
+    cursor = conn.cursor()
+    cursor.execute(f'DROP SCHEMA IF EXISTS {args.schema} CASCADE')
+    cursor.execute(f'CREATE SCHEMA {args.schema}')
+    cursor.execute(f'SET search_path TO {args.schema}')
+
+    try:
+        start = time.perf_counter()
+        seed(cursor, args.rows, args.users)
+        print(f"Seeded {args.rows:,} rows in {time.perf_counter() - start:.1f}s "
+              f"(heavy user has ~{args.rows // 2:,} rows)")
+
+        results = [('aggregate, no index', timed(cursor, OLD_STATS_QUERY, (1,), args.repeat)),
+                   ('recent 10, no index', timed(cursor, RECENT_QUERY, (1,), args.repeat))]
+
+        start = time.perf_counter()
+        conn.autocommit = False
+        migrate_progress_rollup(cursor)
+        conn.commit()
+        conn.autocommit = True
+        cursor.execute('ANALYZE')
+        print(f"Migration (indexes + rollup backfill) took {time.perf_counter() - start:.1f}s")
+
+        results += [('aggregate, with index', timed(cursor, OLD_STATS_QUERY, (1,), args.repeat)),
+                    ('rollup lookup', timed(cursor, ROLLUP_STATS_QUERY, (1,), args.repeat)),
+                    ('recent 10, with index', timed(cursor, RECENT_QUERY, (1,), args.repeat))]
+
+        timings = []
+        conn.autocommit = False
+        for i in range(args.repeat):
+            start = time.perf_counter()
+            cursor.execute('''
+                INSERT INTO user_progress (user_id, subject, activity_type, score)
+                VALUES (1, %s, 'quiz', 90) RETURNING completed_at
+            ''', (f'Subject {i}',))
+            completed_at = cursor.fetchone()['completed_at']
+            apply_progress_rollup(cursor, 1, [{'subject': f'Subject {i}', 'score': 90, 'completed_at': completed_at}])
+            conn.commit()
+            timings.append(time.perf_counter() - start)
+        conn.autocommit = True
+        results.append(('save + rollup update', statistics.median(timings) * 1000))
+
+        cursor.execute(OLD_STATS_QUERY, (1,))
+        exact = cursor.fetchone()
+        cursor.execute(ROLLUP_STATS_QUERY, (1,))
+        rollup = cursor.fetchone()
+        consistent = (exact['total_sessions'] == rollup['total_sessions']
+                      and exact['subjects_studied'] == rollup['subjects_studied'])
+
+        print(f"\n{'operation':<26}{'median ms':>12}")
+        for name, ms in results:
+            print(f"{name:<26}{ms:>12.2f}")
+        print(f"\nRollup matches full aggregate: {consistent}")
+    finally:
+        if not args.keep:
+            conn.rollback()
+            conn.autocommit = True
+            cursor.execute(f'DROP SCHEMA IF EXISTS {args.schema} CASCADE')
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
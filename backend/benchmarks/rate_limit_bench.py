@@ -0,0 +1,75 @@
+"""
+Rate limiter overhead benchmark
+Measures the per-request cost of RateLimiter.hit for the in-memory store
+(single thread and under thread contention, with few or many distinct
+keys) and, when DATABASE_URL is set, for the shared Postgres store.
+
+Usage: python -m benchmarks.rate_limit_bench [--hits 200000] [--threads 8]
+"""
+
+import argparse
+import os
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from rate_limit import MemoryBucketStore, Policy, RateLimiter, RateLimitExceeded
+
+
+def make_limiter(store):
+    # Generous limits so the benchmark measures bookkeeping, not rejections
+    return RateLimiter([Policy('login_ip', 10 ** 9, 1)], store=store)
+
+
+def hit_many(limiter, keys, count):
+    start = time.perf_counter()
+    for i in range(count):
+        try:
+            limiter.hit('login_ip', keys[i % len(keys)])
+        except RateLimitExceeded:
+            pass
+    return time.perf_counter() - start
+
+
+def run(limiter, keys, hits, threads):
+    per_thread = hits // threads
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        start = time.perf_counter()
+        list(pool.map(lambda _: hit_many(limiter, keys, per_thread), range(threads)))
+        elapsed = time.perf_counter() - start
+    return elapsed / (per_thread * threads) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--hits', type=int, default=200000)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--db-hits', type=int, default=500)
+    args = parser.parse_args()
+
+    few_keys = [f'10.0.0.{i}' for i in range(16)]
+    many_keys = [f'10.{i // 65536}.{i // 256 % 256}.{i % 256}' for i in range(200000)]
+
+    print(f"{'store':<10}{'keys':>8}{'threads':>9}{'us/hit':>10}")
+    for keys in (few_keys, many_keys):
+        for threads in (1, args.threads):
+            store = MemoryBucketStore(maxsize=100000)
+            us = run(make_limiter(store), keys, args.hits, threads)
+            print(f"{'memory':<10}{len(keys):>8}{threads:>9}{us:>10.2f}")
+
+    if os.environ.get('DATABASE_URL'):
+        from auth_postgresql import db_connection
+        from rate_limit import PostgresBucketStore
+        limiter = make_limiter(PostgresBucketStore(db_connection))
+        timings = []
+        for i in range(args.db_hits):
+            start = time.perf_counter()
+            limiter.hit('login_ip', few_keys[i % len(few_keys)])
+            timings.append(time.perf_counter() - start)
+        print(f"{'postgres':<10}{len(few_keys):>8}{1:>9}{statistics.median(timings) * 1e6:>10.2f}")
+    else:
+        print("\nSet DATABASE_URL to include the shared Postgres store")
+
+
+if __name__ == '__main__':
+    main()
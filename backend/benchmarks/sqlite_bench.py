@@ -0,0 +1,117 @@
+"""
+SQLite backend concurrency benchmark
+Runs a mixed workload (profile reads, progress reads, batched progress
+writes) from many threads against the tuned backend (per-thread
+connection, WAL, busy timeout) and against the previous behavior (a new
+connection per call in the default rollback-journal mode), reporting
+throughput, latency percentiles and "database is locked" failures.
+
+Each mode gets a fresh database file in a temporary directory.
+
+Usage: python -m benchmarks.sqlite_bench [--threads 16] [--ops 300] [--write-ratio 0.3]
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault('BCRYPT_ROUNDS', '4')
+os.environ.setdefault('PASSWORD_HASH_WORKERS', '0')
+
+import auth_sqlite
+
+USERS = 50
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))] if values else 0.0
+
+
+@contextmanager
+def legacy_connection():
+    """The old behavior: open a default-configured connection for every call"""
+    conn = sqlite3.connect(auth_sqlite.DATABASE_PATH,
+                           detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES)
+    conn.row_factory = auth_sqlite._dict_factory
+    try:
+        yield conn
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def seed():
+    auth_sqlite.init_db()
+    for i in range(USERS):
+        auth_sqlite.create_user(f'bench{i}@example.com', 'password', 'Bench', str(i), 'middle')
+
+
+def operation(rng, write_ratio):
+    user_id = rng.randint(1, USERS)
+    if rng.random() < write_ratio:
+        events = [{'user_id': user_id, 'subject': f'Subject {rng.randint(1, 8)}',
+                   'activity_type': 'flashcards', 'score': rng.randint(0, 100)} for _ in range(10)]
+        auth_sqlite.save_progress_events(events)
+    elif rng.random() < 0.5:
+        auth_sqlite.get_user_profile(user_id)
+    else:
+        auth_sqlite.get_user_progress(user_id)
+
+
+def run_mode(name, threads, ops, write_ratio):
+    latencies, errors = [], []
+    lock = threading.Lock()
+
+    def worker(seed_value):
+        rng = random.Random(seed_value)
+        for _ in range(ops):
+            start = time.perf_counter()
+            try:
+                operation(rng, write_ratio)
+            except sqlite3.OperationalError as e:
+                with lock:
+                    errors.append(str(e))
+                continue
+            with lock:
+                latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(worker, range(threads)))
+    elapsed = time.perf_counter() - start
+    locked = sum('locked' in e for e in errors)
+    print(f"{name:<10}{len(latencies) / elapsed:>10.0f}{percentile(latencies, 50) * 1000:>9.2f}"
+          f"{percentile(latencies, 95) * 1000:>9.2f}{percentile(latencies, 99) * 1000:>9.2f}"
+          f"{locked:>8}{len(errors) - locked:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--ops', type=int, default=300, help='operations per thread')
+    parser.add_argument('--write-ratio', type=float, default=0.3)
+    args = parser.parse_args()
+
+    tuned_connection = auth_sqlite.db_connection
+    print(f"{args.threads} threads x {args.ops} ops, {args.write_ratio:.0%} batched writes\n")
+    print(f"{'mode':<10}{'ops/s':>10}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'locked':>8}{'other':>8}")
+    with tempfile.TemporaryDirectory() as directory:
+        for name, connection in (('legacy', legacy_connection), ('tuned', tuned_connection)):
+            auth_sqlite.set_database_path(os.path.join(directory, f'{name}.db'))
+            auth_sqlite.db_connection = connection
+            seed()
+            run_mode(name, args.threads, args.ops, args.write_ratio)
+    auth_sqlite.db_connection = tuned_connection
+
+
+if __name__ == '__main__':
+    main()
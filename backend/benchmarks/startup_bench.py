@@ -0,0 +1,52 @@
+"""
+Worker boot latency benchmark
+Imports the app module in fresh interpreters, the way each gunicorn worker
+does, and reports wall-clock import time alongside the STARTUP_MS the app
+measures itself. Since startup no longer opens database connections or
+runs DDL, boot time should not depend on whether the database is reachable.
+
+Usage: python -m benchmarks.startup_bench [--runs 10]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SNIPPET = 'import main; print("STARTUP_MS", main.STARTUP_MS)'
+
+
+def boot_once(env):
+    """Return (wall seconds, app-reported ms) for one fresh import of main"""
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-c', SNIPPET], cwd=BACKEND_DIR, env=env,
+                            capture_output=True, text=True, check=True)
+    wall = time.perf_counter() - start
+    reported = next(float(line.split()[1]) for line in result.stdout.splitlines()
+                    if line.startswith('STARTUP_MS'))
+    return wall, reported
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=10)
+    args = parser.parse_args()
+
+    env = dict(os.environ, PYTHONPATH=BACKEND_DIR, PYTHONDONTWRITEBYTECODE='1')
+    walls, reported = [], []
+    for _ in range(args.runs):
+        wall, app_ms = boot_once(env)
+        walls.append(wall * 1000)
+        reported.append(app_ms)
+
+    print(f"{args.runs} fresh imports of main (backend: {env.get('AUTH_BACKEND', 'default')})\n")
+    print(f"{'':<22}{'median ms':>10}{'max ms':>10}")
+    print(f"{'process wall time':<22}{statistics.median(walls):>10.1f}{max(walls):>10.1f}")
+    print(f"{'app STARTUP_MS':<22}{statistics.median(reported):>10.1f}{max(reported):>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
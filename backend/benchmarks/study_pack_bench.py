@@ -0,0 +1,115 @@
+"""
+Study pack benchmark
+Compares the three-call path (analyze-text, generate-flashcards,
+generate-quiz) with /api/ai/study-pack in combined and parallel mode,
+reporting wall-clock latency and prompt/completion token cost against a
+fake OpenAI client with configurable latency.
+
+Usage: python -m benchmarks.study_pack_bench [--rounds 5] [--latency 0.4] [--token-delay 0.002]
+"""
+
+import argparse
+import json
+import statistics
+import time
+
+from ai_client import ResilientChatClient
+from benchmarks.fake_openai import FakeOpenAIClient
+
+SAMPLE_TEXT = (
+    "Photosynthesis is the process plants use to turn light energy into chemical energy. "
+    "Chlorophyll in the chloroplasts absorbs sunlight, which drives the conversion of carbon "
+    "dioxide and water into glucose and oxygen. The light-dependent reactions happen in the "
+    "thylakoid membranes, while the Calvin cycle takes place in the stroma. "
+) * 12
+
+ANALYSIS = {
+    "reading_level": "Middle School",
+    "complexity_score": 6,
+    "key_topics": ["photosynthesis", "chlorophyll", "Calvin cycle"],
+    "estimated_reading_time": 3,
+    "recommendations": ["Draw the cycle", "Summarize each stage"],
+}
+FLASHCARD = {"question": "Where does the Calvin cycle happen?", "answer": "In the stroma",
+             "hint": "Not the thylakoid", "difficulty": "Medium"}
+QUESTION = {"question": "What absorbs sunlight?", "options": ["Chlorophyll", "Stroma", "Glucose", "Oxygen"],
+            "correct_answer": 0, "explanation": "Chlorophyll is the light-absorbing pigment"}
+
+
+def respond(prompt):
+    """Return a plausible completion for whichever prompt the app sent"""
+    if 'study pack' in prompt:
+        return json.dumps({"analysis": ANALYSIS, "flashcards": [FLASHCARD] * 5, "questions": [QUESTION] * 3})
+    if 'flashcards' in prompt:
+        return json.dumps({"flashcards": [FLASHCARD] * 5})
+    if 'multiple choice' in prompt:
+        return json.dumps({"questions": [QUESTION] * 3})
+    return json.dumps(ANALYSIS)
+
+
+def token_cost(fake):
+    prompt_tokens = sum(len(m['content']) // 4 for call in fake.calls for m in call['messages'])
+    completion_tokens = sum(len(respond(m['content'])) // 4 for call in fake.calls for m in call['messages'])
+    return prompt_tokens, completion_tokens
+
+
+def run_scenario(app_module, name, requests_fn, rounds, latency, token_delay):
+    client = app_module.app.test_client()
+    timings = []
+    fake = None
+    for i in range(rounds):
+        fake = FakeOpenAIClient(respond, latency=latency, token_delay=token_delay)
+        app_module.client = ResilientChatClient(fake)
+        app_module.ai_cache.clear()
+        text = f"{SAMPLE_TEXT} (round {i})"
+        start = time.perf_counter()
+        requests_fn(client, text)
+        timings.append(time.perf_counter() - start)
+    prompt_tokens, completion_tokens = token_cost(fake)
+    return {
+        'scenario': name,
+        'median_ms': round(statistics.median(timings) * 1000, 1),
+        'max_ms': round(max(timings) * 1000, 1),
+        'model_calls': len(fake.calls),
+        'prompt_tokens': prompt_tokens,
+        'completion_tokens': completion_tokens,
+    }
+
+
+def three_calls(client, text):
+    body = {'text': text, 'age_group': 'middle'}
+    client.post('/api/ai/analyze-text', json=body)
+    client.post('/api/ai/generate-flashcards', json={**body, 'count': 5})
+    client.post('/api/ai/generate-quiz', json={**body, 'count': 3})
+
+
+def study_pack(mode):
+    def call(client, text):
+        response = client.post('/api/ai/study-pack', json={'text': text, 'age_group': 'middle', 'mode': mode})
+        assert response.status_code == 200, response.get_data(as_text=True)
+    return call
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--latency', type=float, default=0.4, help='fake time to first token (s)')
+    parser.add_argument('--token-delay', type=float, default=0.002, help='fake seconds per completion token')
+    args = parser.parse_args()
+
+    import main as app_module
+
+    results = [
+        run_scenario(app_module, 'three-calls', three_calls, args.rounds, args.latency, args.token_delay),
+        run_scenario(app_module, 'study-pack combined', study_pack('combined'), args.rounds, args.latency, args.token_delay),
+        run_scenario(app_module, 'study-pack parallel', study_pack('parallel'), args.rounds, args.latency, args.token_delay),
+    ]
+
+    print(f"{'scenario':<22}{'median ms':>11}{'max ms':>9}{'calls':>7}{'prompt tok':>12}{'output tok':>12}")
+    for r in results:
+        print(f"{r['scenario']:<22}{r['median_ms']:>11}{r['max_ms']:>9}{r['model_calls']:>7}"
+              f"{r['prompt_tokens']:>12}{r['completion_tokens']:>12}")
+
+
+if __name__ == '__main__':
+    main()
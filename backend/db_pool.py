@@ -0,0 +1,243 @@
+"""
+StudyVerse Database Connection Pool
+Thread-safe PostgreSQL connection pool with checkout health checks and stats
+"""
+
+import os
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+from profiler import span
+
+
+class PoolTimeoutError(Exception):
+    """Raised when no connection becomes available within the checkout timeout"""
+
+
+class PoolClosedError(Exception):
+    """Raised when a connection is requested from a closed pool"""
+
+
+class ConnectionPool:
+    """Bounded pool of DB-API connections.
+
+    ``connect`` is any zero-argument callable returning a DB-API connection,
+    so the pool can run against psycopg2, sqlite3 or a test stand-in.
+    Idle connections are health-checked on checkout when they have been idle
+    longer than ``health_check_interval`` seconds; dead ones are discarded
+    and replaced transparently.
+    """
+
+    def __init__(self, connect, min_size=1, max_size=10, timeout=10.0,
+                 health_check_interval=30.0, max_lifetime=1800.0):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError("Invalid pool size: min_size=%s max_size=%s" % (min_size, max_size))
+
+        self._connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self.max_lifetime = max_lifetime
+
+        self._lock = threading.Condition()
+        self._idle = deque()          # (conn, created_at, last_used_at)
+        self._created_at = {}         # id(conn) -> created_at for checked-out conns
+        self._size = 0                # idle + checked out
+        self._closed = False
+
+        self._stats = {
+            'connections_created': 0,
+            'connections_closed': 0,
+            'checkouts': 0,
+            'checkout_timeouts': 0,
+            'health_check_failures': 0,
+            'wait_time_total': 0.0,
+            'waiting': 0,
+        }
+
+        for _ in range(min_size):
+            conn = self._new_connection()
+            self._idle.append((conn, time.monotonic(), time.monotonic()))
+
+    def _new_connection(self):
+        conn = self._connect()
+        self._size += 1
+        self._stats['connections_created'] += 1
+        return conn
+
+    def _discard(self, conn):
+        self._size -= 1
+        self._stats['connections_closed'] += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _is_healthy(self, conn):
+        """Run a trivial query to verify the connection is still usable"""
+        if getattr(conn, 'closed', 0):
+            return False
+        try:
+            cursor = conn.cursor()
+            try:
+                cursor.execute('SELECT 1')
+                cursor.fetchone()
+            finally:
+                cursor.close()
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def getconn(self):
+        """Check out a connection, blocking up to ``timeout`` seconds"""
+        start = time.monotonic()
+        deadline = start + self.timeout
+
+        with self._lock:
+            while True:
+                if self._closed:
+                    raise PoolClosedError("Connection pool is closed")
+
+                if self._idle:
+                    conn, created_at, last_used = self._idle.pop()
+                    break
+
+                if self._size < self.max_size:
+                    # Reserve the slot before releasing the lock to connect
+                    self._size += 1
+                    conn = None
+                    break
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats['checkout_timeouts'] += 1
+                    raise PoolTimeoutError(
+                        "Timed out after %.1fs waiting for a database connection" % self.timeout
+                    )
+                self._stats['waiting'] += 1
+                try:
+                    self._lock.wait(remaining)
+                finally:
+                    self._stats['waiting'] -= 1
+
+        if conn is None:
+            try:
+                with span('db_connect', 'new connection'):
+                    conn = self._connect()
+            except Exception:
+                with self._lock:
+                    self._size -= 1
+                    self._lock.notify()
+                raise
+            created_at = time.monotonic()
+            with self._lock:
+                self._stats['connections_created'] += 1
+        else:
+            now = time.monotonic()
+            expired = self.max_lifetime and now - created_at > self.max_lifetime
+            stale = now - last_used > self.health_check_interval
+            if expired or (stale and not self._is_healthy(conn)):
+                with self._lock:
+                    if not expired:
+                        self._stats['health_check_failures'] += 1
+                    self._discard(conn)
+                    self._size += 1
+                try:
+                    with span('db_connect', 'replace connection'):
+                        conn = self._connect()
+                except Exception:
+                    with self._lock:
+                        self._size -= 1
+                        self._lock.notify()
+                    raise
+                created_at = time.monotonic()
+                with self._lock:
+                    self._stats['connections_created'] += 1
+
+        with self._lock:
+            self._created_at[id(conn)] = created_at
+            self._stats['checkouts'] += 1
+            self._stats['wait_time_total'] += time.monotonic() - start
+        return conn
+
+    def putconn(self, conn, discard=False):
+        """Return a connection to the pool, rolling back any open transaction"""
+        if not discard:
+            try:
+                if getattr(conn, 'closed', 0):
+                    discard = True
+                else:
+                    conn.rollback()
+            except Exception:
+                discard = True
+
+        with self._lock:
+            created_at = self._created_at.pop(id(conn), time.monotonic())
+            if discard or self._closed:
+                self._discard(conn)
+            else:
+                self._idle.append((conn, created_at, time.monotonic()))
+            self._lock.notify()
+
+    @contextmanager
+    def connection(self):
+        """Context manager yielding a pooled connection.
+
+        The transaction is rolled back on exceptions; callers commit explicitly.
+        Connections that raised a driver-level error are discarded.
+        """
+        conn = self.getconn()
+        discard = False
+        try:
+            yield conn
+        except Exception as e:
+            discard = _is_connection_error(e)
+            raise
+        finally:
+            self.putconn(conn, discard=discard)
+
+    def close(self):
+        """Close all idle connections and refuse further checkouts"""
+        with self._lock:
+            self._closed = True
+            while self._idle:
+                conn, _, _ = self._idle.pop()
+                self._discard(conn)
+            self._lock.notify_all()
+
+    def stats(self):
+        """Snapshot of pool counters suitable for exporting"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = self._size
+            stats['idle'] = len(self._idle)
+            stats['in_use'] = self._size - len(self._idle)
+            stats['min_size'] = self.min_size
+            stats['max_size'] = self.max_size
+        checkouts = stats['checkouts']
+        stats['avg_wait_ms'] = round(stats['wait_time_total'] / checkouts * 1000, 3) if checkouts else 0.0
+        return stats
+
+
+def _is_connection_error(error):
+    """True for errors that leave the connection unusable"""
+    try:
+        import psycopg2
+        return isinstance(error, (psycopg2.OperationalError, psycopg2.InterfaceError))
+    except ImportError:
+        return False
+
+
+def pool_config_from_env():
+    """Read pool sizing from the environment"""
+    return {
+        'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', 1)),
+        'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', 10)),
+        'timeout': float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+        'health_check_interval': float(os.environ.get('DB_POOL_HEALTH_CHECK_INTERVAL', 30)),
+        'max_lifetime': float(os.environ.get('DB_POOL_MAX_LIFETIME', 1800)),
+    }
@@ -0,0 +1,632 @@
+"""
+StudyVerse Background Jobs
+Durable job queue for slow analyses: requests enqueue work and return a job
+id, worker threads process it out of band with retries, and results are
+available by polling or via an optional webhook
+"""
+
+import os
+import hmac
+import json
+import time
+import heapq
+import socket
+import hashlib
+import ipaddress
+import threading
+import contextvars
+import itertools
+from datetime import datetime
+from urllib.parse import urlparse
+
+import requests
+
+QUEUED = 'queued'
+RUNNING = 'running'
+COMPLETED = 'completed'
+FAILED = 'failed'
+
+
+class JobQueueFullError(Exception):
+    """Raised when too many jobs are already waiting"""
+
+    def __init__(self, message, retry_after=30):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CallbackURLError(ValueError):
+    """Raised for a webhook URL the server will not call"""
+
+
+def check_callback_url(url, allowed_hosts):
+    """Raise CallbackURLError unless ``url`` is http(s) on an allowed host with only public addresses.
+
+    The host is resolved on every check (at enqueue and again before each
+    delivery), so a name that later points inside the network is refused.
+    """
+    parsed = urlparse(url or '')
+    if parsed.scheme not in ('http', 'https') or not parsed.hostname:
+        raise CallbackURLError("callback_url must be an http(s) URL")
+    host = parsed.hostname.lower()
+    if host not in allowed_hosts:
+        raise CallbackURLError(f"callback_url host '{host}' is not allowed")
+    try:
+        port = parsed.port or (443 if parsed.scheme == 'https' else 80)
+        addresses = {info[4][0] for info in socket.getaddrinfo(host, port, proto=socket.IPPROTO_TCP)}
+    except (OSError, ValueError) as e:
+        raise CallbackURLError(f"callback_url host '{host}' cannot be resolved: {e}")
+    for address in addresses:
+        ip = ipaddress.ip_address(address.split('%', 1)[0])
+        if not ip.is_global or ip.is_multicast:
+            raise CallbackURLError(f"callback_url host '{host}' resolves to a non-public address")
+
+
+def sign_callback(secret, timestamp, body):
+    """Hex HMAC-SHA256 of "<timestamp>.<body>", sent as X-StudyVerse-Signature"""
+    return hmac.new(secret.encode('utf-8'), f"{timestamp}.".encode('utf-8') + body, hashlib.sha256).hexdigest()
+
+
+class MemoryJobStore:
+    """Process-local job store for tests and single-process deployments.
+
+    Jobs are lost on restart and only visible to the process that created
+    them, so job_queue_from_env refuses it for several web workers.
+    """
+
+    name = 'memory'
+
+    def __init__(self):
+        self._jobs = {}
+        self._ready = []          # heap of (run_after, job_id)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def enqueue(self, kind, user_id, payload, max_attempts, callback_url=None):
+        now = datetime.utcnow()
+        with self._lock:
+            job_id = next(self._ids)
+            job = {
+                'id': job_id, 'kind': kind, 'user_id': user_id, 'status': QUEUED,
+                'payload': payload, 'result': None, 'error': None, 'attempts': 0,
+                'max_attempts': max_attempts, 'callback_url': callback_url,
+                'created_at': now, 'updated_at': now,
+            }
+            self._jobs[job_id] = job
+            heapq.heappush(self._ready, (time.time(), job_id))
+            return dict(job)
+
+    def claim(self, lease_seconds):
+        now = time.time()
+        with self._lock:
+            while self._ready and self._ready[0][0] <= now:
+                _, job_id = heapq.heappop(self._ready)
+                job = self._jobs.get(job_id)
+                if job and job['status'] == QUEUED:
+                    job['status'] = RUNNING
+                    job['attempts'] += 1
+                    job['updated_at'] = datetime.utcnow()
+                    return dict(job)
+        return None
+
+    def _owned(self, job_id, attempt):
+        job = self._jobs[job_id]
+        return job if job['status'] == RUNNING and job['attempts'] == attempt else None
+
+    def complete(self, job_id, attempt, result):
+        with self._lock:
+            job = self._owned(job_id, attempt)
+            if job is None:
+                return False
+            job.update(status=COMPLETED, result=result, error=None, updated_at=datetime.utcnow())
+            return True
+
+    def fail(self, job_id, attempt, error, retry_in=None):
+        with self._lock:
+            job = self._owned(job_id, attempt)
+            if job is None:
+                return False
+            job['error'] = error
+            job['updated_at'] = datetime.utcnow()
+            if retry_in is None:
+                job['status'] = FAILED
+            else:
+                job['status'] = QUEUED
+                heapq.heappush(self._ready, (time.time() + retry_in, job_id))
+            return True
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def pending_count(self):
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if job['status'] in (QUEUED, RUNNING))
+
+
+# Same text format as auth_sqlite.NOW, so timestamps compare as strings
+SQLITE_NOW = "strftime('%Y-%m-%d %H:%M:%f', 'now')"
+
+
+def create_jobs_schema(cursor):
+    """DDL for the Postgres job table, applied by migrations.py"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS analysis_jobs (
+            id SERIAL PRIMARY KEY,
+            kind VARCHAR(50) NOT NULL,
+            user_id INTEGER NOT NULL,
+            status VARCHAR(20) NOT NULL DEFAULT 'queued',
+            payload JSONB NOT NULL,
+            result JSONB,
+            error TEXT,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            max_attempts INTEGER NOT NULL DEFAULT 3,
+            callback_url TEXT,
+            run_after TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            locked_until TIMESTAMP,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_analysis_jobs_ready
+        ON analysis_jobs (run_after, id) WHERE status IN ('queued', 'running')
+    ''')
+
+
+class PostgresJobStore:
+    """Job store in the application's PostgreSQL database.
+
+    Workers claim jobs with SELECT ... FOR UPDATE SKIP LOCKED, so any number
+    of worker threads or processes can share the table. Running jobs whose
+    lease expires (e.g. the worker was killed) are picked up again; the
+    attempt number a claim returns is its lease token, so complete() and
+    fail() from a worker that lost the lease change nothing and return False.
+    """
+
+    name = 'postgres'
+
+    def __init__(self, connection):
+        # Tables come from migrations.py (create_jobs_schema)
+        self._connection = connection
+
+    def enqueue(self, kind, user_id, payload, max_attempts, callback_url=None):
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT INTO analysis_jobs (kind, user_id, payload, max_attempts, callback_url)
+                VALUES (%s, %s, %s, %s, %s)
+                RETURNING *
+            ''', (kind, user_id, json.dumps(payload), max_attempts, callback_url))
+            job = cursor.fetchone()
+            conn.commit()
+            cursor.close()
+        return dict(job)
+
+    def claim(self, lease_seconds):
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                UPDATE analysis_jobs
+                SET status = 'running', attempts = attempts + 1,
+                    locked_until = CURRENT_TIMESTAMP + make_interval(secs => %s),
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE id = (
+                    SELECT id FROM analysis_jobs
+                    WHERE (status = 'queued' AND run_after <= CURRENT_TIMESTAMP)
+                       OR (status = 'running' AND locked_until < CURRENT_TIMESTAMP)
+                    ORDER BY run_after, id
+                    FOR UPDATE SKIP LOCKED
+                    LIMIT 1
+                )
+                RETURNING *
+            ''', (lease_seconds,))
+            job = cursor.fetchone()
+            conn.commit()
+            cursor.close()
+        return dict(job) if job else None
+
+    def complete(self, job_id, attempt, result):
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                UPDATE analysis_jobs
+                SET status = 'completed', result = %s, error = NULL,
+                    locked_until = NULL, updated_at = CURRENT_TIMESTAMP
+                WHERE id = %s AND status = 'running' AND attempts = %s
+            ''', (json.dumps(result), job_id, attempt))
+            owned = cursor.rowcount == 1
+            conn.commit()
+            cursor.close()
+        return owned
+
+    def fail(self, job_id, attempt, error, retry_in=None):
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            if retry_in is None:
+                cursor.execute('''
+                    UPDATE analysis_jobs
+                    SET status = 'failed', error = %s, locked_until = NULL,
+                        updated_at = CURRENT_TIMESTAMP
+                    WHERE id = %s AND status = 'running' AND attempts = %s
+                ''', (error, job_id, attempt))
+            else:
+                cursor.execute('''
+                    UPDATE analysis_jobs
+                    SET status = 'queued', error = %s, locked_until = NULL,
+                        run_after = CURRENT_TIMESTAMP + make_interval(secs => %s),
+                        updated_at = CURRENT_TIMESTAMP
+                    WHERE id = %s AND status = 'running' AND attempts = %s
+                ''', (error, retry_in, job_id, attempt))
+            owned = cursor.rowcount == 1
+            conn.commit()
+            cursor.close()
+        return owned
+
+    def get(self, job_id):
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT * FROM analysis_jobs WHERE id = %s', (job_id,))
+            job = cursor.fetchone()
+            cursor.close()
+        return dict(job) if job else None
+
+    def pending_count(self):
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT COUNT(*) AS pending FROM analysis_jobs WHERE status IN ('queued', 'running')
+            ''')
+            row = cursor.fetchone()
+            cursor.close()
+        return row['pending']
+
+
+def create_sqlite_jobs_schema(cursor):
+    """DDL for the SQLite job table, applied by migrations.py"""
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS analysis_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            user_id INTEGER NOT NULL,
+            status TEXT NOT NULL DEFAULT 'queued',
+            payload TEXT NOT NULL,
+            result TEXT,
+            error TEXT,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            max_attempts INTEGER NOT NULL DEFAULT 3,
+            callback_url TEXT,
+            run_after TIMESTAMP NOT NULL DEFAULT ({SQLITE_NOW}),
+            locked_until TIMESTAMP,
+            created_at TIMESTAMP DEFAULT ({SQLITE_NOW}),
+            updated_at TIMESTAMP DEFAULT ({SQLITE_NOW}),
+            FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_analysis_jobs_ready
+        ON analysis_jobs (run_after, id) WHERE status IN ('queued', 'running')
+    ''')
+
+
+class SqliteJobStore:
+    """Job store in the embedded SQLite database.
+
+    The database file is shared by every process on the host, so all web
+    workers (and ``python worker.py``) see the same jobs. A claim is one
+    UPDATE statement, which SQLite runs under its write lock.
+    """
+
+    name = 'sqlite'
+
+    def __init__(self, connection):
+        # Tables come from migrations.py (create_sqlite_jobs_schema)
+        self._connection = connection
+
+    def _decode(self, job):
+        if job is None:
+            return None
+        job = dict(job)
+        job['payload'] = json.loads(job['payload'])
+        job['result'] = json.loads(job['result']) if job['result'] is not None else None
+        return job
+
+    def _fetch(self, cursor, job_id):
+        cursor.execute('SELECT * FROM analysis_jobs WHERE id = ?', (job_id,))
+        return self._decode(cursor.fetchone())
+
+    def enqueue(self, kind, user_id, payload, max_attempts, callback_url=None):
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT INTO analysis_jobs (kind, user_id, payload, max_attempts, callback_url)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (kind, user_id, json.dumps(payload), max_attempts, callback_url))
+            job = self._fetch(cursor, cursor.lastrowid)
+            conn.commit()
+            cursor.close()
+        return job
+
+    def claim(self, lease_seconds):
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                UPDATE analysis_jobs
+                SET status = 'running', attempts = attempts + 1,
+                    locked_until = strftime('%Y-%m-%d %H:%M:%f', 'now', ?),
+                    updated_at = {SQLITE_NOW}
+                WHERE id = (
+                    SELECT id FROM analysis_jobs
+                    WHERE (status = 'queued' AND run_after <= {SQLITE_NOW})
+                       OR (status = 'running' AND locked_until < {SQLITE_NOW})
+                    ORDER BY run_after, id
+                    LIMIT 1
+                )
+                RETURNING id
+            ''', (f'+{lease_seconds} seconds',))
+            row = cursor.fetchone()
+            job = self._fetch(cursor, row['id']) if row else None
+            conn.commit()
+            cursor.close()
+        return job
+
+    def complete(self, job_id, attempt, result):
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                UPDATE analysis_jobs
+                SET status = 'completed', result = ?, error = NULL,
+                    locked_until = NULL, updated_at = {SQLITE_NOW}
+                WHERE id = ? AND status = 'running' AND attempts = ?
+            ''', (json.dumps(result), job_id, attempt))
+            owned = cursor.rowcount == 1
+            conn.commit()
+            cursor.close()
+        return owned
+
+    def fail(self, job_id, attempt, error, retry_in=None):
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            if retry_in is None:
+                cursor.execute(f'''
+                    UPDATE analysis_jobs
+                    SET status = 'failed', error = ?, locked_until = NULL,
+                        updated_at = {SQLITE_NOW}
+                    WHERE id = ? AND status = 'running' AND attempts = ?
+                ''', (error, job_id, attempt))
+            else:
+                cursor.execute(f'''
+                    UPDATE analysis_jobs
+                    SET status = 'queued', error = ?, locked_until = NULL,
+                        run_after = strftime('%Y-%m-%d %H:%M:%f', 'now', ?),
+                        updated_at = {SQLITE_NOW}
+                    WHERE id = ? AND status = 'running' AND attempts = ?
+                ''', (error, f'+{retry_in} seconds', job_id, attempt))
+            owned = cursor.rowcount == 1
+            conn.commit()
+            cursor.close()
+        return owned
+
+    def get(self, job_id):
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            job = self._fetch(cursor, job_id)
+            cursor.close()
+        return job
+
+    def pending_count(self):
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT COUNT(*) AS pending FROM analysis_jobs WHERE status IN ('queued', 'running')
+            ''')
+            row = cursor.fetchone()
+            cursor.close()
+        return row['pending']
+
+
+class JobQueue:
+    """Runs registered handlers for queued jobs on a bounded set of worker threads.
+
+    ``handlers`` maps a job kind to ``handler(job) -> result``. A handler that
+    raises is retried with exponential backoff until ``max_attempts`` is
+    reached, then the job is marked failed. If the job's lease expired and
+    another worker claimed it meanwhile, this worker's outcome is dropped.
+
+    Webhooks are only sent to ``callback_hosts`` (none by default), signed
+    with ``callback_secret``.
+    """
+
+    def __init__(self, store, workers=2, max_attempts=3, retry_base_delay=5.0,
+                 max_pending=500, lease_seconds=600, poll_interval=1.0,
+                 callback_hosts=(), callback_secret=None):
+        self.store = store
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_base_delay = retry_base_delay
+        self.max_pending = max_pending
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.callback_hosts = frozenset(host.lower() for host in callback_hosts) if callback_secret else frozenset()
+        self.callback_secret = callback_secret
+        self.handlers = {}
+        self._threads = []
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._stats = {'enqueued': 0, 'completed': 0, 'retried': 0, 'failed': 0, 'rejected': 0, 'lease_lost': 0}
+
+    def register(self, kind, handler):
+        self.handlers[kind] = handler
+
+    def enqueue(self, kind, user_id, payload, callback_url=None):
+        """Persist a job and wake a worker; raises JobQueueFullError when saturated
+        and CallbackURLError for a webhook URL outside the allowlist"""
+        if kind not in self.handlers:
+            raise ValueError(f"No handler registered for job kind '{kind}'")
+        if callback_url:
+            if not self.callback_hosts:
+                raise CallbackURLError("callback_url is not enabled on this server")
+            check_callback_url(callback_url, self.callback_hosts)
+        if self.max_pending and self.store.pending_count() >= self.max_pending:
+            with self._lock:
+                self._stats['rejected'] += 1
+            raise JobQueueFullError("Analysis queue is full, please retry shortly")
+
+        job = self.store.enqueue(kind, user_id, payload, self.max_attempts, callback_url)
+        with self._lock:
+            self._stats['enqueued'] += 1
+        self.start()
+        self._wakeup.set()
+        return job
+
+    def get(self, job_id):
+        return self.store.get(job_id)
+
+    def start(self):
+        """Start worker threads once (no-op when workers is 0)"""
+        if self._threads or self.workers <= 0:
+            return
+        with self._lock:
+            if self._threads:
+                return
+            for index in range(self.workers):
+                thread = threading.Thread(target=self._worker_loop, name=f'job-worker-{index}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self):
+        self._stop.set()
+        self._wakeup.set()
+
+    def run_forever(self):
+        """Run workers in the foreground (for a dedicated worker process)"""
+        self.start()
+        try:
+            while not self._stop.is_set():
+                self._stop.wait(1.0)
+        except KeyboardInterrupt:
+            self.stop()
+
+    def _worker_loop(self):
+        while not self._stop.is_set():
+            try:
+                job = self.store.claim(self.lease_seconds)
+            except Exception as e:
+                print(f"Job claim error: {e}")
+                job = None
+            if job is None:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+            try:
+                self.process(job)
+            except Exception as e:
+                # Recording the outcome failed; the job's lease expires and
+                # it is claimed again, so keep this worker alive
+                print(f"Job {job['id']} processing error: {e}")
+
+    def process(self, job):
+        """Run one claimed job through its handler and record the outcome"""
+        handler = self.handlers.get(job['kind'])
+        try:
+            if handler is None:
+                raise ValueError(f"No handler registered for job kind '{job['kind']}'")
+            # A fresh context per job, so context variables a handler sets
+            # (e.g. whose token budget it uses) do not leak into the next job
+            result = contextvars.copy_context().run(handler, job)
+        except Exception as e:
+            error = str(e) or e.__class__.__name__
+            if job['attempts'] < job['max_attempts']:
+                delay = self.retry_base_delay * (2 ** (job['attempts'] - 1))
+                print(f"Job {job['id']} attempt {job['attempts']} failed, retrying in {delay:.0f}s: {error}")
+                if self._owned(job, self.store.fail(job['id'], job['attempts'], error, retry_in=delay)):
+                    with self._lock:
+                        self._stats['retried'] += 1
+            else:
+                print(f"❌ Job {job['id']} failed after {job['attempts']} attempts: {error}")
+                if self._owned(job, self.store.fail(job['id'], job['attempts'], error)):
+                    with self._lock:
+                        self._stats['failed'] += 1
+                    self._notify(job, FAILED, error=error)
+            return
+
+        if self._owned(job, self.store.complete(job['id'], job['attempts'], result)):
+            with self._lock:
+                self._stats['completed'] += 1
+            self._notify(job, COMPLETED, result=result)
+
+    def _owned(self, job, recorded):
+        """Count and log an outcome the store refused because the lease moved on"""
+        if not recorded:
+            print(f"⚠️ Job {job['id']} attempt {job['attempts']} lost its lease; outcome discarded")
+            with self._lock:
+                self._stats['lease_lost'] += 1
+        return recorded
+
+    def _notify(self, job, status, result=None, error=None):
+        """POST the signed outcome to the job's callback URL, if one was given"""
+        url = job.get('callback_url')
+        if not url:
+            return
+        try:
+            check_callback_url(url, self.callback_hosts)
+            body = json.dumps({
+                'job_id': job['id'], 'kind': job['kind'], 'status': status,
+                'result': result, 'error': error,
+            }, default=str).encode('utf-8')
+            timestamp = str(int(time.time()))
+            requests.post(url, data=body, timeout=5, allow_redirects=False, headers={
+                'Content-Type': 'application/json',
+                'X-StudyVerse-Timestamp': timestamp,
+                'X-StudyVerse-Signature': f"sha256={sign_callback(self.callback_secret, timestamp, body)}",
+            })
+        except Exception as e:
+            print(f"Job {job['id']} webhook failed: {e}")
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['store'] = self.store.name
+        stats['workers'] = self.workers
+        return stats
+
+
+def job_queue_from_env():
+    """Build the job queue on the storage backend's database (JOB_STORE overrides)"""
+    from auth import backend_name_from_env
+    store_name = os.environ.get('JOB_STORE', backend_name_from_env()).lower()
+    if store_name == 'postgres':
+        from auth_postgresql import db_connection
+        store = PostgresJobStore(db_connection)
+    elif store_name == 'sqlite':
+        from auth_sqlite import db_connection
+        store = SqliteJobStore(db_connection)
+    elif store_name == 'memory':
+        # Each web worker would only see its own jobs and polls that reach
+        # another worker would 404
+        web_workers = int(os.environ.get('WEB_CONCURRENCY', 1))
+        if web_workers > 1:
+            raise RuntimeError(f"JOB_STORE=memory cannot be shared by {web_workers} web workers; "
+                               "use the postgres or sqlite job store")
+        store = MemoryJobStore()
+    else:
+        raise ValueError(f"Unknown JOB_STORE '{store_name}', expected postgres, sqlite or memory")
+
+    callback_secret = os.environ.get('JOB_CALLBACK_SECRET') or None
+    callback_hosts = [host.strip() for host in os.environ.get('JOB_CALLBACK_HOSTS', '').split(',') if host.strip()]
+    if callback_hosts and not callback_secret:
+        print("⚠️ JOB_CALLBACK_HOSTS is set without JOB_CALLBACK_SECRET; job webhooks are disabled")
+
+    return JobQueue(
+        store,
+        workers=int(os.environ.get('JOB_WORKERS', 2)),
+        max_attempts=int(os.environ.get('JOB_MAX_ATTEMPTS', 3)),
+        retry_base_delay=float(os.environ.get('JOB_RETRY_BASE_DELAY', 5)),
+        max_pending=int(os.environ.get('JOB_MAX_PENDING', 500)),
+        lease_seconds=int(os.environ.get('JOB_LEASE_SECONDS', 600)),
+        callback_hosts=callback_hosts,
+        callback_secret=callback_secret,
+    )
@@ -1,13 +1,50 @@
 import os
-from openai import OpenAI
-from flask import Flask, jsonify, request
+import time
+
+# Worker boot latency: measured from the first line of the app module
+STARTUP_STARTED = time.perf_counter()
+
+from flask import Flask, g, jsonify, request, make_response, Response, stream_with_context
 from flask_cors import CORS
-from datetime import datetime
+from werkzeug.exceptions import RequestEntityTooLarge
+from datetime import datetime, timedelta, timezone
 import re
 import json
-from auth_postgresql import (
-    create_user, authenticate_user, get_user_profile, 
-    save_user_progress, get_user_progress, require_auth, generate_token
+import base64
+import contextvars
+from contextlib import ExitStack
+from functools import wraps
+from concurrent.futures import ThreadPoolExecutor
+from auth import (
+    get_password_hashing_stats, create_user, authenticate_user, get_user_profile, 
+    save_user_progress, save_progress_events, get_user_progress, get_progress_version, require_auth, generate_token,
+    save_syllabus_upload, save_report_card, find_stored_analysis, list_stored_analyses, token_user_id,
+    get_principal_cache_stats, ping_database, require_admin
+)
+from ai_cache import ai_cache_from_env, make_cache_key
+from ai_concurrency import AIBusyError, limiter_from_env
+from ai_client import (
+    AIUnavailableError, degraded_reason, degraded_reasons, fallback_totals, is_retryable, note_degraded,
+    resilient_client_from_env
+)
+from prompts import prompt_registry
+from model_router import PromptTooLargeError, model_router_from_env
+from token_budget import Caller, TokenBudgetExceeded, current_caller, token_budget_from_env
+from metrics import (
+    EXPOSITION_CONTENT_TYPE, LATENCY_BUCKETS, REQUEST_BUCKETS, TOKEN_BUCKETS, Counter, Gauge, Histogram,
+    registry as metrics_registry
+)
+from password_hashing import PasswordHashingBusyError
+from profiler import profiler_from_env, record_span, span
+from readiness import readiness_from_env
+from rate_limit import RateLimitExceeded, rate_limiter_from_env
+from stream_json import ArrayItemStreamParser
+from text_extraction import ExtractionError, extract_text, stream_sha256, stream_size
+from jobs import CallbackURLError, JobQueueFullError, job_queue_from_env
+from progress_buffer import progress_buffer_from_env
+from map_reduce import (
+    CHARS_PER_TOKEN, CHUNK_TOKENS, chunk_text, estimate_tokens, map_chunks,
+    merge_syllabus_analyses, merge_text_analyses
 )
 
 # Initialize Flask app
@@ -21,14 +58,15 @@ CORS(app,
 # Configuration
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'studyverse-production-secret-key-2024')
 
-# Initialize OpenAI client
+# Uploads larger than this are rejected; the request cap leaves room for multipart overhead
+MAX_UPLOAD_BYTES = 10 * 1024 * 1024  # 10MB limit
+app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_BYTES + 64 * 1024
+
+# Initialize OpenAI client (deadlines, retries, circuit breaker; see ai_client.py)
 client = None
 try:
-    if os.environ.get('OPENAI_API_KEY'):
-        client = OpenAI(
-            api_key=os.environ.get('OPENAI_API_KEY'),
-            base_url=os.environ.get('OPENAI_API_BASE', 'https://api.openai.com/v1')
-        )
+    client = resilient_client_from_env()
+    if client:
         print("✅ OpenAI client initialized successfully")
     else:
         print("⚠️ OpenAI API key not found - AI features will be disabled")
@@ -36,158 +74,524 @@ except Exception as e:
     print(f"⚠️ OpenAI client initialization failed: {e}")
     client = None
 
+# Picks the model and max_tokens per call; cache keys include the routed
+# model and the prompt template's version hash (prompts.py)
+model_router = model_router_from_env()
+
+# Daily token allowances per user (or client IP when signed out)
+token_budget = token_budget_from_env()
+
+# Per-route distributions of OpenAI tokens and call latency
+ai_call_tokens = metrics_registry.register(
+    Histogram('ai_call_tokens', 'Tokens used per OpenAI call', TOKEN_BUCKETS, ('route', 'model'))
+)
+ai_call_seconds = metrics_registry.register(
+    Histogram('ai_call_duration_seconds', 'OpenAI call latency', LATENCY_BUCKETS, ('route', 'model'))
+)
+
+# Repeat uploads reuse stored analyses: 'user' (same user only), 'global' or 'off'
+ANALYSIS_DEDUP_SCOPE = os.environ.get('ANALYSIS_DEDUP_SCOPE', 'user')
+
+# Longer passages are analyzed with map-reduce rather than rejected
+ANALYZE_TEXT_MAX_CHARS = int(os.environ.get('ANALYZE_TEXT_MAX_CHARS', 100000))
+
+# Content-addressed cache for generator responses
+ai_cache = ai_cache_from_env()
+
+# Bounds concurrent OpenAI calls per worker so slow generations queue
+# (or are rejected with 503) instead of occupying every worker thread
+ai_limiter = limiter_from_env()
+
+def record_ai_call(caller, route, tokens, seconds):
+    """Add one completed OpenAI call to the per-route histograms"""
+    label = caller.route if caller else 'background'
+    ai_call_tokens.observe(tokens, route=label, model=route.model)
+    ai_call_seconds.observe(seconds, route=label, model=route.model)
+
+def create_chat_completion(route, **kwargs):
+    """Call the OpenAI chat API for a routed task while holding an AI concurrency slot.
+
+    The caller's daily budget is charged the call's worst case up front and
+    settled to the usage the API reports (nothing if the call fails).
+    """
+    if not client:
+        raise AIUnavailableError("OpenAI API key not configured", reason='ai_disabled')
+    caller = current_caller.get()
+    reservation = token_budget.reserve(caller, route.budget_tokens)
+    used = 0
+    try:
+        with ai_limiter.slot():
+            start = time.perf_counter()
+            with span('openai', route.task):
+                response = client.create(route.task, model=route.model, max_tokens=route.max_tokens, **kwargs)
+            elapsed = time.perf_counter() - start
+        usage = getattr(response, 'usage', None)
+        used = getattr(usage, 'total_tokens', None) or route.budget_tokens
+    finally:
+        token_budget.settle(reservation, used)
+    record_ai_call(caller, route, used, elapsed)
+    prompt_registry.record_usage(route.task, response)
+    return response
+
+def busy_response(error, status=503):
+    """503 (or 429) response telling the client when to retry"""
+    response = jsonify({'error': str(error)})
+    response.status_code = status
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
+# Token buckets per client IP and per account email for login/registration
+auth_rate_limiter = rate_limiter_from_env()
+
+# Number of reverse proxies in front of the app (Render adds one) whose
+# X-Forwarded-For entries can be trusted
+TRUSTED_PROXY_COUNT = int(os.environ.get('TRUSTED_PROXY_COUNT', 1))
+
+def client_ip():
+    """Client address as seen by the outermost trusted proxy"""
+    forwarded = [part.strip() for part in request.headers.get('X-Forwarded-For', '').split(',') if part.strip()]
+    if TRUSTED_PROXY_COUNT and len(forwarded) >= TRUSTED_PROXY_COUNT:
+        return forwarded[-TRUSTED_PROXY_COUNT]
+    return request.remote_addr
+
+def ai_caller():
+    """Budget subject and route label for AI calls made by the current request"""
+    user_id = token_user_id()
+    subject = f"user:{user_id}" if user_id else f"ip:{client_ip()}"
+    return Caller(subject, request.endpoint)
+
+def metered_ai_route(f):
+    """Attribute the AI calls a route makes (including in worker threads) to its caller.
+
+    If any fallback result was served the response is marked degraded: an
+    X-AI-Degraded header naming the reasons and "degraded": true in JSON
+    object bodies.
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        caller_token = current_caller.set(ai_caller())
+        reasons = []
+        reasons_token = degraded_reasons.set(reasons)
+        try:
+            response = make_response(f(*args, **kwargs))
+        finally:
+            current_caller.reset(caller_token)
+            degraded_reasons.reset(reasons_token)
+        
+        if reasons:
+            response.headers['X-AI-Degraded'] = ','.join(sorted(set(reasons)))
+            body = response.get_json(silent=True) if response.is_json else None
+            if isinstance(body, dict):
+                body['degraded'] = True
+                response.set_data(app.json.dumps(body))
+        return response
+    
+    return decorated_function
+
 # Helper functions
+def build_analysis_prompt(text, age_group):
+    """Build the reading level analysis prompt"""
+    return prompt_registry.render('analysis', age_group, text=text)
+
+def request_text_analysis(text, age_group):
+    """Analyze one passage with a single (cached) model call; raises on failure"""
+    route = model_router.route('analysis', text)
+    cache_key = make_cache_key('analysis', text, age_group, None, route.model, prompt_registry.version('analysis'))
+    cached = ai_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    
+    response = create_chat_completion(
+        route,
+        messages=[{"role": "user", "content": build_analysis_prompt(text, age_group)}],
+        temperature=0.3
+    )
+    
+    # Parse JSON response
+    result = json.loads(response.choices[0].message.content)
+    ai_cache.set(cache_key, result)
+    return result
+
+# Chunk errors that answer the whole request (429/503/413), as for a single call
+CHUNK_FATAL_ERRORS = (AIBusyError, PromptTooLargeError)
+
+def note_partial(partials, chunks):
+    """Mark a merge that is missing failed chunks as degraded, so it isn't stored for reuse"""
+    if len(partials) < len(chunks):
+        note_degraded('partial')
+
+def analyze_long_text(text, age_group):
+    """Map-reduce analysis: analyze token-budgeted chunks concurrently, then merge"""
+    chunks = chunk_text(text)
+    partials = map_chunks(chunks, lambda chunk, index, total: request_text_analysis(chunk, age_group),
+                          propagate=CHUNK_FATAL_ERRORS)
+    note_partial(partials, chunks)
+    return merge_text_analyses(partials, text)
+
 def analyze_text_with_ai(text, age_group="middle"):
     """Analyze text using OpenAI for reading level and complexity"""
     if not client:
+        note_degraded('ai_disabled')
         return {
             "reading_level": "Analysis unavailable",
             "complexity_score": 5,
-            "key_concepts": ["OpenAI service unavailable"],
-            "suggestions": ["Please configure OpenAI API key to enable AI analysis"],
-            "estimated_time": "N/A"
+            "key_topics": ["OpenAI service unavailable"],
+            "estimated_reading_time": max(1, len(text.split()) // 200),
+            "recommendations": ["Please configure OpenAI API key to enable AI analysis"]
         }
     
     try:
-        age_context = {
-            "preschool": "2-5 year olds, very simple language",
-            "elementary": "6-10 year olds, basic reading level", 
-            "middle": "11-14 year olds, intermediate complexity",
-            "high": "15-18 year olds, advanced concepts"
-        }
-        
-        prompt = f"""
-        Analyze this text for {age_context.get(age_group, 'students')}:
-        
-        "{text}"
-        
-        Provide analysis in this exact JSON format:
-        {{
-            "reading_level": "Elementary/Middle/High School",
-            "complexity_score": 1-10,
-            "key_topics": ["topic1", "topic2"],
-            "estimated_reading_time": minutes,
-            "recommendations": ["recommendation1", "recommendation2"]
-        }}
-        """
-        
-        response = client.chat.completions.create(
-            model="gpt-4",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.3
-        )
-        
-        # Parse JSON response
-        result = json.loads(response.choices[0].message.content)
-        return result
+        # Long passages are analyzed chunk by chunk and merged
+        if estimate_tokens(text) > CHUNK_TOKENS:
+            return analyze_long_text(text, age_group)
+        return request_text_analysis(text, age_group)
         
+    except (AIBusyError, PromptTooLargeError):
+        # Answered with 429/503 and 413 by the routes, not with a fallback
+        raise
     except Exception as e:
         # Fallback analysis if OpenAI fails
-        return {
-            "reading_level": "Middle School",
-            "complexity_score": 6,
-            "key_topics": ["general content"],
-            "estimated_reading_time": max(1, len(text.split()) // 200),
-            "recommendations": ["Break into smaller sections", "Add visual aids"]
-        }
+        note_degraded(degraded_reason(e))
+        return fallback_text_analysis(text)
+
+def fallback_text_analysis(text):
+    """Generic analysis served when the model cannot be reached"""
+    return {
+        "reading_level": "Middle School",
+        "complexity_score": 6,
+        "key_topics": ["general content"],
+        "estimated_reading_time": max(1, len(text.split()) // 200),
+        "recommendations": ["Break into smaller sections", "Add visual aids"]
+    }
+
+FALLBACK_FLASHCARDS = [
+    {
+        "question": "What is the main topic of this text?",
+        "answer": "The content focuses on key learning concepts",
+        "hint": "Look for the most frequently mentioned ideas",
+        "difficulty": "Easy"
+    }
+]
+
+FALLBACK_QUIZ = [
+    {
+        "question": "What is the main concept in this text?",
+        "options": ["Concept A", "Concept B", "Concept C", "Concept D"],
+        "correct_answer": 0,
+        "explanation": "This represents the primary focus of the content"
+    }
+]
+
+def build_flashcard_prompt(text, age_group, count):
+    """Build the flashcard generation prompt"""
+    return prompt_registry.render('flashcards', age_group, text=text, count=count)
+
+def build_quiz_prompt(text, age_group, count):
+    """Build the multiple choice quiz prompt"""
+    return prompt_registry.render('quiz', age_group, text=text, count=count)
 
 def generate_flashcards_with_ai(text, age_group="middle", count=5):
     """Generate flashcards using OpenAI"""
     try:
-        age_context = {
-            "preschool": "very simple questions for 2-5 year olds",
-            "elementary": "basic questions for 6-10 year olds",
-            "middle": "intermediate questions for 11-14 year olds", 
-            "high": "advanced questions for 15-18 year olds"
-        }
+        route = model_router.route('flashcards', text, count=count)
+        cache_key = make_cache_key('flashcards', text, age_group, count, route.model, prompt_registry.version('flashcards'))
+        cached = ai_cache.get(cache_key)
+        if cached is not None:
+            return cached
         
-        prompt = f"""
-        Create {count} flashcards from this text for {age_context.get(age_group, 'students')}:
-        
-        "{text}"
-        
-        Return exactly this JSON format:
-        {{
-            "flashcards": [
-                {{
-                    "question": "Clear question",
-                    "answer": "Concise answer",
-                    "hint": "Helpful hint",
-                    "difficulty": "Easy/Medium/Hard"
-                }}
-            ]
-        }}
-        """
-        
-        response = client.chat.completions.create(
-            model="gpt-4",
-            messages=[{"role": "user", "content": prompt}],
+        response = create_chat_completion(
+            route,
+            messages=[{"role": "user", "content": build_flashcard_prompt(text, age_group, count)}],
             temperature=0.5
         )
         
         result = json.loads(response.choices[0].message.content)
+        ai_cache.set(cache_key, result["flashcards"])
         return result["flashcards"]
         
+    except (AIBusyError, PromptTooLargeError):
+        # Answered with 429/503 and 413 by the routes, not with a fallback
+        raise
     except Exception as e:
         # Fallback flashcards if OpenAI fails
-        return [
-            {
-                "question": "What is the main topic of this text?",
-                "answer": "The content focuses on key learning concepts",
-                "hint": "Look for the most frequently mentioned ideas",
-                "difficulty": "Easy"
-            }
-        ]
+        note_degraded(degraded_reason(e))
+        return [dict(card) for card in FALLBACK_FLASHCARDS]
 
 def generate_quiz_with_ai(text, age_group="middle", count=3):
     """Generate quiz using OpenAI"""
     try:
-        age_context = {
-            "preschool": "very simple multiple choice for 2-5 year olds",
-            "elementary": "basic multiple choice for 6-10 year olds",
-            "middle": "intermediate multiple choice for 11-14 year olds",
-            "high": "advanced multiple choice for 15-18 year olds"
-        }
+        route = model_router.route('quiz', text, count=count)
+        cache_key = make_cache_key('quiz', text, age_group, count, route.model, prompt_registry.version('quiz'))
+        cached = ai_cache.get(cache_key)
+        if cached is not None:
+            return cached
         
-        prompt = f"""
-        Create {count} multiple choice questions from this text for {age_context.get(age_group, 'students')}:
-        
-        "{text}"
-        
-        Return exactly this JSON format:
-        {{
-            "questions": [
-                {{
-                    "question": "Question text?",
-                    "options": ["Option A", "Option B", "Option C", "Option D"],
-                    "correct_answer": 0,
-                    "explanation": "Why this answer is correct"
-                }}
-            ]
-        }}
-        """
-        
-        response = client.chat.completions.create(
-            model="gpt-4",
-            messages=[{"role": "user", "content": prompt}],
+        response = create_chat_completion(
+            route,
+            messages=[{"role": "user", "content": build_quiz_prompt(text, age_group, count)}],
             temperature=0.4
         )
         
         result = json.loads(response.choices[0].message.content)
+        ai_cache.set(cache_key, result["questions"])
         return result["questions"]
         
+    except (AIBusyError, PromptTooLargeError):
+        # Answered with 429/503 and 413 by the routes, not with a fallback
+        raise
     except Exception as e:
         # Fallback quiz if OpenAI fails
-        return [
-            {
-                "question": "What is the main concept in this text?",
-                "options": ["Concept A", "Concept B", "Concept C", "Concept D"],
-                "correct_answer": 0,
-                "explanation": "This represents the primary focus of the content"
+        note_degraded(degraded_reason(e))
+        return [dict(question) for question in FALLBACK_QUIZ]
+
+def build_study_pack_prompt(text, age_group, flashcard_count, quiz_count):
+    """Build one prompt that returns analysis, flashcards and quiz together"""
+    return prompt_registry.render('study_pack', age_group, text=text,
+                                  flashcard_count=flashcard_count, quiz_count=quiz_count)
+
+# Fan-out pool for parallel study packs; each task still takes its own AI slot
+study_pack_pool = ThreadPoolExecutor(max_workers=int(os.environ.get('STUDY_PACK_WORKERS', 6)),
+                                     thread_name_prefix='study-pack')
+
+def generate_study_pack_parallel(text, age_group, flashcard_count, quiz_count):
+    """Run the three generators concurrently and combine their results"""
+    # Each task runs in a copy of this context so its calls keep the caller's budget
+    analysis = study_pack_pool.submit(contextvars.copy_context().run, analyze_text_with_ai, text, age_group)
+    flashcards = study_pack_pool.submit(contextvars.copy_context().run, generate_flashcards_with_ai,
+                                        text, age_group, flashcard_count)
+    questions = study_pack_pool.submit(contextvars.copy_context().run, generate_quiz_with_ai,
+                                       text, age_group, quiz_count)
+    return {
+        'analysis': analysis.result(),
+        'flashcards': flashcards.result(),
+        'questions': questions.result()
+    }
+
+def generate_study_pack_with_ai(text, age_group="middle", flashcard_count=5, quiz_count=3, mode="combined"):
+    """Generate analysis, flashcards and quiz for one text.
+
+    ``combined`` sends the passage once in a single structured request;
+    ``parallel`` fans out to the three generators concurrently. A combined
+    response that cannot be parsed falls back to the parallel path.
+    """
+    if mode != 'combined' or not client:
+        return generate_study_pack_parallel(text, age_group, flashcard_count, quiz_count)
+    
+    counts = f"{flashcard_count}/{quiz_count}"
+    route = model_router.route('study_pack', text, flashcard_count=flashcard_count, quiz_count=quiz_count)
+    cache_key = make_cache_key('study_pack', text, age_group, counts, route.model, prompt_registry.version('study_pack'))
+    cached = ai_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    
+    try:
+        response = create_chat_completion(
+            route,
+            messages=[{"role": "user", "content": build_study_pack_prompt(text, age_group, flashcard_count, quiz_count)}],
+            temperature=0.4
+        )
+        
+        result = json.loads(response.choices[0].message.content)
+        pack = {
+            'analysis': result['analysis'],
+            'flashcards': result['flashcards'],
+            'questions': result['questions']
+        }
+        ai_cache.set(cache_key, pack)
+        # Warm the single-purpose entries so follow-up calls to the
+        # individual endpoints are served from cache as well, under the
+        # models those endpoints would be routed to
+        for kind, count, value in (('analysis', None, pack['analysis']),
+                                   ('flashcards', flashcard_count, pack['flashcards']),
+                                   ('quiz', quiz_count, pack['questions'])):
+            model = model_router.route(kind, text, count=count).model
+            ai_cache.set(make_cache_key(kind, text, age_group, count, model, prompt_registry.version(kind)), value)
+        return pack
+        
+    except AIBusyError:
+        raise
+    except Exception as e:
+        if isinstance(e, AIUnavailableError) or is_retryable(e):
+            # The upstream is unhealthy; three more calls would only add latency
+            note_degraded(degraded_reason(e))
+            return {
+                'analysis': fallback_text_analysis(text),
+                'flashcards': [dict(card) for card in FALLBACK_FLASHCARDS],
+                'questions': [dict(question) for question in FALLBACK_QUIZ]
             }
-        ]
+        print(f"Combined study pack failed, falling back to parallel generation: {e}")
+        return generate_study_pack_parallel(text, age_group, flashcard_count, quiz_count)
+
+# Streaming (Server-Sent Events) helpers
+def sse_event(event, data):
+    """Format one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def wants_event_stream(data):
+    """True when the client opted into SSE via ?stream=1, a body flag or the Accept header"""
+    if request.args.get('stream') in ('1', 'true') or data.get('stream') is True:
+        return True
+    return 'text/event-stream' in request.headers.get('Accept', '')
+
+def event_stream_response(item_event, array_key, prompt, temperature, cache_key, fallback, route):
+    """Stream each generated array item as an SSE event as soon as it is complete.
+
+    Cache hits are replayed immediately. Otherwise the caller's token budget
+    is reserved and an AI slot acquired up front (so an exhausted budget
+    still answers 429 and a full queue 503), and both are held until the
+    stream ends. Streams report no usage, so it is settled from estimates.
+    """
+    def replay(items, **done):
+        for item in items:
+            yield sse_event(item_event, item)
+        yield sse_event('done', {'count': len(items), **done})
+
+    cached = ai_cache.get(cache_key)
+    if cached is not None:
+        events = replay(cached, cached=True)
+    elif not client or client.is_open():
+        note_degraded('ai_disabled' if not client else 'circuit_open')
+        events = replay(fallback, fallback=True)
+    else:
+        caller = current_caller.get()
+        reservation = token_budget.reserve(caller, route.budget_tokens)
+        usage = {'tokens': 0}
+        slot = ExitStack()
+        slot.callback(lambda: token_budget.settle(reservation, usage['tokens']))
+        try:
+            slot.enter_context(ai_limiter.slot())
+        except AIBusyError:
+            slot.close()
+            raise
+        
+        def events():
+            with slot:
+                parser = ArrayItemStreamParser(array_key)
+                items = []
+                output_chars = 0
+                start = time.perf_counter()
+                try:
+                    stream = client.stream(
+                        route.task,
+                        model=route.model,
+                        messages=[{"role": "user", "content": prompt}],
+                        temperature=temperature,
+                        max_tokens=route.max_tokens
+                    )
+                    for chunk in stream:
+                        if not chunk.choices:
+                            continue
+                        delta = chunk.choices[0].delta.content
+                        output_chars += len(delta or '')
+                        usage['tokens'] = route.input_tokens + output_chars // CHARS_PER_TOKEN
+                        for item in parser.feed(delta or ''):
+                            items.append(item)
+                            yield sse_event(item_event, item)
+                except Exception as e:
+                    print(f"AI streaming failed: {e}")
+                    note_degraded(degraded_reason(e))
+                    if items:
+                        yield sse_event('error', {'error': 'Generation interrupted', 'count': len(items)})
+                        return
+                    yield from replay(fallback, fallback=True)
+                    return
+                finally:
+                    record_span('openai', f"{route.task} (stream)", start, time.perf_counter() - start)
+                
+                if not items:
+                    note_degraded('ai_error')
+                    yield from replay(fallback, fallback=True)
+                    return
+                
+                record_ai_call(caller, route, usage['tokens'], time.perf_counter() - start)
+                if not parser.done:
+                    # Cut off before the closing bracket (e.g. at max_tokens): the
+                    # items are usable but not the full set, so they aren't cached
+                    yield sse_event('done', {'count': len(items), 'cached': False, 'truncated': True})
+                    return
+                ai_cache.set(cache_key, items)
+                yield sse_event('done', {'count': len(items), 'cached': False})
+    
+    response = Response(
+        stream_with_context(events() if callable(events) else events),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+    if callable(events):
+        # Release the slot and settle the budget even if the client
+        # disconnects before the first event
+        response.call_on_close(slot.close)
+    return response
+
+# Request metrics, exported with everything else at /api/metrics. Routes are
+# labeled by their URL rule so path parameters don't create new series;
+# for streamed responses the latency is the time to the first byte.
+http_request_seconds = metrics_registry.register(
+    Histogram('http_request_duration_seconds', 'Request latency', REQUEST_BUCKETS, ('method', 'route', 'status'))
+)
+http_requests_in_flight = metrics_registry.register(
+    Gauge('http_requests_in_flight', 'Requests being handled', ('route',))
+)
+
+def cache_totals(field):
+    """Hit or miss counts of the AI response and principal caches"""
+    return {'ai': ai_cache.stats()[field], 'principal': get_principal_cache_stats()[field]}
+
+metrics_registry.register(Counter('cache_hits_total', 'Cache hits', ('cache',), callback=lambda: cache_totals('hits')))
+metrics_registry.register(Counter('cache_misses_total', 'Cache misses', ('cache',), callback=lambda: cache_totals('misses')))
+metrics_registry.register(Gauge('cache_hit_ratio', 'Cache hit ratio since start', ('cache',),
+                                callback=lambda: cache_totals('hit_rate')))
+metrics_registry.register(Counter('ai_fallbacks_total', 'Fallback results served instead of generated ones',
+                                  ('reason',), callback=fallback_totals))
+metrics_registry.register(Gauge('ai_circuit_open', '1 while the OpenAI circuit breaker is open',
+                                callback=lambda: {(): int(bool(client) and client.is_open())}))
+metrics_registry.register(Gauge('ai_calls', 'OpenAI calls holding or waiting for a concurrency slot', ('state',),
+                                callback=lambda: {state: ai_limiter.stats()[state] for state in ('in_flight', 'waiting')}))
+
+@app.before_request
+def start_request_metrics():
+    g.metrics_route = request.url_rule.rule if request.url_rule else 'unmatched'
+    g.metrics_start = time.perf_counter()
+    http_requests_in_flight.inc(route=g.metrics_route)
+
+@app.after_request
+def record_request_metrics(response):
+    if 'metrics_start' in g:
+        http_request_seconds.observe(time.perf_counter() - g.metrics_start, method=request.method,
+                                     route=g.metrics_route, status=response.status_code)
+    return response
+
+@app.teardown_request
+def finish_request_metrics(error=None):
+    if 'metrics_route' in g:
+        http_requests_in_flight.dec(route=g.pop('metrics_route'))
+
+# Opt-in request profiler (PROFILER_ENABLED): samples the stacks of in-flight
+# requests and keeps the slowest slow-or-sampled profiles, with storage,
+# bcrypt and OpenAI spans, for /api/admin/profiles
+request_profiler = profiler_from_env()
+
+@app.before_request
+def start_request_profile():
+    g.profile = request_profiler.start(request.method, g.metrics_route, request.path)
+
+@app.after_request
+def record_profile_status(response):
+    g.profile_status = response.status_code
+    return response
+
+@app.teardown_request
+def finish_request_profile(error=None):
+    if g.get('profile') is not None:
+        request_profiler.finish(g.pop('profile'), g.get('profile_status', 500))
 
 # Routes
+@app.route('/api/metrics', methods=['GET'])
+@require_admin
+def prometheus_metrics():
+    """Prometheus text exposition of request, storage, AI and cache metrics"""
+    return Response(metrics_registry.exposition(), content_type=EXPOSITION_CONTENT_TYPE)
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
     return jsonify({
@@ -195,9 +599,26 @@ def health_check():
         'message': 'StudyVerse API is running',
         'version': '1.0.0',
         'features': ['text_analysis', 'flashcards', 'quizzes', 'syllabus_upload', 'user_auth'],
+        'startup_ms': STARTUP_MS,
         'timestamp': datetime.utcnow().isoformat()
     })
 
+def check_openai():
+    """Readiness probe for the OpenAI API (no tokens; skipped while the circuit is open)"""
+    if not client:
+        raise AIUnavailableError("OpenAI API key not configured", reason='ai_disabled')
+    return client.ping(model_router.tiers['small'][0])
+
+# Dependency probes behind /api/ready, each cached for READINESS_TTL seconds
+readiness = readiness_from_env({'database': ping_database, 'openai': check_openai})
+
+@app.route('/api/ready', methods=['GET'])
+def readiness_check():
+    """503 while a critical dependency (the database by default) is failing"""
+    report = readiness.report()
+    report['timestamp'] = datetime.utcnow().isoformat()
+    return jsonify(report), 503 if report['status'] == 'unavailable' else 200
+
 # Authentication Routes
 @app.route('/api/auth/register', methods=['POST'])
 def register():
@@ -219,26 +640,26 @@ def register():
         if '@' not in email or '.' not in email:
             return jsonify({'error': 'Invalid email format'}), 400
         
+        auth_rate_limiter.hit('register_ip', client_ip())
+        
         # Create user
-        user_id, error = create_user(email, password, first_name, last_name, age_group)
-        if error:
-            return jsonify({'error': error}), 400
+        user = create_user(email, password, first_name, last_name, age_group)
+        if not user:
+            return jsonify({'error': 'An account with this email already exists'}), 409
         
         # Generate token
-        token = generate_token(user_id, email)
+        token = generate_token(user)
         
         return jsonify({
             'message': 'Account created successfully',
             'token': token,
-            'user': {
-                'id': user_id,
-                'email': email,
-                'first_name': first_name,
-                'last_name': last_name,
-                'age_group': age_group
-            }
+            'user': user
         })
         
+    except RateLimitExceeded as e:
+        return busy_response(e, 429)
+    except PasswordHashingBusyError as e:
+        return busy_response(e)
     except Exception as e:
         return jsonify({'error': f'Registration failed: {str(e)}'}), 500
 
@@ -252,13 +673,20 @@ def login():
         if not email or not password:
             return jsonify({'error': 'Email and password are required'}), 400
         
+        # Throttle before any bcrypt or database work
+        auth_rate_limiter.hit('login_ip', client_ip())
+        auth_rate_limiter.hit('login_email', email)
+        
         # Authenticate user
-        user, error = authenticate_user(email, password)
-        if error:
-            return jsonify({'error': error}), 401
+        user = authenticate_user(email, password)
+        if not user:
+            return jsonify({'error': 'Invalid email or password'}), 401
+        
+        # Only failed attempts should count against the account
+        auth_rate_limiter.reset('login_email', email)
         
         # Generate token
-        token = generate_token(user['id'], user['email'])
+        token = generate_token(user)
         
         return jsonify({
             'message': 'Login successful',
@@ -266,14 +694,28 @@ def login():
             'user': user
         })
         
+    except RateLimitExceeded as e:
+        return busy_response(e, 429)
+    except PasswordHashingBusyError as e:
+        return busy_response(e)
     except Exception as e:
         return jsonify({'error': f'Login failed: {str(e)}'}), 500
 
+@app.route('/api/auth/hashing-stats', methods=['GET'])
+@require_admin
+def password_hashing_stats():
+    return jsonify(get_password_hashing_stats())
+
+@app.route('/api/auth/rate-limit-stats', methods=['GET'])
+@require_admin
+def rate_limit_stats():
+    return jsonify(auth_rate_limiter.stats())
+
 @app.route('/api/auth/profile', methods=['GET'])
 @require_auth
 def get_profile():
     try:
-        profile = get_user_profile(request.user_id)
+        profile = get_user_profile(request.current_user['id'])
         if not profile:
             return jsonify({'error': 'User not found'}), 404
         
@@ -282,17 +724,64 @@ def get_profile():
     except Exception as e:
         return jsonify({'error': f'Failed to get profile: {str(e)}'}), 500
 
+def progress_etag(version):
+    """Weak validator for a user's progress built from the rollup row.
+
+    total_sessions changes on every insert, so events backfilled with an
+    older completed_at still produce a new ETag.
+    """
+    last_activity = version.get('last_activity')
+    stamp = int(last_activity.replace(tzinfo=timezone.utc).timestamp() * 1000000) if last_activity else 0
+    return f"progress-{version.get('total_sessions', 0)}-{stamp}"
+
+def progress_not_modified(etag, last_modified):
+    """Evaluate If-None-Match / If-Modified-Since against the current version"""
+    if request.if_none_match:
+        # If-None-Match takes precedence over If-Modified-Since (RFC 9110)
+        return request.if_none_match.contains_weak(etag)
+    if last_modified and request.if_modified_since:
+        return last_modified.replace(tzinfo=timezone.utc, microsecond=0) <= request.if_modified_since
+    return False
+
+def cache_progress_response(response, etag, last_modified):
+    """Attach validators; browsers may keep the response but must revalidate each poll"""
+    response.set_etag(etag, weak=True)
+    if last_modified:
+        response.last_modified = last_modified.replace(tzinfo=timezone.utc)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
 @app.route('/api/auth/progress', methods=['GET'])
 @require_auth
 def get_progress():
     try:
-        progress = get_user_progress(request.user_id)
-        return jsonify({'progress': progress})
+        user_id = request.current_user['id']
+        
+        # Answer conditional polls from the rollup row alone
+        version = get_progress_version(user_id)
+        if version is not None:
+            etag = progress_etag(version)
+            if progress_not_modified(etag, version['last_activity']):
+                return cache_progress_response(Response(status=304), etag, version['last_activity'])
+        
+        progress = get_user_progress(user_id)
+        response = jsonify({
+            'success': True,
+            'progress': progress['recent_activities'],
+            'stats': progress['stats']
+        })
+        
+        # Validators come from the same snapshot as the body
+        if progress['stats']:
+            last_activity = progress['stats'].get('last_activity')
+            response = cache_progress_response(response, progress_etag(progress['stats']), last_activity)
+        return response
         
     except Exception as e:
         return jsonify({'error': f'Failed to get progress: {str(e)}'}), 500
 
 @app.route('/api/ai/analyze-text', methods=['POST'])
+@metered_ai_route
 def analyze_text():
     try:
         data = request.get_json()
@@ -302,16 +791,23 @@ def analyze_text():
         if not text:
             return jsonify({'error': 'No text provided'}), 400
         
-        if len(text) > 10000:
-            return jsonify({'error': 'Text too long (max 10,000 characters)'}), 400
+        if len(text) > ANALYZE_TEXT_MAX_CHARS:
+            return jsonify({'error': f'Text too long (max {ANALYZE_TEXT_MAX_CHARS:,} characters)'}), 400
             
         analysis = analyze_text_with_ai(text, age_group)
         return jsonify(analysis)
         
+    except TokenBudgetExceeded as e:
+        return busy_response(e, 429)
+    except PromptTooLargeError as e:
+        return jsonify({'error': str(e)}), 413
+    except AIBusyError as e:
+        return busy_response(e)
     except Exception as e:
         return jsonify({'error': f'Analysis failed: {str(e)}'}), 500
 
 @app.route('/api/ai/generate-flashcards', methods=['POST'])
+@metered_ai_route
 def generate_flashcards():
     try:
         data = request.get_json()
@@ -321,14 +817,27 @@ def generate_flashcards():
         
         if not text:
             return jsonify({'error': 'No text provided'}), 400
+        
+        if wants_event_stream(data):
+            route = model_router.route('flashcards', text, count=count)
+            cache_key = make_cache_key('flashcards', text, age_group, count, route.model, prompt_registry.version('flashcards'))
+            return event_stream_response('flashcard', 'flashcards', build_flashcard_prompt(text, age_group, count),
+                                         0.5, cache_key, FALLBACK_FLASHCARDS, route)
             
         flashcards = generate_flashcards_with_ai(text, age_group, count)
         return jsonify({'flashcards': flashcards})
         
+    except TokenBudgetExceeded as e:
+        return busy_response(e, 429)
+    except PromptTooLargeError as e:
+        return jsonify({'error': str(e)}), 413
+    except AIBusyError as e:
+        return busy_response(e)
     except Exception as e:
         return jsonify({'error': f'Flashcard generation failed: {str(e)}'}), 500
 
 @app.route('/api/ai/generate-quiz', methods=['POST'])
+@metered_ai_route
 def generate_quiz():
     try:
         data = request.get_json()
@@ -338,17 +847,126 @@ def generate_quiz():
         
         if not text:
             return jsonify({'error': 'No text provided'}), 400
+        
+        if wants_event_stream(data):
+            route = model_router.route('quiz', text, count=count)
+            cache_key = make_cache_key('quiz', text, age_group, count, route.model, prompt_registry.version('quiz'))
+            return event_stream_response('question', 'questions', build_quiz_prompt(text, age_group, count),
+                                         0.4, cache_key, FALLBACK_QUIZ, route)
             
         questions = generate_quiz_with_ai(text, age_group, count)
         return jsonify({'questions': questions})
+    except TokenBudgetExceeded as e:
+        return busy_response(e, 429)
+    except PromptTooLargeError as e:
+        return jsonify({'error': str(e)}), 413
+    except AIBusyError as e:
+        return busy_response(e)
     except Exception as e:
         return jsonify({'error': f'Quiz generation failed: {str(e)}'}), 500
 
+@app.route('/api/ai/study-pack', methods=['POST'])
+@metered_ai_route
+def generate_study_pack():
+    try:
+        data = request.get_json()
+        text = data.get('text', '')
+        age_group = data.get('age_group', 'middle')
+        flashcard_count = min(data.get('flashcard_count', 5), 10)  # Max 10 flashcards
+        quiz_count = min(data.get('quiz_count', 3), 5)  # Max 5 questions
+        mode = data.get('mode', 'combined')
+        
+        if not text:
+            return jsonify({'error': 'No text provided'}), 400
+        
+        if len(text) > 10000:
+            return jsonify({'error': 'Text too long (max 10,000 characters)'}), 400
+        
+        if mode not in ('combined', 'parallel'):
+            return jsonify({'error': "mode must be 'combined' or 'parallel'"}), 400
+        
+        pack = generate_study_pack_with_ai(text, age_group, flashcard_count, quiz_count, mode)
+        return jsonify(pack)
+        
+    except TokenBudgetExceeded as e:
+        return busy_response(e, 429)
+    except PromptTooLargeError as e:
+        return jsonify({'error': str(e)}), 413
+    except AIBusyError as e:
+        return busy_response(e)
+    except Exception as e:
+        return jsonify({'error': f'Study pack generation failed: {str(e)}'}), 500
+
+@app.route('/api/ai/cache-stats', methods=['GET'])
+@require_admin
+def ai_cache_stats():
+    return jsonify(ai_cache.stats())
+
+@app.route('/api/ai/usage-stats', methods=['GET'])
+@require_admin
+def ai_usage_stats():
+    return jsonify({
+        'router': model_router.stats(),
+        'budget': token_budget.stats(),
+        'tokens': ai_call_tokens.snapshot(),
+        'latency_seconds': ai_call_seconds.snapshot()
+    })
+
+@app.route('/api/ai/budget', methods=['GET'])
+def ai_budget():
+    """Today's token usage and remaining budget for the caller"""
+    return jsonify(token_budget.usage(ai_caller().subject))
+
+@app.route('/api/ai/prompt-stats', methods=['GET'])
+@require_admin
+def prompt_stats():
+    return jsonify(prompt_registry.stats())
+
+@app.route('/api/ai/client-stats', methods=['GET'])
+@require_admin
+def ai_client_stats():
+    if client is None:
+        return jsonify({'enabled': False})
+    return jsonify({'enabled': True, **client.stats()})
+
+@app.route('/api/ai/concurrency-stats', methods=['GET'])
+@require_admin
+def ai_concurrency_stats():
+    return jsonify(ai_limiter.stats())
+
+@app.route('/api/admin/profiles', methods=['GET'])
+@require_admin
+def list_profiles():
+    """Kept request profiles, slowest first"""
+    return jsonify({'stats': request_profiler.stats(),
+                    'profiles': [profile.summary() for profile in request_profiler.profiles()]})
+
+@app.route('/api/admin/profiles', methods=['DELETE'])
+@require_admin
+def clear_profiles():
+    request_profiler.clear()
+    return jsonify({'success': True})
+
+@app.route('/api/admin/profiles/<int:profile_id>', methods=['GET'])
+@require_admin
+def get_request_profile(profile_id):
+    """Spans, hottest functions and stacks of one profile (?format=collapsed for flamegraph tools)"""
+    profile = request_profiler.get(profile_id)
+    if profile is None:
+        return jsonify({'error': 'Profile not found'}), 404
+    if request.args.get('format') == 'collapsed':
+        return Response(profile.collapsed(), mimetype='text/plain')
+    return jsonify(profile.detail())
+
 # Error handlers
 @app.errorhandler(404)
 def not_found(error):
     return jsonify({"error": "Endpoint not found"}), 404
 
+@app.errorhandler(413)
+def request_too_large(error):
+    return jsonify({"success": False, "error": "File too large"}), 413
+
 @app.errorhandler(500)
 def internal_error(error):
     return jsonify({"error": "Internal server error"}), 500
@@ -371,32 +989,52 @@ def upload_syllabus():
         if file_ext not in allowed_extensions:
             return jsonify({'success': False, 'error': 'Unsupported file type'}), 400
         
-        # Read file content
-        file_content = file.read()
-        if len(file_content) > 10 * 1024 * 1024:  # 10MB limit
+        # Check size from the spooled upload without reading it into memory
+        if stream_size(file.stream) > MAX_UPLOAD_BYTES:
             return jsonify({'success': False, 'error': 'File too large'}), 400
         
-        # For demo purposes, we'll simulate syllabus analysis
-        # In production, you'd use OCR/text extraction and AI analysis
-        syllabus_data = analyze_syllabus_content(file.filename, file_content)
+        # Serve repeat uploads from the stored analysis without calling OpenAI
+        user_id = request.current_user['id']
+        content_hash = stream_sha256(file.stream)
+        stored = find_previous_analysis('syllabus_uploads', content_hash, user_id)
+        if stored:
+            if stored['user_id'] != user_id:
+                save_syllabus_upload(user_id, file.filename, None, stored['analysis'], content_hash)
+            return jsonify({
+                'success': True,
+                'message': 'Syllabus analyzed (matched a previous upload)',
+                'syllabus_data': stored['analysis'],
+                'deduplicated': True
+            })
         
-        # Save syllabus data to user profile (in production, save to database)
-        # For now, we'll return the analysis
+        # Stream text out of the upload, stopping once we have enough
+        try:
+            extracted = extract_text(file.stream, file.filename)
+        except ExtractionError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
         
-        return jsonify({
-            'success': True,
-            'message': 'Syllabus uploaded and analyzed successfully',
-            'syllabus_data': syllabus_data
-        })
+        callback_url = request.form.get('callback_url')
+        
+        # Analysis runs out of band; the client polls the job or receives the webhook
+        job = job_queue.enqueue('syllabus', user_id, {
+            'filename': file.filename,
+            'text': extracted['text'],
+            'content_hash': content_hash
+        }, callback_url=callback_url)
+        
+        return job_accepted_response(job, 'Syllabus uploaded, analysis queued')
+    except JobQueueFullError as e:
+        return busy_response(e)
+    except CallbackURLError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except RequestEntityTooLarge:
+        return jsonify({'success': False, 'error': 'File too large'}), 413
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
-def analyze_syllabus_content(filename, content):
-    """Analyze syllabus content and extract key information"""
-    # This is a simplified demo version
-    # In production, you'd use proper text extraction and AI analysis
-    
-    # Simulate analysis based on filename and content
+def analyze_syllabus_content(filename, text_content):
+    """Analyze extracted syllabus text and pull out key information"""
+    # Sample analysis served when the AI is unavailable or its reply is unusable
     sample_analysis = {
         'subject': 'Mathematics',
         'level': 'High School',
@@ -417,45 +1055,49 @@ def analyze_syllabus_content(filename, content):
         'estimated_hours': 180
     }
     
-    # In production, use AI to analyze the actual content
     if client:
         try:
-            # Convert content to text (simplified - in production use proper text extraction)
-            text_content = str(content)[:2000]  # Limit for demo
-            
-            prompt = f"""
-            Analyze this syllabus content and extract key information:
-            
-            Filename: {filename}
-            Content preview: {text_content}
-            
-            Please provide:
-            1. Subject/Course name
-            2. Academic level (Elementary, Middle School, High School, College)
-            3. Duration (semester, year, etc.)
-            4. Key topics covered (list of 5-10 main topics)
-            5. Learning objectives (3-5 main goals)
-            
-            Format as JSON with keys: subject, level, duration, topics, learning_objectives
-            """
-            
-            response = client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=500,
-                temperature=0.3
-            )
-            
-            # Try to parse AI response as JSON
-            ai_analysis = json.loads(response.choices[0].message.content)
-            return ai_analysis
+            return run_syllabus_analysis(filename, text_content)
+        except AIBusyError:
+            raise
         except Exception as e:
             print(f"AI analysis failed: {e}")
             # Fall back to sample data
-            pass
+            note_degraded(degraded_reason(e))
+    else:
+        note_degraded('ai_disabled')
     
     return sample_analysis
 
+def run_syllabus_analysis(filename, text_content):
+    """Analyze a syllabus with the model, map-reducing long ones; raises on failure"""
+    if estimate_tokens(text_content) > CHUNK_TOKENS:
+        # Long syllabi are analyzed chunk by chunk and merged
+        chunks = chunk_text(text_content)
+        partials = map_chunks(
+            chunks,
+            lambda chunk, index, total: request_syllabus_analysis(filename, chunk, index, total),
+            propagate=CHUNK_FATAL_ERRORS
+        )
+        note_partial(partials, chunks)
+        return merge_syllabus_analyses(partials)
+    return request_syllabus_analysis(filename, text_content)
+
+def request_syllabus_analysis(filename, text_content, part=0, parts=1):
+    """Analyze syllabus text (or one part of it) with a single model call; raises on failure"""
+    label = "Content" if parts == 1 else f"Content (part {part + 1} of {parts})"
+    prompt = prompt_registry.render('syllabus', filename=filename, label=label,
+                                    content=text_content or '(no extractable text)')
+    
+    response = create_chat_completion(
+        model_router.route('syllabus', text_content),
+        messages=[{"role": "user", "content": prompt}],
+        temperature=0.3
+    )
+    
+    # Try to parse AI response as JSON
+    return json.loads(response.choices[0].message.content)
+
 # Report card analysis endpoint
 @app.route('/api/report-card/analyze', methods=['POST'])
 @require_auth
@@ -474,26 +1116,43 @@ def analyze_report_card():
         if file_ext not in allowed_extensions:
             return jsonify({'success': False, 'error': 'Unsupported file type'}), 400
         
-        # Read file content
-        file_content = file.read()
-        if len(file_content) > 10 * 1024 * 1024:  # 10MB limit
+        # Check size from the spooled upload without reading it into memory
+        if stream_size(file.stream) > MAX_UPLOAD_BYTES:
             return jsonify({'success': False, 'error': 'File too large'}), 400
         
-        # Analyze report card
-        analysis_data = analyze_report_card_content(file.filename, file_content)
+        # Serve repeat uploads from the stored analysis without calling OpenAI
+        user_id = request.current_user['id']
+        content_hash = stream_sha256(file.stream)
+        stored = find_previous_analysis('report_cards', content_hash, user_id)
+        if stored:
+            if stored['user_id'] != user_id:
+                save_report_card(user_id, file.filename, stored['analysis'], content_hash)
+            return jsonify({
+                'success': True,
+                'message': 'Report card analyzed (matched a previous upload)',
+                'analysis': stored['analysis'],
+                'deduplicated': True
+            })
         
-        # Save analysis to user profile (in production, save to database)
-        # For now, we'll return the analysis
+        callback_url = request.form.get('callback_url')
         
-        return jsonify({
-            'success': True,
-            'message': 'Report card analyzed successfully',
-            'analysis': analysis_data
-        })
+        # Analysis runs out of band; the client polls the job or receives the webhook
+        job = job_queue.enqueue('report_card', user_id, {
+            'filename': file.filename,
+            'content_hash': content_hash
+        }, callback_url=callback_url)
+        
+        return job_accepted_response(job, 'Report card uploaded, analysis queued')
+    except JobQueueFullError as e:
+        return busy_response(e)
+    except CallbackURLError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except RequestEntityTooLarge:
+        return jsonify({'success': False, 'error': 'File too large'}), 413
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
-def analyze_report_card_content(filename, content):
+def analyze_report_card_content(filename):
     """Analyze report card content and provide learning recommendations"""
     # This is a simplified demo version
     # In production, you'd use OCR for images and proper text extraction for PDFs
@@ -578,95 +1237,313 @@ def analyze_report_card_content(filename, content):
         ]
     }
     
-    # In production, use AI to analyze the actual content
     if client:
         try:
-            prompt = f"""
-            Analyze this report card and provide detailed insights:
-            
-            Filename: {filename}
-            
-            Please provide a comprehensive analysis including:
-            1. Overall GPA/performance summary
-            2. Subject-wise breakdown with grades
-            3. Identified strengths and weaknesses
-            4. Specific learning recommendations for improvement
-            5. Priority areas that need immediate attention
-            
-            Format as JSON with keys: overall_gpa, subjects, strengths, areas_for_improvement, recommendations
-            """
-            
-            response = client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=800,
-                temperature=0.3
-            )
-            
-            # Try to parse AI response as JSON
-            ai_analysis = json.loads(response.choices[0].message.content)
-            return ai_analysis
+            return request_report_card_analysis(filename)
+        except AIBusyError:
+            raise
         except Exception as e:
             print(f"AI analysis failed: {e}")
             # Fall back to sample data
-            pass
+            note_degraded(degraded_reason(e))
+    else:
+        note_degraded('ai_disabled')
     
     return sample_analysis
 
-# Progress tracking endpoint
-@app.route('/api/auth/progress', methods=['GET'])
+def request_report_card_analysis(filename):
+    """Analyze a report card with a single model call; raises on failure"""
+    prompt = prompt_registry.render('report_card', filename=filename)
+    
+    response = create_chat_completion(
+        model_router.route('report_card', filename),
+        messages=[{"role": "user", "content": prompt}],
+        temperature=0.3
+    )
+    
+    # Try to parse AI response as JSON
+    return json.loads(response.choices[0].message.content)
+
+# Background analysis jobs
+def process_syllabus_job(job):
+    """Analyze a queued syllabus and store it in syllabus_uploads"""
+    payload = job['payload']
+    current_caller.set(Caller(f"user:{job['user_id']}", 'syllabus_job'))
+    reasons = []
+    degraded_reasons.set(reasons)
+    if client and job['attempts'] < job['max_attempts']:
+        # Raise on AI failure so the queue retries with backoff
+        syllabus_data = run_syllabus_analysis(payload['filename'], payload['text'])
+    else:
+        syllabus_data = analyze_syllabus_content(payload['filename'], payload['text'])
+    
+    # Sample data is kept in the history but never served as a dedup match
+    content_hash = None if reasons else payload.get('content_hash')
+    record = save_syllabus_upload(job['user_id'], payload['filename'], payload['text'], syllabus_data,
+                                  content_hash)
+    return {
+        'syllabus_data': syllabus_data,
+        'upload_id': record['id'] if record else None,
+        'degraded': bool(reasons)
+    }
+
+def process_report_card_job(job):
+    """Analyze a queued report card and store it in report_cards"""
+    payload = job['payload']
+    current_caller.set(Caller(f"user:{job['user_id']}", 'report_card_job'))
+    reasons = []
+    degraded_reasons.set(reasons)
+    if client and job['attempts'] < job['max_attempts']:
+        # Raise on AI failure so the queue retries with backoff
+        analysis = request_report_card_analysis(payload['filename'])
+    else:
+        analysis = analyze_report_card_content(payload['filename'])
+    
+    # Sample data is kept in the history but never served as a dedup match
+    content_hash = None if reasons else payload.get('content_hash')
+    record = save_report_card(job['user_id'], payload['filename'], analysis, content_hash)
+    return {
+        'analysis': analysis,
+        'report_card_id': record['id'] if record else None,
+        'degraded': bool(reasons)
+    }
+
+job_queue = job_queue_from_env()
+job_queue.register('syllabus', process_syllabus_job)
+job_queue.register('report_card', process_report_card_job)
+
+def serialize_job(job):
+    """Public view of a job row"""
+    return {
+        'job_id': job['id'],
+        'kind': job['kind'],
+        'status': job['status'],
+        'attempts': job['attempts'],
+        'result': job['result'],
+        'error': job['error'] if job['status'] == 'failed' else None,
+        'created_at': job['created_at'].isoformat() if job.get('created_at') else None,
+        'updated_at': job['updated_at'].isoformat() if job.get('updated_at') else None
+    }
+
+def job_accepted_response(job, message):
+    """202 response pointing the client at the job status endpoint"""
+    response = jsonify({
+        'success': True,
+        'message': message,
+        'job_id': job['id'],
+        'status': job['status'],
+        'status_url': f"/api/jobs/{job['id']}"
+    })
+    response.status_code = 202
+    response.headers['Location'] = f"/api/jobs/{job['id']}"
+    return response
+
+@app.route('/api/jobs/<int:job_id>', methods=['GET'])
 @require_auth
-def get_user_progress_endpoint():
+def get_job_status(job_id):
     try:
-        # In a real app, this would fetch from database
-        # For demo, return sample progress data
-        sample_progress = [
-            {
-                'activity_type': 'text_analysis',
-                'subject': 'English',
-                'score': 85,
-                'completed_at': '2024-01-15T10:30:00Z',
-                'duration': 8
-            },
-            {
-                'activity_type': 'flashcards',
-                'subject': 'Math',
-                'score': 92,
-                'completed_at': '2024-01-14T14:20:00Z',
-                'duration': 12
-            },
-            {
-                'activity_type': 'quiz',
-                'subject': 'Science',
-                'score': 78,
-                'completed_at': '2024-01-13T16:45:00Z',
-                'duration': 15
-            }
-        ]
+        job = job_queue.get(job_id)
+        if not job or job['user_id'] != request.current_user['id']:
+            return jsonify({'success': False, 'error': 'Job not found'}), 404
         
-        return jsonify({
-            'success': True,
-            'progress': sample_progress
-        })
+        return jsonify({'success': True, 'job': serialize_job(job)})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+# Stored analyses: deduplication and history
+def find_previous_analysis(table, content_hash, user_id):
+    """Stored analysis for identical upload bytes, honouring ANALYSIS_DEDUP_SCOPE"""
+    if ANALYSIS_DEDUP_SCOPE == 'off':
+        return None
+    scope_user = None if ANALYSIS_DEDUP_SCOPE == 'global' else user_id
+    return find_stored_analysis(table, content_hash, scope_user)
+
+def encode_cursor(row):
+    """Opaque keyset cursor for the (uploaded_at, id) of a row"""
+    raw = json.dumps([row['uploaded_at'].isoformat(), row['id']])
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor):
+    uploaded_at, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    return datetime.fromisoformat(uploaded_at), int(row_id)
+
+def analysis_history_response(table):
+    """Paginated history of the current user's stored analyses"""
+    try:
+        limit = max(1, min(int(request.args.get('limit', 20)), 100))
+        cursor = request.args.get('cursor')
+        before = decode_cursor(cursor) if cursor else None
+    except (ValueError, TypeError):
+        return jsonify({'success': False, 'error': 'Invalid limit or cursor'}), 400
+    
+    rows, has_more = list_stored_analyses(table, request.current_user['id'], limit, before)
+    return jsonify({
+        'success': True,
+        'items': [{
+            'id': row['id'],
+            'filename': row['filename'],
+            'analysis': row['analysis'],
+            'uploaded_at': row['uploaded_at'].isoformat()
+        } for row in rows],
+        'next_cursor': encode_cursor(rows[-1]) if has_more and rows else None
+    })
+
+@app.route('/api/syllabus/history', methods=['GET'])
+@require_auth
+def syllabus_history():
+    return analysis_history_response('syllabus_uploads')
+
+@app.route('/api/report-card/history', methods=['GET'])
+@require_auth
+def report_card_history():
+    return analysis_history_response('report_cards')
+
+@app.route('/api/jobs/stats', methods=['GET'])
+@require_admin
+def job_stats():
+    return jsonify(job_queue.stats())
+
+# Progress events arrive in batches (a flashcard session can produce dozens)
+PROGRESS_BATCH_MAX = int(os.environ.get('PROGRESS_BATCH_MAX', 200))
+PROGRESS_FIELD_LIMITS = {'activity_type': 100, 'subject': 100, 'content': 10000}
+
+# Optional write buffer that coalesces events across requests; off by default
+progress_buffer = progress_buffer_from_env(save_progress_events)
+
+def parse_completed_at(value):
+    """Parse an ISO-8601 timestamp into naive UTC, rejecting times in the future"""
+    completed_at = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if completed_at.tzinfo is not None:
+        completed_at = completed_at.astimezone(timezone.utc).replace(tzinfo=None)
+    # Allow a little client clock skew
+    if completed_at > datetime.utcnow() + timedelta(minutes=5):
+        raise ValueError("completed_at is in the future")
+    return completed_at
+
+def validate_progress_event(event):
+    """Validate one progress event; returns (clean_event, error)"""
+    if not isinstance(event, dict):
+        return None, 'event must be an object'
+    
+    activity_type = event.get('activity_type')
+    if not isinstance(activity_type, str) or not activity_type.strip():
+        return None, 'activity_type is required'
+    subject = event.get('subject') or 'General'
+    content = event.get('content')
+    for field, value in (('activity_type', activity_type), ('subject', subject), ('content', content)):
+        if value is None:
+            continue
+        if not isinstance(value, str):
+            return None, f'{field} must be a string'
+        if len(value) > PROGRESS_FIELD_LIMITS[field]:
+            return None, f'{field} is longer than {PROGRESS_FIELD_LIMITS[field]} characters'
+    
+    score = event.get('score')
+    if score is not None:
+        if isinstance(score, bool) or not isinstance(score, (int, float)) or not 0 <= score <= 100:
+            return None, 'score must be a number between 0 and 100'
+        score = round(score)
+    
+    completed_at = event.get('completed_at')
+    if completed_at is not None:
+        try:
+            completed_at = parse_completed_at(completed_at)
+        except (TypeError, AttributeError, ValueError):
+            return None, 'completed_at must be an ISO-8601 timestamp that is not in the future'
+    
+    return {
+        'subject': subject.strip(),
+        'activity_type': activity_type.strip(),
+        'content': content,
+        'score': score,
+        'completed_at': completed_at,
+    }, None
+
+def validate_progress_events(data):
+    """Validate a progress payload: {"events": [...]} or a single event object"""
+    if not isinstance(data, dict):
+        return None, ['Request body must be a JSON object']
+    events = data['events'] if 'events' in data else [data]
+    if not isinstance(events, list) or not events:
+        return None, ['events must be a non-empty list']
+    if len(events) > PROGRESS_BATCH_MAX:
+        return None, [f'At most {PROGRESS_BATCH_MAX} events per request']
+    
+    clean, errors = [], []
+    for index, event in enumerate(events):
+        event, error = validate_progress_event(event)
+        if error:
+            errors.append(f'events[{index}]: {error}')
+        else:
+            clean.append(event)
+    return clean, errors
+
 # Record progress endpoint
 @app.route('/api/auth/progress', methods=['POST'])
 @require_auth
 def record_progress_endpoint():
     try:
-        data = request.get_json()
+        events, errors = validate_progress_events(request.get_json(silent=True))
+        if errors:
+            # All-or-nothing: a batch with any invalid event is rejected whole
+            return jsonify({'success': False, 'error': 'Invalid progress events', 'details': errors}), 400
+        
+        user_id = request.current_user['id']
+        for event in events:
+            event['user_id'] = user_id
         
-        # In a real app, this would save to database
-        # For demo, just return success
+        if progress_buffer is not None:
+            # The row is written later, so its default timestamp would be the flush time
+            accepted_at = datetime.utcnow()
+            for event in events:
+                if event['completed_at'] is None:
+                    event['completed_at'] = accepted_at
+            progress_buffer.add(events)
+            return jsonify({
+                'success': True,
+                'accepted': len(events),
+                'buffered': True
+            }), 202
         
+        recorded = save_progress_events(events)
         return jsonify({
             'success': True,
+            'recorded': recorded,
             'message': 'Progress recorded successfully'
         })
     except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
+        print(f"Record progress error: {e}")
+        return jsonify({'success': False, 'error': 'Failed to record progress'}), 500
+
+@app.route('/api/auth/progress/buffer-stats', methods=['GET'])
+@require_admin
+def progress_buffer_stats():
+    if progress_buffer is None:
+        return jsonify({'enabled': False})
+    return jsonify({'enabled': True, **progress_buffer.stats()})
+
+@app.route('/api/admin/progress/dead-letters', methods=['GET'])
+@require_admin
+def progress_dead_letters():
+    """Buffered progress events the database rejected, with the error"""
+    if progress_buffer is None:
+        return jsonify({'enabled': False, 'events': []})
+    return jsonify({'enabled': True, 'events': [
+        {'event': event, 'error': error} for event, error in progress_buffer.dead_letters()
+    ]})
+
+@app.route('/api/admin/progress/dead-letters/replay', methods=['POST'])
+@require_admin
+def replay_progress_dead_letters():
+    """Queue the dead-lettered progress events for another write attempt"""
+    if progress_buffer is None:
+        return jsonify({'enabled': False, 'replayed': 0})
+    return jsonify({'enabled': True, 'replayed': progress_buffer.replay_dead_letters()})
+
+# Nothing above touches the database; connections and schema checks happen
+# on first use, and schema changes are applied by `python migrations.py upgrade`
+STARTUP_MS = round((time.perf_counter() - STARTUP_STARTED) * 1000, 1)
+print(f"✅ StudyVerse API ready in {STARTUP_MS} ms")
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
@@ -0,0 +1,177 @@
+"""
+StudyVerse Map-Reduce Analysis
+Splits long documents into token-budgeted chunks, analyzes them with
+bounded parallelism and merges the partial analyses
+"""
+
+import os
+import re
+import contextvars
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+CHARS_PER_TOKEN = 4
+
+CHUNK_TOKENS = int(os.environ.get('ANALYSIS_CHUNK_TOKENS', 1500))
+CHUNK_OVERLAP_TOKENS = int(os.environ.get('ANALYSIS_CHUNK_OVERLAP', 150))
+MAX_PARALLEL = int(os.environ.get('ANALYSIS_MAX_PARALLEL', 4))
+
+_PARAGRAPH_BREAK = re.compile(r'\n\s*\n')
+_SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+
+
+def estimate_tokens(text):
+    """Cheap local token estimate (~4 characters per token for English)"""
+    return max(1, len(text) // CHARS_PER_TOKEN) if text else 0
+
+
+def _split_units(text, max_chars):
+    """Break text into paragraphs, then sentences, then hard slices, each <= max_chars"""
+    for paragraph in _PARAGRAPH_BREAK.split(text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if len(paragraph) <= max_chars:
+            yield paragraph
+            continue
+        for sentence in _SENTENCE_END.split(paragraph):
+            while len(sentence) > max_chars:
+                yield sentence[:max_chars]
+                sentence = sentence[max_chars:]
+            if sentence:
+                yield sentence
+
+
+def _overlap_tail(text, overlap_chars):
+    """Last ``overlap_chars`` of text, starting on a word boundary"""
+    if overlap_chars <= 0 or len(text) <= overlap_chars:
+        return '' if overlap_chars <= 0 else text
+    tail = text[-overlap_chars:]
+    space = tail.find(' ')
+    return tail[space + 1:] if 0 <= space < len(tail) - 1 else tail
+
+
+def chunk_text(text, chunk_tokens=None, overlap_tokens=None):
+    """Split text into chunks of at most ``chunk_tokens`` estimated tokens.
+
+    Consecutive chunks share roughly ``overlap_tokens`` tokens so that topics
+    straddling a boundary are seen whole by at least one chunk.
+    """
+    chunk_tokens = chunk_tokens or CHUNK_TOKENS
+    overlap_tokens = CHUNK_OVERLAP_TOKENS if overlap_tokens is None else overlap_tokens
+    if overlap_tokens >= chunk_tokens:
+        raise ValueError("overlap must be smaller than the chunk size")
+
+    max_chars = chunk_tokens * CHARS_PER_TOKEN
+    overlap_chars = overlap_tokens * CHARS_PER_TOKEN
+    chunks = []
+    current = ''
+    for unit in _split_units(text, max_chars - overlap_chars):
+        candidate = f"{current}\n\n{unit}" if current else unit
+        if len(candidate) <= max_chars:
+            current = candidate
+            continue
+        chunks.append(current)
+        tail = _overlap_tail(current, overlap_chars)
+        current = f"{tail}\n\n{unit}" if tail else unit
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def map_chunks(chunks, analyze_chunk, max_parallel=None, propagate=()):
+    """Run ``analyze_chunk(chunk, index, total)`` over chunks with bounded parallelism.
+
+    Failed chunks are skipped; if every chunk fails the first error is raised.
+    An error of a ``propagate`` type (e.g. an exhausted budget) cancels the
+    chunks not yet started and is raised even when other chunks succeeded.
+    Results are returned in chunk order.
+    """
+    max_parallel = max(1, min(max_parallel or MAX_PARALLEL, len(chunks)))
+    total = len(chunks)
+    results, errors = [], []
+    with ThreadPoolExecutor(max_workers=max_parallel, thread_name_prefix='map-reduce') as pool:
+        # Chunks run in copies of the caller's context (e.g. its token budget)
+        futures = [pool.submit(contextvars.copy_context().run, analyze_chunk, chunk, index, total)
+                   for index, chunk in enumerate(chunks)]
+        for future in futures:
+            try:
+                results.append(future.result())
+            except propagate:
+                for pending in futures:
+                    pending.cancel()
+                raise
+            except Exception as e:
+                errors.append(e)
+    if errors:
+        print(f"Map-reduce: {len(errors)} of {total} chunks failed: {errors[0]}")
+    if not results and errors:
+        raise errors[0]
+    return results
+
+
+def _as_list(value):
+    if isinstance(value, list):
+        return [v for v in value if isinstance(v, str) and v.strip()]
+    if isinstance(value, str) and value.strip():
+        return [value]
+    return []
+
+
+def merge_ranked(lists, limit):
+    """Merge string lists case-insensitively, ranked by how many chunks mention each"""
+    counts = Counter()
+    first_seen = {}
+    display = {}
+    for items in lists:
+        seen_here = set()
+        for item in _as_list(items):
+            key = ' '.join(item.lower().split())
+            if key in seen_here:
+                continue
+            seen_here.add(key)
+            counts[key] += 1
+            if key not in first_seen:
+                first_seen[key] = len(first_seen)
+                display[key] = item.strip()
+    ranked = sorted(counts, key=lambda k: (-counts[k], first_seen[k]))
+    return [display[k] for k in ranked[:limit]]
+
+
+def most_common(values, default=None):
+    values = [v for v in values if v not in (None, '')]
+    if not values:
+        return default
+    counts = Counter(str(v) for v in values)
+    winner = counts.most_common(1)[0][0]
+    return next(v for v in values if str(v) == winner)
+
+
+def merge_syllabus_analyses(partials):
+    """Reduce step for syllabus chunk analyses"""
+    return {
+        'subject': most_common([p.get('subject') for p in partials], 'Unknown'),
+        'level': most_common([p.get('level') for p in partials], 'Unknown'),
+        'duration': most_common([p.get('duration') for p in partials], 'Unknown'),
+        'topics': merge_ranked([p.get('topics') for p in partials], 15),
+        'learning_objectives': merge_ranked([p.get('learning_objectives') for p in partials], 8),
+        'chunks_analyzed': len(partials),
+    }
+
+
+def merge_text_analyses(partials, text):
+    """Reduce step for reading-level chunk analyses"""
+    scores = []
+    for p in partials:
+        try:
+            scores.append(float(p.get('complexity_score')))
+        except (TypeError, ValueError):
+            pass
+    return {
+        'reading_level': most_common([p.get('reading_level') for p in partials], 'Unknown'),
+        'complexity_score': round(sum(scores) / len(scores)) if scores else None,
+        'key_topics': merge_ranked([p.get('key_topics') for p in partials], 12),
+        'estimated_reading_time': max(1, len(text.split()) // 200),
+        'recommendations': merge_ranked([p.get('recommendations') for p in partials], 6),
+        'chunks_analyzed': len(partials),
+    }
@@ -0,0 +1,226 @@
+"""
+StudyVerse Metrics
+In-process counters, gauges and histograms keyed by label values, exported
+as JSON through the stats endpoints and in the Prometheus text format at
+/api/metrics. Every gunicorn worker keeps its own values, so exported
+series carry a ``worker`` label (the process id)
+"""
+
+import bisect
+import math
+import os
+import threading
+
+# Upper bounds in seconds / tokens; an implicit +Inf bucket follows
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 80)
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+DB_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+TOKEN_BUCKETS = (100, 250, 500, 1000, 2000, 4000, 8000, 16000)
+
+EXPOSITION_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+               for value in labels.values())
+    return '{' + ','.join(f'{name}="{value}"' for name, value in zip(labels, escaped)) + '}'
+
+
+class Metric:
+    """A named family of series, one per combination of label values.
+
+    With ``callback`` the series are read when metrics are collected:
+    it returns {label values tuple (or a single value): number}. This suits
+    counters other components already keep (cache hits, fallbacks).
+    """
+
+    kind = 'untyped'
+
+    def __init__(self, name, description, labelnames=(), callback=None):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self.callback = callback
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        """(suffix, labels, value) for every series"""
+        if self.callback is not None:
+            values = {}
+            for key, value in self.callback().items():
+                values[key if isinstance(key, tuple) else (key,)] = value
+        else:
+            with self._lock:
+                values = dict(self._values)
+        return [('', dict(zip(self.labelnames, map(str, key))), value) for key, value in sorted(values.items())]
+
+
+class Counter(Metric):
+    """Monotonically increasing count"""
+
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """Value that goes up and down (in-flight requests, ratios)"""
+
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram:
+    """Fixed-bucket histogram with one series per combination of label values"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, description, buckets, labelnames=()):
+        self.name = name
+        self.description = description
+        self.buckets = tuple(sorted(buckets))
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._series = {}    # label values -> [bucket counts..., +Inf count], sum
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def quantile(self, counts, q):
+        """Upper bound of the bucket holding quantile ``q`` (None if it is +Inf)"""
+        total = sum(counts)
+        if not total:
+            return None
+        rank, seen = q * total, 0
+        for bound, count in zip(self.buckets + (None,), counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return None
+
+    def snapshot(self):
+        """Per series: labels, count, sum, p50/p95/p99 bucket bounds and cumulative buckets"""
+        with self._lock:
+            series = {key: (list(counts), total) for key, (counts, total) in self._series.items()}
+        result = []
+        for key, (counts, total) in sorted(series.items()):
+            cumulative, running = {}, 0
+            for bound, count in zip(self.buckets, counts):
+                running += count
+                cumulative[str(bound)] = running
+            cumulative['+Inf'] = running + counts[-1]
+            observations = cumulative['+Inf']
+            result.append({
+                'labels': dict(zip(self.labelnames, key)),
+                'count': observations,
+                'sum': round(total, 3),
+                'avg': round(total / observations, 3) if observations else 0.0,
+                'p50': self.quantile(counts, 0.50),
+                'p95': self.quantile(counts, 0.95),
+                'p99': self.quantile(counts, 0.99),
+                'buckets': cumulative,
+            })
+        return result
+
+    def samples(self):
+        """Cumulative _bucket series plus _sum and _count, as in the text format"""
+        with self._lock:
+            series = {key: (list(counts), total) for key, (counts, total) in self._series.items()}
+        samples = []
+        for key, (counts, total) in sorted(series.items()):
+            labels = dict(zip(self.labelnames, key))
+            running = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                running += count
+                samples.append(('_bucket', dict(labels, le=_format_value(bound)), running))
+            samples.append(('_sum', labels, total))
+            samples.append(('_count', labels, running))
+        return samples
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+
+class MetricsRegistry:
+    """The metrics exported at /api/metrics, named ``<namespace>_<name>``.
+
+    With ``worker_label`` every series is labelled with the exporting
+    process id, so counters from different gunicorn workers stay separate
+    series (sum them by the other labels) instead of appearing to jump
+    whenever a scrape lands on another worker.
+    """
+
+    def __init__(self, namespace='studyverse', worker_label='worker'):
+        self.namespace = namespace
+        self.worker_label = worker_label
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        """Add a metric (replacing one of the same name) and return it"""
+        with self._lock:
+            self._metrics[metric.name] = metric
+        return metric
+
+    def exposition(self):
+        """All metrics in the Prometheus text exposition format"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        # Read at export time: workers are forked after this module is imported
+        worker = {self.worker_label: str(os.getpid())} if self.worker_label else {}
+        lines = []
+        for metric in metrics:
+            name = f"{self.namespace}_{metric.name}" if self.namespace else metric.name
+            try:
+                samples = metric.samples()
+            except Exception as e:
+                print(f"Metrics collection error for {name}: {e}")
+                continue
+            lines.append(f"# HELP {name} {metric.description}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            for suffix, labels, value in samples:
+                lines.append(f"{name}{suffix}{_format_labels({**worker, **labels})} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+# Process-wide registry; modules register their metrics at import time
+registry = MetricsRegistry()
@@ -0,0 +1,149 @@
+"""
+StudyVerse Database Migrations
+Versioned schema changes for the PostgreSQL and SQLite storage backends,
+applied by an explicit command instead of at import time:
+
+    python migrations.py upgrade            # apply pending migrations
+    python migrations.py status             # list applied/pending versions
+    python migrations.py upgrade --backend sqlite
+
+Applied versions are recorded in the schema_migrations table. Migrations
+must stay idempotent (IF NOT EXISTS) so databases created by the old
+import-time setup upgrade cleanly.
+"""
+
+import sys
+import time
+import argparse
+import importlib
+
+
+def postgres_migrations():
+    import auth_postgresql
+    from jobs import create_jobs_schema
+    from ai_cache import create_cache_expiry_index, create_cache_schema
+    from rate_limit import create_rate_limit_expiry_index, create_rate_limit_schema
+    return [
+        (1, 'core tables', auth_postgresql.create_core_tables),
+        (2, 'analysis content hashes and history indexes', auth_postgresql.add_analysis_hashes),
+        (3, 'progress indexes and rollup tables', auth_postgresql.migrate_progress_rollup),
+        (4, 'analysis job queue', create_jobs_schema),
+        (5, 'shared AI response cache', create_cache_schema),
+        (6, 'rate limit buckets', create_rate_limit_schema),
+        (7, 'daily AI token usage', auth_postgresql.create_token_usage_table),
+        (8, 'AI response cache expiry index', create_cache_expiry_index),
+        (9, 'rate limit bucket expiry index', create_rate_limit_expiry_index),
+    ]
+
+
+def sqlite_migrations():
+    import auth_sqlite
+    from jobs import create_sqlite_jobs_schema
+    from ai_cache import create_sqlite_cache_schema
+    return [
+        (1, 'initial schema', auth_sqlite.create_schema),
+        (2, 'daily AI token usage', auth_sqlite.create_token_usage_table),
+        (3, 'analysis job queue', create_sqlite_jobs_schema),
+        (4, 'progress version rows', auth_sqlite.create_progress_version_table),
+        (5, 'shared AI response cache', create_sqlite_cache_schema),
+    ]
+
+
+BACKENDS = {
+    'postgres': (postgres_migrations, 'auth_postgresql', '%s'),
+    'sqlite': (sqlite_migrations, 'auth_sqlite', '?'),
+}
+
+
+def _backend(name):
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown backend '{name}', expected one of {', '.join(BACKENDS)}")
+    migrations_fn, module_name, placeholder = BACKENDS[name]
+    module = importlib.import_module(module_name)
+    return migrations_fn(), module.db_connection, placeholder
+
+
+def _ensure_table(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+
+def _applied(cursor):
+    cursor.execute('SELECT version FROM schema_migrations')
+    return {row['version'] for row in cursor.fetchall()}
+
+
+def upgrade(backend):
+    """Apply pending migrations in one transaction; returns the versions applied"""
+    migrations, connection, placeholder = _backend(backend)
+    with connection() as conn:
+        cursor = conn.cursor()
+        if backend == 'sqlite':
+            # Take the write lock up front so concurrent processes queue here
+            cursor.execute('BEGIN IMMEDIATE')
+        _ensure_table(cursor)
+        if backend == 'postgres':
+            # Serialize concurrent deploys/workers for the rest of the transaction
+            cursor.execute("SELECT pg_advisory_xact_lock(hashtext('schema_migrations'))")
+
+        applied = _applied(cursor)
+        done = []
+        for version, name, migrate in migrations:
+            if version in applied:
+                continue
+            start = time.perf_counter()
+            migrate(cursor)
+            cursor.execute(f'''
+                INSERT INTO schema_migrations (version, name) VALUES ({placeholder}, {placeholder})
+            ''', (version, name))
+            print(f"✅ Applied {backend} migration {version}: {name} ({time.perf_counter() - start:.2f}s)")
+            done.append(version)
+
+        conn.commit()
+        cursor.close()
+    return done
+
+
+def status(backend):
+    """[(version, name, applied)] for every known migration"""
+    migrations, connection, _ = _backend(backend)
+    with connection() as conn:
+        cursor = conn.cursor()
+        _ensure_table(cursor)
+        applied = _applied(cursor)
+        conn.commit()
+        cursor.close()
+    return [(version, name, version in applied) for version, name, _ in migrations]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Apply StudyVerse database migrations')
+    parser.add_argument('command', nargs='?', default='upgrade', choices=['upgrade', 'status'])
+    parser.add_argument('--backend', choices=sorted(BACKENDS),
+                        help='defaults to AUTH_BACKEND, or postgres when DATABASE_URL is set')
+    args = parser.parse_args(argv)
+
+    if args.backend is None:
+        from auth import backend_name_from_env
+        args.backend = backend_name_from_env()
+
+    if args.command == 'status':
+        for version, name, applied in status(args.backend):
+            print(f"{version:>4}  {'applied' if applied else 'pending':<8} {name}")
+        return 0
+
+    start = time.perf_counter()
+    done = upgrade(args.backend)
+    if not done:
+        print(f"✅ {args.backend} schema is up to date")
+    print(f"Migrations finished in {time.perf_counter() - start:.2f}s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
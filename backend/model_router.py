@@ -0,0 +1,101 @@
+"""
+StudyVerse Model Router
+Chooses the model tier and max_tokens for every OpenAI call from the task,
+a local estimate of the input size and the number of items requested
+"""
+
+import os
+from map_reduce import estimate_tokens
+from prompts import prompt_registry
+
+# Preferred tier per task and the output allowance: a fixed part plus a
+# per-item amount for each count argument (one flashcard is ~80 tokens of
+# JSON, one quiz question ~110; the rest is headroom against truncation)
+TASKS = {
+    'analysis': {'tier': 'large', 'output': 400, 'per_item': {}},
+    'flashcards': {'tier': 'large', 'output': 50, 'per_item': {'count': 120}},
+    'quiz': {'tier': 'large', 'output': 50, 'per_item': {'count': 160}},
+    'study_pack': {'tier': 'large', 'output': 450, 'per_item': {'flashcard_count': 120, 'quiz_count': 160}},
+    'syllabus': {'tier': 'small', 'output': 500, 'per_item': {}},
+    'report_card': {'tier': 'small', 'output': 800, 'per_item': {}},
+}
+
+
+class PromptTooLargeError(ValueError):
+    """Raised when no configured model has a context window large enough"""
+
+
+class ModelRoute:
+    """The model and token limits chosen for one call"""
+
+    def __init__(self, task, tier, model, input_tokens, max_tokens):
+        self.task = task
+        self.tier = tier
+        self.model = model
+        self.input_tokens = input_tokens
+        self.max_tokens = max_tokens
+
+    @property
+    def budget_tokens(self):
+        """Worst-case tokens the call can consume (input plus the output cap)"""
+        return self.input_tokens + self.max_tokens
+
+    def as_dict(self):
+        return {
+            'task': self.task,
+            'tier': self.tier,
+            'model': self.model,
+            'input_tokens': self.input_tokens,
+            'max_tokens': self.max_tokens,
+        }
+
+
+class ModelRouter:
+    """Route tasks to tiers ({name: (model, context window)}).
+
+    A task runs on its preferred tier, except that source texts of at most
+    ``small_max_input`` tokens go to the small tier. If the prompt plus the
+    output allowance does not fit the chosen model's context window, the
+    other tiers are tried in order.
+    """
+
+    def __init__(self, tiers, small_max_input=300):
+        self.tiers = dict(tiers)
+        self.small_max_input = small_max_input
+        # Fixed tokens of each task's prompt template, largest age group
+        self._prompt_tokens = {task: max(prompt_registry.get(task).base_tokens.values()) for task in TASKS}
+
+    def route(self, task, text, **counts):
+        spec = TASKS[task]
+        text_tokens = estimate_tokens(text or '')
+        input_tokens = text_tokens + self._prompt_tokens[task]
+        max_tokens = spec['output'] + sum(per_item * int(counts.get(field) or 0)
+                                          for field, per_item in spec['per_item'].items())
+
+        preferred = spec['tier']
+        if preferred == 'large' and text_tokens <= self.small_max_input:
+            preferred = 'small'
+        for tier in [preferred] + [name for name in self.tiers if name != preferred]:
+            model, context = self.tiers[tier]
+            if input_tokens + max_tokens <= context:
+                return ModelRoute(task, tier, model, input_tokens, max_tokens)
+        raise PromptTooLargeError(f"Input too large for any model (~{input_tokens:,} tokens)")
+
+    def stats(self):
+        return {
+            'tiers': {name: {'model': model, 'context': context} for name, (model, context) in self.tiers.items()},
+            'small_max_input': self.small_max_input,
+            'tasks': {task: {'tier': spec['tier'], 'output': spec['output'], 'per_item': spec['per_item']}
+                      for task, spec in TASKS.items()},
+        }
+
+
+def model_router_from_env():
+    """Build the router from AI_MODEL_* and AI_ROUTER_* environment variables"""
+    tiers = {
+        'small': (os.environ.get('AI_MODEL_SMALL', 'gpt-3.5-turbo'),
+                  int(os.environ.get('AI_MODEL_SMALL_CONTEXT', 16385))),
+        'large': (os.environ.get('AI_MODEL_LARGE', 'gpt-4'),
+                  int(os.environ.get('AI_MODEL_LARGE_CONTEXT', 8192))),
+    }
+    return ModelRouter(tiers, small_max_input=int(os.environ.get('AI_ROUTER_SMALL_MAX_INPUT', 300)))
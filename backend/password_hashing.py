@@ -0,0 +1,193 @@
+"""
+StudyVerse Password Hashing
+Runs bcrypt in a bounded process pool so a burst of logins cannot pin the
+CPU of the web worker handling them, with a configurable cost factor
+"""
+
+import os
+import time
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import bcrypt
+
+from profiler import span
+
+DEFAULT_ROUNDS = 12
+
+
+class PasswordHashingBusyError(Exception):
+    """Raised when too many hash operations are already queued"""
+
+    def __init__(self, message, retry_after=2):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def _hash_password(password, rounds):
+    """Runs in a pool process; returns (hash, started_at)"""
+    started = time.time()
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds)), started
+
+
+def _check_password(password, password_hash):
+    """Runs in a pool process; returns (matches, started_at)"""
+    started = time.time()
+    return bcrypt.checkpw(password, password_hash), started
+
+
+def _pool_context():
+    """Start pool processes without forking the web worker.
+
+    A forked child would inherit the worker's threads, locks and open
+    database connections; forkserver (or spawn where it is unavailable)
+    starts from a clean interpreter instead.
+    """
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('forkserver')
+    return multiprocessing.get_context('spawn')
+
+
+def hash_rounds(password_hash):
+    """Cost factor encoded in a bcrypt hash such as ``$2b$12$...``"""
+    try:
+        return int(password_hash.split('$')[2])
+    except (IndexError, ValueError):
+        return None
+
+
+class PasswordHasher:
+    """bcrypt hashing and verification on a small process pool.
+
+    At most ``workers + max_queue`` operations may be outstanding; callers
+    beyond that wait up to ``queue_timeout`` seconds and then get
+    PasswordHashingBusyError. With ``workers=0`` hashing runs inline on the
+    calling thread.
+    """
+
+    def __init__(self, rounds=DEFAULT_ROUNDS, workers=2, max_queue=32, queue_timeout=5.0):
+        if not 4 <= rounds <= 31:
+            raise ValueError("bcrypt rounds must be between 4 and 31, got %s" % rounds)
+        self.rounds = rounds
+        self.workers = workers
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._admission = threading.BoundedSemaphore(max(1, workers) + max_queue)
+        self._executor = None
+        self._executor_pid = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._stats = {
+            'hashed': 0,
+            'verified': 0,
+            'rehashed': 0,
+            'rejected': 0,
+            'queue_wait_total': 0.0,
+            'queue_wait_max': 0.0,
+            'work_total': 0.0,
+        }
+
+    def _get_executor(self, broken=None):
+        # Created lazily and per process, so gunicorn forks don't inherit a pool
+        pid = os.getpid()
+        stale = None
+        with self._lock:
+            if broken is not None and self._executor is broken:
+                # Only the first caller to see the broken pool replaces it
+                stale, self._executor = self._executor, None
+            if self._executor is None or self._executor_pid != pid:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=_pool_context())
+                self._executor_pid = pid
+            executor = self._executor
+        if stale is not None:
+            stale.shutdown(wait=False)
+        return executor
+
+    def _run(self, fn, *args):
+        submitted = time.time()
+        if not self._admission.acquire(timeout=self.queue_timeout):
+            with self._lock:
+                self._stats['rejected'] += 1
+            raise PasswordHashingBusyError("Too many sign-ins right now, please retry shortly",
+                                           retry_after=max(1, int(self.queue_timeout)))
+        with self._lock:
+            self._in_flight += 1
+        try:
+            if self.workers <= 0:
+                result, started = fn(*args)
+            else:
+                executor = self._get_executor()
+                try:
+                    result, started = executor.submit(fn, *args).result()
+                except BrokenProcessPool:
+                    # A pool process died (e.g. OOM-killed); start a fresh pool once
+                    result, started = self._get_executor(broken=executor).submit(fn, *args).result()
+            finished = time.time()
+            wait = max(0.0, started - submitted)
+            with self._lock:
+                self._stats['queue_wait_total'] += wait
+                self._stats['queue_wait_max'] = max(self._stats['queue_wait_max'], wait)
+                self._stats['work_total'] += finished - started
+            return result
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+            self._admission.release()
+
+    def hash(self, password):
+        """bcrypt hash of ``password`` at the configured cost, as a str"""
+        with span('bcrypt', 'hash'):
+            password_hash = self._run(_hash_password, password.encode('utf-8'), self.rounds)
+        with self._lock:
+            self._stats['hashed'] += 1
+        return password_hash.decode('utf-8')
+
+    def verify(self, password, password_hash):
+        """Check ``password`` against a stored bcrypt hash"""
+        with span('bcrypt', 'verify'):
+            matches = self._run(_check_password, password.encode('utf-8'), password_hash.encode('utf-8'))
+        with self._lock:
+            self._stats['verified'] += 1
+        return matches
+
+    def needs_rehash(self, password_hash):
+        """True when a stored hash was made with a different cost factor"""
+        return hash_rounds(password_hash) != self.rounds
+
+    def record_rehash(self):
+        with self._lock:
+            self._stats['rehashed'] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['in_flight'] = self._in_flight
+        operations = stats['hashed'] + stats['verified']
+        stats['rounds'] = self.rounds
+        stats['workers'] = self.workers
+        stats['avg_queue_wait_ms'] = round(stats.pop('queue_wait_total') / operations * 1000, 3) if operations else 0.0
+        stats['max_queue_wait_ms'] = round(stats.pop('queue_wait_max') * 1000, 3)
+        stats['avg_hash_ms'] = round(stats.pop('work_total') / operations * 1000, 3) if operations else 0.0
+        return stats
+
+    def close(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+
+def password_hasher_from_env():
+    """Build the hasher from BCRYPT_ROUNDS/PASSWORD_HASH_WORKERS/PASSWORD_HASH_MAX_QUEUE/PASSWORD_HASH_TIMEOUT"""
+    return PasswordHasher(
+        rounds=int(os.environ.get('BCRYPT_ROUNDS', DEFAULT_ROUNDS)),
+        workers=int(os.environ.get('PASSWORD_HASH_WORKERS', 2)),
+        max_queue=int(os.environ.get('PASSWORD_HASH_MAX_QUEUE', 32)),
+        queue_timeout=float(os.environ.get('PASSWORD_HASH_TIMEOUT', 5)),
+    )
+
+
+# Shared by every storage backend so limits and statistics are per process
+password_hasher = password_hasher_from_env()
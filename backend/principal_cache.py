@@ -0,0 +1,77 @@
+"""
+StudyVerse Principal Cache
+Caches verified user profiles per (user id, token) so authenticated
+requests do not need a database lookup
+"""
+
+import os
+import hashlib
+import threading
+from ttl_cache import TTLCache
+
+
+class PrincipalCache:
+    """TTL/LRU cache of authenticated users keyed by user id and token.
+
+    Entries are indexed by user id so that a profile change or deactivation
+    drops every cached token for that user at once. Each worker process keeps
+    its own cache, so the TTL bounds how long another worker can keep serving
+    a stale principal.
+    """
+
+    def __init__(self, maxsize=10000, ttl=60):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._keys_by_user = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(user_id, token):
+        digest = hashlib.sha256(token.encode('utf-8')).hexdigest()
+        return (user_id, digest)
+
+    def get(self, user_id, token):
+        return self._cache.get(self._key(user_id, token))
+
+    def set(self, user_id, token, user):
+        key = self._key(user_id, token)
+        self._cache.set(key, user)
+        with self._lock:
+            keys = self._keys_by_user.setdefault(user_id, set())
+            # Drop references to entries the LRU has already evicted
+            if len(keys) > 8:
+                keys.intersection_update(k for k in list(keys) if k in self._cache)
+            keys.add(key)
+            if len(self._keys_by_user) > 2 * self._cache.maxsize:
+                self._prune_index()
+
+    def _prune_index(self):
+        """Drop index entries for users with no live cache entries (lock held)"""
+        for uid in list(self._keys_by_user):
+            live = {k for k in self._keys_by_user[uid] if k in self._cache}
+            if live:
+                self._keys_by_user[uid] = live
+            else:
+                del self._keys_by_user[uid]
+
+    def invalidate_user(self, user_id):
+        """Forget every cached token for a user"""
+        with self._lock:
+            keys = self._keys_by_user.pop(user_id, set())
+        for key in keys:
+            self._cache.pop(key)
+
+    def clear(self):
+        with self._lock:
+            self._keys_by_user.clear()
+        self._cache.clear()
+
+    def stats(self):
+        return self._cache.stats()
+
+
+def principal_cache_from_env():
+    """Build a principal cache sized from the environment"""
+    return PrincipalCache(
+        maxsize=int(os.environ.get('AUTH_CACHE_MAX_SIZE', 10000)),
+        ttl=float(os.environ.get('AUTH_CACHE_TTL', 60)),
+    )
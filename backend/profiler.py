@@ -0,0 +1,255 @@
+"""
+StudyVerse Request Profiler
+Opt-in sampling profiler for slow requests: a background thread samples the
+stacks of in-flight requests, storage, bcrypt and OpenAI calls add timed
+spans, and the slowest captured profiles are kept for the admin endpoints
+"""
+
+import os
+import sys
+import heapq
+import random
+import itertools
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+
+# Profile of the request running in this context, None when not profiling.
+# Worker threads started with copy_context() add their spans to it too.
+current_profile = ContextVar('request_profile', default=None)
+
+MAX_SPANS = 500
+
+
+def record_span(kind, name, started, seconds):
+    """Attach a span (``started`` is a perf_counter value) to the current profile, if any"""
+    profile = current_profile.get()
+    if profile is not None:
+        profile.add_span(kind, name, started, seconds)
+
+
+@contextmanager
+def span(kind, name):
+    """Time a block as a span of the current profile (a no-op when not profiling)"""
+    profile = current_profile.get()
+    if profile is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.add_span(kind, name, started, time.perf_counter() - started)
+
+
+def frame_label(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class RequestProfile:
+    """Spans and stack samples of one request"""
+
+    def __init__(self, profile_id, method, route, path, sampled):
+        self.id = profile_id
+        self.method = method
+        self.route = route
+        self.path = path
+        self.sampled = sampled
+        self.status = None
+        self.reason = None
+        self.started_at = datetime.now(timezone.utc)
+        self.started = time.perf_counter()
+        self.duration = None
+        self._lock = threading.Lock()
+        self.spans = []
+        self.dropped_spans = 0
+        self.stacks = Counter()
+
+    def add_span(self, kind, name, started, seconds):
+        with self._lock:
+            if len(self.spans) >= MAX_SPANS:
+                self.dropped_spans += 1
+                return
+            self.spans.append((kind, name, started - self.started, seconds))
+
+    def add_sample(self, stack):
+        with self._lock:
+            self.stacks[stack] += 1
+
+    def summary(self):
+        with self._lock:
+            spans = list(self.spans)
+            samples = sum(self.stacks.values())
+        totals = defaultdict(lambda: {'count': 0, 'ms': 0.0})
+        for kind, _, _, seconds in spans:
+            totals[kind]['count'] += 1
+            totals[kind]['ms'] += seconds * 1000
+        return {
+            'id': self.id,
+            'method': self.method,
+            'route': self.route,
+            'path': self.path,
+            'status': self.status,
+            'reason': self.reason,
+            'started_at': self.started_at.isoformat(),
+            'duration_ms': round(self.duration * 1000, 2),
+            'samples': samples,
+            'span_totals': {kind: {'count': total['count'], 'ms': round(total['ms'], 2)}
+                            for kind, total in sorted(totals.items())},
+        }
+
+    def detail(self, top=25):
+        """Summary plus every span and the hottest functions and stacks"""
+        with self._lock:
+            spans = list(self.spans)
+            stacks = Counter(self.stacks)
+        samples = sum(stacks.values()) or 1
+        own, inclusive = Counter(), Counter()
+        for stack, count in stacks.items():
+            own[stack[-1]] += count
+            for label in set(stack):
+                inclusive[label] += count
+        result = self.summary()
+        result.update({
+            'spans': [{'kind': kind, 'name': name, 'start_ms': round(offset * 1000, 2),
+                       'duration_ms': round(seconds * 1000, 2)} for kind, name, offset, seconds in spans],
+            'dropped_spans': self.dropped_spans,
+            'top_functions': [{'function': label, 'self_pct': round(count * 100 / samples, 1),
+                               'total_pct': round(inclusive[label] * 100 / samples, 1)}
+                              for label, count in own.most_common(top)],
+            'top_stacks': [{'stack': ';'.join(stack), 'samples': count} for stack, count in stacks.most_common(top)],
+        })
+        return result
+
+    def collapsed(self):
+        """Stacks in the collapsed format flamegraph tools read"""
+        with self._lock:
+            stacks = Counter(self.stacks)
+        return ''.join(f"{';'.join(stack)} {count}\n" for stack, count in stacks.most_common())
+
+
+class RequestProfiler:
+    """Profiles requests and keeps the ``keep`` slowest captured ones.
+
+    While enabled, every in-flight request's stack is sampled each
+    ``interval`` seconds (wall clock, so I/O waits show up). When a request
+    finishes, its profile is kept if it took at least ``slow_ms`` or was
+    picked with probability ``sample_rate``, and discarded otherwise.
+    """
+
+    def __init__(self, enabled=False, sample_rate=0.0, slow_ms=2000, keep=20, interval=0.01, max_depth=64):
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+        self.keep = keep
+        self.interval = interval
+        self.max_depth = max_depth
+        self._lock = threading.Lock()
+        self._active = {}
+        self._slowest = []    # min-heap of (duration, id, profile)
+        self._ids = itertools.count(1)
+        self._sampler = None
+        self._stats = Counter()
+
+    def _ensure_sampler(self):
+        if self._sampler is None or not self._sampler.is_alive():
+            self._sampler = threading.Thread(target=self._sample_forever, name='request-profiler', daemon=True)
+            self._sampler.start()
+
+    def _sample_forever(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                active = list(self._active.items())
+            if not active:
+                continue
+            frames = sys._current_frames()
+            for ident, profile in active:
+                frame = frames.get(ident)
+                stack = []
+                while frame is not None and len(stack) < self.max_depth:
+                    stack.append(frame_label(frame.f_code))
+                    frame = frame.f_back
+                if stack:
+                    profile.add_sample(tuple(reversed(stack)))
+            self._stats['samples'] += len(active)
+
+    def start(self, method, route, path):
+        """Begin profiling the current request; returns a handle for ``finish``"""
+        if not self.enabled:
+            return None
+        profile = RequestProfile(next(self._ids), method, route, path, random.random() < self.sample_rate)
+        with self._lock:
+            self._active[threading.get_ident()] = profile
+            self._ensure_sampler()
+        return profile, current_profile.set(profile)
+
+    def finish(self, handle, status=None):
+        """Stop profiling and keep the profile if it was slow or sampled"""
+        if handle is None:
+            return None
+        profile, token = handle
+        try:
+            current_profile.reset(token)
+        except ValueError:
+            # Finished from another context (e.g. a streamed response)
+            current_profile.set(None)
+        profile.duration = time.perf_counter() - profile.started
+        profile.status = status
+        with self._lock:
+            self._active.pop(threading.get_ident(), None)
+            self._stats['requests'] += 1
+            if profile.duration * 1000 >= self.slow_ms:
+                profile.reason = 'slow'
+            elif profile.sampled:
+                profile.reason = 'sampled'
+            else:
+                return None
+            self._stats['captured'] += 1
+            entry = (profile.duration, profile.id, profile)
+            if len(self._slowest) < self.keep:
+                heapq.heappush(self._slowest, entry)
+            else:
+                heapq.heappushpop(self._slowest, entry)
+        return profile
+
+    def profiles(self):
+        """Kept profiles, slowest first"""
+        with self._lock:
+            entries = sorted(self._slowest, reverse=True)
+        return [profile for _, _, profile in entries]
+
+    def get(self, profile_id):
+        return next((profile for profile in self.profiles() if profile.id == profile_id), None)
+
+    def clear(self):
+        with self._lock:
+            self._slowest = []
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['in_flight'] = len(self._active)
+            stats['kept'] = len(self._slowest)
+        stats.update({
+            'enabled': self.enabled,
+            'sample_rate': self.sample_rate,
+            'slow_ms': self.slow_ms,
+            'keep': self.keep,
+            'interval_ms': self.interval * 1000,
+        })
+        return stats
+
+
+def profiler_from_env():
+    """Build the profiler from PROFILER_* environment variables (off unless PROFILER_ENABLED)"""
+    return RequestProfiler(
+        enabled=os.environ.get('PROFILER_ENABLED', 'false').lower() in ('1', 'true', 'yes'),
+        sample_rate=float(os.environ.get('PROFILER_SAMPLE_RATE', 0.01)),
+        slow_ms=float(os.environ.get('PROFILER_SLOW_MS', 2000)),
+        keep=int(os.environ.get('PROFILER_KEEP', 20)),
+        interval=float(os.environ.get('PROFILER_INTERVAL_MS', 10)) / 1000,
+    )
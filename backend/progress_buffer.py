@@ -0,0 +1,217 @@
+"""
+StudyVerse Progress Write Buffer
+Coalesces progress events from many requests into periodic bulk inserts so
+chatty clients do not turn into a storm of single-row commits
+"""
+
+import os
+import time
+import atexit
+import sqlite3
+import threading
+from collections import deque
+
+from db_pool import PoolClosedError, PoolTimeoutError
+
+
+def is_transient_error(error):
+    """True when the database could not be reached, as opposed to an event it rejected"""
+    if isinstance(error, (ConnectionError, TimeoutError, sqlite3.OperationalError,
+                          PoolTimeoutError, PoolClosedError)):
+        return True
+    try:
+        import psycopg2
+        return isinstance(error, (psycopg2.OperationalError, psycopg2.InterfaceError))
+    except ImportError:
+        return False
+
+
+class ProgressWriteBuffer:
+    """Collects events and hands them to ``flush_fn`` in batches.
+
+    A flush happens when ``max_events`` are waiting or ``max_delay`` seconds
+    after the oldest waiting event, whichever comes first. When the database
+    is unreachable (``is_transient_error``) the unwritten events are put back
+    and retried with exponential backoff, up to ``retry_max_delay`` seconds.
+    Any other batch failure is retried one event at a time so a single bad
+    event cannot hold back the rest; an event that fails while others in its
+    batch are written goes to a dead-letter queue, from which
+    ``replay_dead_letters`` puts it back. Beyond ``max_pending`` waiting (or
+    dead-lettered) events the oldest are dropped and counted.
+    """
+
+    def __init__(self, flush_fn, max_events=500, max_delay=2.0, max_pending=10000, retry_max_delay=60.0):
+        self.flush_fn = flush_fn
+        self.max_events = max_events
+        self.max_delay = max_delay
+        self.max_pending = max_pending
+        self.retry_max_delay = retry_max_delay
+        self._events = deque()
+        self._dead_letters = deque()
+        self._oldest = None
+        self._failures = 0
+        self._retry_at = 0.0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._stats = {'buffered': 0, 'flushed': 0, 'flushes': 0, 'flush_errors': 0, 'dropped': 0,
+                       'requeued': 0, 'dead_lettered': 0, 'replayed': 0}
+
+    def add(self, events):
+        """Queue events for the next flush"""
+        with self._lock:
+            if not self._events:
+                self._oldest = time.monotonic()
+            self._events.extend(events)
+            self._stats['buffered'] += len(events)
+            self._trim()
+            full = len(self._events) >= self.max_events
+        self._ensure_thread()
+        if full:
+            self._wakeup.set()
+
+    def _trim(self):
+        """Drop the oldest events beyond max_pending (lock held)"""
+        while len(self._events) > self.max_pending:
+            self._events.popleft()
+            self._stats['dropped'] += 1
+
+    def flush(self):
+        """Write everything currently buffered; returns the number of events written"""
+        with self._flush_lock:
+            with self._lock:
+                batch = list(self._events)
+                self._events.clear()
+                self._oldest = None
+            if not batch:
+                return 0
+            written, failed, requeue = 0, [], []
+            for start in range(0, len(batch), self.max_events):
+                chunk = batch[start:start + self.max_events]
+                try:
+                    self.flush_fn(chunk)
+                    written += len(chunk)
+                    continue
+                except Exception as e:
+                    with self._lock:
+                        self._stats['flush_errors'] += 1
+                    if is_transient_error(e):
+                        print(f"⚠️ Progress buffer flush failed, will retry {len(batch) - start} events: {e}")
+                        requeue = batch[start:]
+                        break
+                    print(f"Progress buffer flush failed, retrying {len(chunk)} events one at a time: {e}")
+                chunk_written, chunk_failed, rest = self._flush_each(chunk)
+                written += chunk_written
+                if rest or not chunk_written:
+                    # The database went away, or no event in the batch could be
+                    # written: nothing singles these events out, so retry them later
+                    requeue = [event for event, _ in chunk_failed] + rest + batch[start + len(chunk):]
+                    break
+                failed.extend(chunk_failed)
+            if failed:
+                print(f"⚠️ Progress buffer dead-lettered {len(failed)} events: {failed[-1][1]}")
+            with self._lock:
+                self._dead_letters.extend(failed)
+                self._stats['dead_lettered'] += len(failed)
+                while len(self._dead_letters) > self.max_pending:
+                    self._dead_letters.popleft()
+                    self._stats['dropped'] += 1
+                if requeue:
+                    self._events.extendleft(reversed(requeue))
+                    self._oldest = self._oldest or time.monotonic()
+                    self._stats['requeued'] += len(requeue)
+                    self._trim()
+                    self._failures += 1
+                    self._retry_at = time.monotonic() + min(self.retry_max_delay,
+                                                            self.max_delay * 2 ** (self._failures - 1))
+                else:
+                    self._failures = 0
+                    self._retry_at = 0.0
+                self._stats['flushed'] += written
+                self._stats['flushes'] += 1
+            return written
+
+    def _flush_each(self, events):
+        """Write events one by one; returns (written, [(event, error)], events left after a transient error)"""
+        written, failed = 0, []
+        for index, event in enumerate(events):
+            try:
+                self.flush_fn([event])
+                written += 1
+            except Exception as e:
+                if is_transient_error(e):
+                    return written, failed, events[index:]
+                failed.append((event, str(e)))
+        return written, failed, []
+
+    def replay_dead_letters(self):
+        """Queue the dead-lettered events for another attempt; returns how many"""
+        with self._lock:
+            events = [event for event, _ in self._dead_letters]
+            self._dead_letters.clear()
+            self._stats['replayed'] += len(events)
+        if events:
+            self.add(events)
+        return len(events)
+
+    def _ensure_thread(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='progress-buffer', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._lock:
+                oldest = self._oldest
+                size = len(self._events)
+                retry_at = self._retry_at
+            if size >= self.max_events:
+                due = 0
+            elif oldest is None:
+                due = self.max_delay
+            else:
+                due = max(0.0, oldest + self.max_delay - time.monotonic())
+            # Back off while the database is unreachable
+            due = max(due, retry_at - time.monotonic())
+            if due > 0:
+                self._wakeup.wait(due)
+                self._wakeup.clear()
+            with self._lock:
+                ready = self._events and time.monotonic() >= self._retry_at and (
+                    len(self._events) >= self.max_events
+                    or time.monotonic() - self._oldest >= self.max_delay
+                )
+            if ready:
+                self.flush()
+
+    def dead_letters(self):
+        """(event, error) pairs that could not be written, oldest first"""
+        with self._lock:
+            return list(self._dead_letters)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['pending'] = len(self._events)
+            stats['dead_letters'] = len(self._dead_letters)
+        return stats
+
+
+def progress_buffer_from_env(flush_fn):
+    """Build the write buffer when PROGRESS_BUFFER_ENABLED is set, else None"""
+    if os.environ.get('PROGRESS_BUFFER_ENABLED', 'false').lower() not in ('1', 'true', 'yes'):
+        return None
+    buffer = ProgressWriteBuffer(
+        flush_fn,
+        max_events=int(os.environ.get('PROGRESS_BUFFER_MAX_EVENTS', 500)),
+        max_delay=float(os.environ.get('PROGRESS_BUFFER_MAX_DELAY', 2.0)),
+        max_pending=int(os.environ.get('PROGRESS_BUFFER_MAX_PENDING', 10000)),
+        retry_max_delay=float(os.environ.get('PROGRESS_BUFFER_RETRY_MAX_DELAY', 60)),
+    )
+    # Don't lose buffered events on a clean shutdown
+    atexit.register(buffer.flush)
+    return buffer
@@ -0,0 +1,251 @@
+"""
+StudyVerse Prompt Registry
+Versioned prompt templates compiled once at startup against shared
+age-group profiles, with a content hash per template that feeds AI cache
+keys and per-template token accounting
+"""
+
+import json
+import string
+import hashlib
+import textwrap
+import threading
+from map_reduce import estimate_tokens
+
+# Shared by every generator so the audiences cannot drift apart
+AGE_PROFILES = {
+    'preschool': {'ages': '2-5 year olds', 'language': 'very simple language', 'level': 'very simple'},
+    'elementary': {'ages': '6-10 year olds', 'language': 'basic reading level', 'level': 'basic'},
+    'middle': {'ages': '11-14 year olds', 'language': 'intermediate complexity', 'level': 'intermediate'},
+    'high': {'ages': '15-18 year olds', 'language': 'advanced concepts', 'level': 'advanced'},
+}
+DEFAULT_AUDIENCE = 'students'
+
+# Response formats, shared by the single-purpose and study pack prompts
+ANALYSIS_FORMAT = '''{
+  "reading_level": "Elementary/Middle/High School",
+  "complexity_score": 1-10,
+  "key_topics": ["topic1", "topic2"],
+  "estimated_reading_time": minutes,
+  "recommendations": ["recommendation1", "recommendation2"]
+}'''
+
+FLASHCARD_FORMAT = '''{
+  "question": "Clear question",
+  "answer": "Concise answer",
+  "hint": "Helpful hint",
+  "difficulty": "Easy/Medium/Hard"
+}'''
+
+QUESTION_FORMAT = '''{
+  "question": "Question text?",
+  "options": ["Option A", "Option B", "Option C", "Option D"],
+  "correct_answer": 0,
+  "explanation": "Why this answer is correct"
+}'''
+
+
+class PromptTemplate:
+    """A prompt with ``{field}`` placeholders, pre-rendered once per age group.
+
+    Fields named in ``static`` and the age profile fields (plus ``audience``)
+    are filled in at compile time; the rest (text, counts, filenames) are
+    the only work left per request. Format specs are not supported.
+    """
+
+    def __init__(self, name, revision, source, audience=None, static=None):
+        self.name = name
+        self.revision = revision
+        self.source = textwrap.dedent(source).strip()
+        self.audience = audience
+        self.static = static or {}
+        self.version = self._fingerprint()
+        self._compiled = {group: self._compile(self._static_values(group))
+                          for group in list(AGE_PROFILES) + [None]}
+        self.fields = sorted({part[0] for part in self._compiled[None] if isinstance(part, tuple)})
+        self.base_tokens = {group or 'default': estimate_tokens(''.join(p for p in parts if isinstance(p, str)))
+                            for group, parts in self._compiled.items()}
+
+    def _fingerprint(self):
+        """Hash of everything that shapes the prompt, so edits change cache keys"""
+        material = json.dumps({
+            'name': self.name,
+            'revision': self.revision,
+            'source': self.source,
+            'audience': self.audience,
+            'static': self.static,
+            'profiles': AGE_PROFILES if self.audience else None,
+        }, sort_keys=True)
+        return f"r{self.revision}-{hashlib.sha256(material.encode('utf-8')).hexdigest()[:12]}"
+
+    def _static_values(self, age_group):
+        values = dict(self.static)
+        if self.audience:
+            profile = AGE_PROFILES.get(age_group)
+            values['audience'] = self.audience.format(**profile) if profile else DEFAULT_AUDIENCE
+        return values
+
+    def _compile(self, values):
+        """Split the source into literal strings and ('field',) runtime slots"""
+        parts = []
+        for literal, field, _, _ in string.Formatter().parse(self.source):
+            if literal:
+                parts.append(literal)
+            if field is None:
+                continue
+            if field in values:
+                parts.append(str(values[field]))
+            else:
+                parts.append((field,))
+        # Merge adjacent literals so rendering is a single join
+        merged = []
+        for part in parts:
+            if merged and isinstance(part, str) and isinstance(merged[-1], str):
+                merged[-1] += part
+            else:
+                merged.append(part)
+        return merged
+
+    def render(self, age_group=None, **values):
+        parts = self._compiled.get(age_group) or self._compiled[None]
+        return ''.join(part if isinstance(part, str) else str(values[part[0]]) for part in parts)
+
+
+class PromptRegistry:
+    """Templates by name with render counts and estimated/actual token usage"""
+
+    def __init__(self):
+        self._templates = {}
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def register(self, template):
+        self._templates[template.name] = template
+        self._stats[template.name] = {'renders': 0, 'rendered_tokens': 0, 'completions': 0,
+                                      'prompt_tokens': 0, 'completion_tokens': 0}
+        return template
+
+    def get(self, name):
+        return self._templates[name]
+
+    def version(self, name):
+        """Version hash of a template, part of every AI cache key built from it"""
+        return self._templates[name].version
+
+    def render(self, name, age_group=None, **values):
+        """Render a template and count its estimated prompt tokens"""
+        prompt = self._templates[name].render(age_group, **values)
+        tokens = estimate_tokens(prompt)
+        with self._lock:
+            stats = self._stats[name]
+            stats['renders'] += 1
+            stats['rendered_tokens'] += tokens
+        return prompt
+
+    def record_usage(self, name, response):
+        """Add the token usage the API reported for a completion of ``name``"""
+        usage = getattr(response, 'usage', None)
+        if usage is None:
+            return
+        with self._lock:
+            stats = self._stats[name]
+            stats['completions'] += 1
+            stats['prompt_tokens'] += getattr(usage, 'prompt_tokens', 0) or 0
+            stats['completion_tokens'] += getattr(usage, 'completion_tokens', 0) or 0
+
+    def stats(self):
+        with self._lock:
+            counters = {name: dict(stats) for name, stats in self._stats.items()}
+        result = {}
+        for name, template in self._templates.items():
+            stats = counters[name]
+            result[name] = {
+                'version': template.version,
+                'base_tokens': template.base_tokens,
+                'fields': template.fields,
+                'renders': stats['renders'],
+                'avg_rendered_tokens': round(stats['rendered_tokens'] / stats['renders'], 1) if stats['renders'] else 0.0,
+                'completions': stats['completions'],
+                'avg_prompt_tokens': round(stats['prompt_tokens'] / stats['completions'], 1) if stats['completions'] else 0.0,
+                'avg_completion_tokens': round(stats['completion_tokens'] / stats['completions'], 1) if stats['completions'] else 0.0,
+            }
+        return result
+
+
+# Bump a template's revision for changes that should invalidate cached
+# responses without editing its text (e.g. a model behavior change)
+prompt_registry = PromptRegistry()
+
+prompt_registry.register(PromptTemplate('analysis', 1, '''
+    Analyze this text for {audience}:
+
+    "{text}"
+
+    Provide analysis in this exact JSON format:
+    {analysis_format}
+''', audience='{ages}, {language}', static={'analysis_format': ANALYSIS_FORMAT}))
+
+prompt_registry.register(PromptTemplate('flashcards', 1, '''
+    Create {count} flashcards from this text for {audience}:
+
+    "{text}"
+
+    Return exactly this JSON format:
+    {{"flashcards": [{flashcard_format}]}}
+''', audience='{level} questions for {ages}', static={'flashcard_format': FLASHCARD_FORMAT}))
+
+prompt_registry.register(PromptTemplate('quiz', 1, '''
+    Create {count} multiple choice questions from this text for {audience}:
+
+    "{text}"
+
+    Return exactly this JSON format:
+    {{"questions": [{question_format}]}}
+''', audience='{level} multiple choice for {ages}', static={'question_format': QUESTION_FORMAT}))
+
+prompt_registry.register(PromptTemplate('study_pack', 1, '''
+    Create a study pack from this text for {audience}:
+
+    "{text}"
+
+    Include a reading analysis, {flashcard_count} flashcards and {quiz_count} multiple choice questions.
+    Return exactly this JSON format:
+    {{"analysis": {analysis_format},
+    "flashcards": [{flashcard_format}],
+    "questions": [{question_format}]}}
+''', audience='{ages}, {language}', static={
+    'analysis_format': ANALYSIS_FORMAT,
+    'flashcard_format': FLASHCARD_FORMAT,
+    'question_format': QUESTION_FORMAT,
+}))
+
+prompt_registry.register(PromptTemplate('syllabus', 1, '''
+    Analyze this syllabus content and extract key information:
+
+    Filename: {filename}
+    {label}: {content}
+
+    Please provide:
+    1. Subject/Course name
+    2. Academic level (Elementary, Middle School, High School, College)
+    3. Duration (semester, year, etc.)
+    4. Key topics covered (list of 5-10 main topics)
+    5. Learning objectives (3-5 main goals)
+
+    Format as JSON with keys: subject, level, duration, topics, learning_objectives
+'''))
+
+prompt_registry.register(PromptTemplate('report_card', 1, '''
+    Analyze this report card and provide detailed insights:
+
+    Filename: {filename}
+
+    Please provide a comprehensive analysis including:
+    1. Overall GPA/performance summary
+    2. Subject-wise breakdown with grades
+    3. Identified strengths and weaknesses
+    4. Specific learning recommendations for improvement
+    5. Priority areas that need immediate attention
+
+    Format as JSON with keys: overall_gpa, subjects, strengths, areas_for_improvement, recommendations
+'''))
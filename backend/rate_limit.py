@@ -0,0 +1,264 @@
+"""
+StudyVerse Rate Limiting
+Token buckets keyed per client IP and per account email, kept in process
+memory or shared through PostgreSQL, to throttle login and registration
+"""
+
+import os
+import math
+import time
+import threading
+from collections import OrderedDict
+
+
+class RateLimitExceeded(Exception):
+    """Raised when a bucket has no tokens left"""
+
+    def __init__(self, message, retry_after=1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class Policy:
+    """Bucket of ``capacity`` tokens refilled at ``capacity / period`` tokens per second"""
+
+    def __init__(self, name, capacity, period):
+        if capacity < 1 or period <= 0:
+            raise ValueError("Invalid rate limit %s: %s/%s" % (name, capacity, period))
+        self.name = name
+        self.capacity = capacity
+        self.period = period
+        self.rate = capacity / period
+
+    @classmethod
+    def parse(cls, name, spec):
+        """Parse ``"20/60"`` as 20 requests per 60 seconds"""
+        capacity, _, period = spec.partition('/')
+        return cls(name, int(capacity), float(period or 60))
+
+
+class MemoryBucketStore:
+    """Per-process buckets; the least recently touched are dropped beyond ``maxsize``"""
+
+    name = 'memory'
+
+    def __init__(self, maxsize=100000, clock=time.monotonic):
+        self.maxsize = maxsize
+        self._clock = clock
+        self._buckets = OrderedDict()    # key -> (tokens, updated_at)
+        self._lock = threading.Lock()
+
+    def consume(self, key, capacity, rate, cost=1):
+        """Take ``cost`` tokens if available; returns (allowed, tokens_left)"""
+        now = self._clock()
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated_at) * rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+        return allowed, tokens
+
+    def reset(self, key):
+        with self._lock:
+            self._buckets.pop(key, None)
+
+    def prune(self, prefix, idle_for, limit):
+        """Drop up to ``limit`` ``prefix`` buckets untouched for ``idle_for`` seconds"""
+        cutoff = self._clock() - idle_for
+        with self._lock:
+            # Buckets are kept in the order they were last touched
+            stale = []
+            for key, (_, updated_at) in self._buckets.items():
+                if updated_at > cutoff or len(stale) >= limit:
+                    break
+                if key.startswith(prefix):
+                    stale.append(key)
+            for key in stale:
+                del self._buckets[key]
+        return len(stale)
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+def create_rate_limit_schema(cursor):
+    """DDL for the shared Postgres bucket table, applied by migrations.py"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS rate_limit_buckets (
+            bucket_key VARCHAR(320) PRIMARY KEY,
+            tokens DOUBLE PRECISION NOT NULL,
+            updated_at DOUBLE PRECISION NOT NULL
+        )
+    ''')
+
+
+def create_rate_limit_expiry_index(cursor):
+    """Index that lets prune() find idle Postgres buckets"""
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_rate_limit_buckets_updated
+        ON rate_limit_buckets (updated_at)
+    ''')
+
+
+class PostgresBucketStore:
+    """Buckets shared by every worker and instance, refilled atomically in SQL"""
+
+    name = 'postgres'
+
+    def __init__(self, connection):
+        # ``connection`` is a context-manager factory such as auth_postgresql.db_connection;
+        # the table comes from migrations.py (create_rate_limit_schema)
+        self._connection = connection
+
+    def consume(self, key, capacity, rate, cost=1):
+        # The database clock is used so instances with skewed clocks agree
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                WITH now AS (SELECT EXTRACT(EPOCH FROM clock_timestamp())::float8 AS ts)
+                INSERT INTO rate_limit_buckets AS b (bucket_key, tokens, updated_at)
+                SELECT %(key)s, %(capacity)s, ts FROM now
+                ON CONFLICT (bucket_key) DO UPDATE
+                SET tokens = LEAST(%(capacity)s, b.tokens + (EXCLUDED.updated_at - b.updated_at) * %(rate)s),
+                    updated_at = EXCLUDED.updated_at
+                RETURNING tokens
+            ''', {'key': key, 'capacity': capacity, 'rate': rate})
+            tokens = cursor.fetchone()['tokens']
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+                cursor.execute('''
+                    UPDATE rate_limit_buckets SET tokens = %s WHERE bucket_key = %s
+                ''', (tokens, key))
+            conn.commit()
+            cursor.close()
+        return allowed, tokens
+
+    def reset(self, key):
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('DELETE FROM rate_limit_buckets WHERE bucket_key = %s', (key,))
+            conn.commit()
+            cursor.close()
+
+    def prune(self, prefix, idle_for, limit):
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            # SKIP LOCKED so workers pruning at the same time split the work
+            cursor.execute('''
+                DELETE FROM rate_limit_buckets WHERE bucket_key IN (
+                    SELECT bucket_key FROM rate_limit_buckets
+                    WHERE updated_at <= EXTRACT(EPOCH FROM clock_timestamp())::float8 - %s
+                      AND bucket_key LIKE %s
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                )
+            ''', (idle_for, prefix + '%', limit))
+            deleted = cursor.rowcount
+            conn.commit()
+            cursor.close()
+        return deleted
+
+
+class RateLimiter:
+    """Named token-bucket policies over a bucket store.
+
+    If the store itself fails (e.g. the shared database is down) requests
+    are allowed through rather than locking everyone out. Every
+    ``prune_every`` hits, up to ``prune_limit`` buckets per policy that have
+    been idle long enough to be full again are deleted; a missing bucket
+    starts full, so nothing changes for those clients.
+    """
+
+    def __init__(self, policies, store=None, enabled=True, prune_every=1000, prune_limit=1000):
+        self.policies = {policy.name: policy for policy in policies}
+        self.store = store if store is not None else MemoryBucketStore()
+        self.enabled = enabled
+        self.prune_every = prune_every
+        self.prune_limit = prune_limit
+        self._hits = 0
+        self._lock = threading.Lock()
+        self._stats = {'allowed': 0, 'limited': 0, 'store_errors': 0, 'pruned': 0}
+
+    def hit(self, policy_name, key, cost=1):
+        """Consume from ``policy_name``'s bucket for ``key`` or raise RateLimitExceeded"""
+        if not self.enabled or not key:
+            return
+        policy = self.policies[policy_name]
+        with self._lock:
+            self._hits += 1
+            prune = bool(self.prune_every) and self._hits % self.prune_every == 0
+        if prune:
+            self.prune()
+        try:
+            allowed, tokens = self.store.consume(f"{policy_name}:{key}", policy.capacity, policy.rate, cost)
+        except Exception as e:
+            print(f"Rate limit store error: {e}")
+            with self._lock:
+                self._stats['store_errors'] += 1
+            return
+        with self._lock:
+            self._stats['allowed' if allowed else 'limited'] += 1
+        if not allowed:
+            retry_after = max(1, math.ceil((cost - tokens) / policy.rate))
+            raise RateLimitExceeded("Too many attempts, please try again later", retry_after=retry_after)
+
+    def reset(self, policy_name, key):
+        """Refill a bucket, e.g. clear failed-login attempts after a successful login"""
+        if not self.enabled or not key:
+            return
+        try:
+            self.store.reset(f"{policy_name}:{key}")
+        except Exception as e:
+            print(f"Rate limit store error: {e}")
+
+    def prune(self):
+        """Delete buckets idle for a full period (capacity / rate); returns how many"""
+        deleted = 0
+        for name, policy in self.policies.items():
+            try:
+                deleted += self.store.prune(f"{name}:", policy.period, self.prune_limit)
+            except Exception as e:
+                print(f"Rate limit store error: {e}")
+                with self._lock:
+                    self._stats['store_errors'] += 1
+        with self._lock:
+            self._stats['pruned'] += deleted
+        return deleted
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['enabled'] = self.enabled
+        stats['backend'] = self.store.name
+        stats['policies'] = {name: f"{p.capacity}/{p.period:g}s" for name, p in self.policies.items()}
+        return stats
+
+
+def rate_limiter_from_env():
+    """Build the auth rate limiter from RATE_LIMIT_* environment variables"""
+    policies = [
+        Policy.parse('login_ip', os.environ.get('RATE_LIMIT_LOGIN_IP', '20/60')),
+        Policy.parse('login_email', os.environ.get('RATE_LIMIT_LOGIN_EMAIL', '5/300')),
+        Policy.parse('register_ip', os.environ.get('RATE_LIMIT_REGISTER_IP', '5/3600')),
+    ]
+    store = None
+    backend_name = os.environ.get('RATE_LIMIT_BACKEND', 'memory').lower()
+    if backend_name == 'postgres':
+        try:
+            from auth_postgresql import db_connection
+            store = PostgresBucketStore(db_connection)
+        except Exception as e:
+            print(f"⚠️ Rate limit backend '{backend_name}' unavailable, using memory only: {e}")
+    return RateLimiter(
+        policies,
+        store=store,
+        enabled=os.environ.get('RATE_LIMIT_ENABLED', 'true').lower() in ('1', 'true', 'yes'),
+        prune_every=int(os.environ.get('RATE_LIMIT_PRUNE_EVERY', 1000)),
+        prune_limit=int(os.environ.get('RATE_LIMIT_PRUNE_LIMIT', 1000)),
+    )
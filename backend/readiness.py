@@ -0,0 +1,116 @@
+"""
+StudyVerse Readiness Checks
+Probes the database and the OpenAI API for the /api/ready endpoint, caching
+each result for a short TTL so frequent health checks cannot overload the
+dependencies they measure
+"""
+
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+
+class DependencyProbe:
+    """Runs one dependency check at most once per ``ttl`` seconds.
+
+    ``check`` raises when the dependency is unhealthy and may return a dict
+    of details to report. Concurrent callers share one probe; a probe
+    slower than ``timeout`` is reported as failed (and cached) while it
+    finishes in the background, and no second probe starts until it does.
+    """
+
+    def __init__(self, name, check, ttl=10.0, timeout=3.0, critical=True, executor=None):
+        self.name = name
+        self.check = check
+        self.ttl = ttl
+        self.timeout = timeout
+        self.critical = critical
+        self._executor = executor or ThreadPoolExecutor(max_workers=1, thread_name_prefix=f'probe-{name}')
+        self._lock = threading.Lock()
+        self._result = None
+        self._checked_at = 0.0
+        self._running = None
+        self.probes = 0
+
+    def _run(self):
+        start = time.perf_counter()
+        try:
+            details = self.check() or {}
+            result = {'status': 'ok', **details}
+        except Exception as e:
+            result = {'status': 'fail', 'error': str(e) or e.__class__.__name__}
+        elapsed = time.perf_counter() - start
+        if elapsed > self.timeout and result['status'] == 'ok':
+            result = {'status': 'fail', 'error': f'Slow response ({elapsed:.1f}s)'}
+        result['latency_ms'] = round(elapsed * 1000, 2)
+        self._store(result)
+        return result
+
+    def _store(self, result):
+        with self._lock:
+            self._result = result
+            self._checked_at = time.monotonic()
+
+    def refresh(self):
+        """Start a probe if the cached result is stale; returns it (None if fresh)"""
+        with self._lock:
+            if self._result is not None and time.monotonic() - self._checked_at < self.ttl:
+                return None
+            if self._running is None or self._running.done():
+                self._running = self._executor.submit(self._run)
+                self.probes += 1
+            return self._running
+
+    def result(self):
+        """The cached result if fresh, otherwise a new probe's (waiting up to ``timeout``)"""
+        running = self.refresh()
+        if running is not None:
+            try:
+                running.result(timeout=self.timeout)
+            except FutureTimeoutError:
+                self._store({'status': 'fail', 'error': f'No response within {self.timeout:g}s', 'latency_ms': None})
+        with self._lock:
+            return self._annotate(self._result)
+
+    def _annotate(self, result):
+        return dict(result, critical=self.critical, age_s=round(time.monotonic() - self._checked_at, 1))
+
+
+class Readiness:
+    """Aggregates probes: 'ready', 'degraded' (a non-critical probe failed)
+    or 'unavailable' (a critical one failed, reported with a 503)"""
+
+    def __init__(self, probes):
+        self.probes = {probe.name: probe for probe in probes}
+
+    def report(self):
+        # Start stale probes together so they wait in parallel
+        for probe in self.probes.values():
+            probe.refresh()
+        checks = {name: probe.result() for name, probe in self.probes.items()}
+        failed = [name for name, result in checks.items() if result['status'] != 'ok']
+        if any(checks[name]['critical'] for name in failed):
+            status = 'unavailable'
+        elif failed:
+            status = 'degraded'
+        else:
+            status = 'ready'
+        return {'status': status, 'checks': checks}
+
+
+def readiness_from_env(checks):
+    """Probes for {name: check} configured by READINESS_* environment variables.
+
+    Only dependencies listed in READINESS_CRITICAL (default ``database``)
+    make the worker unready; the others are reported as degraded. OpenAI is
+    not critical by default because every worker shares it and the AI
+    routes already serve fallbacks, so draining workers would not help.
+    """
+    ttl = float(os.environ.get('READINESS_TTL', 10))
+    timeout = float(os.environ.get('READINESS_TIMEOUT', 3))
+    critical = {name.strip() for name in os.environ.get('READINESS_CRITICAL', 'database').split(',') if name.strip()}
+    return Readiness([
+        DependencyProbe(name, check, ttl=ttl, timeout=timeout, critical=name in critical)
+        for name, check in checks.items()
+    ])
@@ -0,0 +1,106 @@
+"""
+StudyVerse Incremental JSON Parsing
+Extracts complete objects from a JSON array while the model is still
+streaming the rest of the document
+"""
+
+import re
+import json
+
+
+class ArrayItemStreamParser:
+    """Incrementally yields the items of the array stored under ``key``.
+
+    Feed it text chunks as they arrive; each call to ``feed`` returns the
+    array items that became complete in that chunk. Works for documents such
+    as ``{"flashcards": [{...}, {...}]}`` and for a bare top-level array.
+    Items that fail to parse are skipped rather than aborting the stream.
+    """
+
+    def __init__(self, key):
+        self.key = key
+        self._key_pattern = re.compile(r'"%s"\s*:\s*\[' % re.escape(key))
+        self._buffer = ''
+        self._pos = 0              # next unscanned index in _buffer
+        self._in_array = False
+        self._done = False
+        self._item_start = None
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self.items_parsed = 0
+        self.items_skipped = 0
+
+    @property
+    def done(self):
+        return self._done
+
+    def _find_array_start(self):
+        match = self._key_pattern.search(self._buffer)
+        if match:
+            return match.end()
+        stripped = self._buffer.lstrip().lstrip('`').lstrip()
+        if stripped.startswith('json'):
+            stripped = stripped[4:].lstrip()
+        if stripped.startswith('['):
+            return self._buffer.index('[') + 1
+        return None
+
+    def feed(self, chunk):
+        """Consume a chunk of model output and return newly completed items"""
+        if self._done or not chunk:
+            return []
+        self._buffer += chunk
+
+        if not self._in_array:
+            start = self._find_array_start()
+            if start is None:
+                return []
+            self._in_array = True
+            self._pos = start
+
+        items = []
+        buffer = self._buffer
+        i = self._pos
+        while i < len(buffer):
+            ch = buffer[i]
+            if self._item_start is None:
+                if ch == '{' or ch == '[':
+                    self._item_start = i
+                    self._depth = 1
+                elif ch == ']':
+                    self._done = True
+                    i += 1
+                    break
+            elif self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch == '{' or ch == '[':
+                self._depth += 1
+            elif ch == '}' or ch == ']':
+                self._depth -= 1
+                if self._depth == 0:
+                    raw = buffer[self._item_start:i + 1]
+                    self._item_start = None
+                    try:
+                        items.append(json.loads(raw))
+                        self.items_parsed += 1
+                    except ValueError:
+                        self.items_skipped += 1
+            i += 1
+
+        # Keep only the unfinished tail so the buffer stays small
+        if self._item_start is not None:
+            self._buffer = buffer[self._item_start:]
+            self._pos = i - self._item_start
+            self._item_start = 0
+        else:
+            self._buffer = ''
+            self._pos = 0
+        return items
@@ -0,0 +1,19 @@
+"""
+StudyVerse test configuration
+Puts the backend modules on the path and, before any of them is imported,
+keeps password hashing cheap and inline, points SQLite at a scratch file
+and leaves the real OpenAI client unconfigured
+"""
+
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault('BCRYPT_ROUNDS', '4')
+os.environ.setdefault('PASSWORD_HASH_WORKERS', '0')
+os.environ.setdefault('RATE_LIMIT_ENABLED', 'false')
+os.environ.setdefault('AI_TOKEN_BUDGET_ENABLED', 'false')
+os.environ['SQLITE_PATH'] = os.path.join(tempfile.mkdtemp(prefix='studyverse-tests-'), 'studyverse.db')
+os.environ['OPENAI_API_KEY'] = ''
@@ -0,0 +1,97 @@
+"""
+AI response cache tests
+The shared SQLite tier gets its table from migrations and expired entries
+are deleted in bounded batches as the cache is written
+"""
+
+import time
+
+import pytest
+
+import auth_sqlite
+from ai_cache import AIResponseCache, SQLiteCacheBackend
+
+
+@pytest.fixture
+def backend():
+    backend = SQLiteCacheBackend(auth_sqlite.db_connection)
+    with auth_sqlite.db_connection() as conn:
+        conn.execute('DELETE FROM ai_response_cache')
+        conn.commit()
+    return backend
+
+
+def age_entries(keys, seconds):
+    with auth_sqlite.db_connection() as conn:
+        conn.executemany('UPDATE ai_response_cache SET created_at = created_at - ? WHERE cache_key = ?',
+                         [(seconds, key) for key in keys])
+        conn.commit()
+
+
+def cached_keys():
+    with auth_sqlite.db_connection() as conn:
+        return sorted(row['cache_key'] for row in conn.execute('SELECT cache_key FROM ai_response_cache'))
+
+
+def test_the_table_comes_from_migrations():
+    def unused_connection():
+        raise AssertionError('the backend must not open a connection when it is built')
+
+    SQLiteCacheBackend(unused_connection)
+    with auth_sqlite.db_connection() as conn:
+        versions = [row['version'] for row in conn.execute('SELECT version FROM schema_migrations')]
+        indexes = [row['name'] for row in conn.execute("SELECT name FROM sqlite_master WHERE tbl_name = 'ai_response_cache'")]
+    assert 5 in versions
+    assert 'idx_ai_response_cache_created' in indexes
+
+    cache = AIResponseCache(backend=SQLiteCacheBackend(auth_sqlite.db_connection))
+    cache.set('k', {'answer': 42})
+    cache._memory.clear()
+    assert cache.get('k') == {'answer': 42}
+
+
+def test_prune_deletes_a_bounded_batch_of_expired_entries(backend):
+    for n in range(5):
+        backend.set(f'key{n}', {'n': n})
+    age_entries(['key0', 'key1', 'key2'], 120)
+
+    assert backend.prune(max_age=60, limit=2) == 2
+    assert len(cached_keys()) == 3
+    assert backend.prune(max_age=60, limit=2) == 1
+    assert cached_keys() == ['key3', 'key4']
+    assert backend.prune(max_age=60, limit=2) == 0
+
+
+def test_writes_prune_every_n_stores(backend):
+    cache = AIResponseCache(ttl=60, backend=backend, prune_every=3, prune_limit=10)
+    cache.set('old0', 'a')
+    cache.set('old1', 'b')
+    age_entries(['old0', 'old1'], 120)
+
+    cache.set('new0', 'c')
+    assert cached_keys() == ['new0']
+    assert cache.stats()['pruned'] == 2
+
+
+def test_prune_failures_do_not_fail_writes():
+    class Broken:
+        name = 'broken'
+
+        def set(self, key, value):
+            pass
+
+        def prune(self, max_age, limit):
+            raise RuntimeError('database unavailable')
+
+    cache = AIResponseCache(ttl=60, backend=Broken(), prune_every=1)
+    cache.set('k', 'v')
+    assert cache.get('k') == 'v'
+    assert cache.stats()['backend_errors'] == 1
+
+
+def test_entries_without_a_ttl_are_never_pruned(backend):
+    cache = AIResponseCache(ttl=None, backend=backend, prune_every=1)
+    cache.set('k', 'v')
+    age_entries(['k'], time.time())
+    cache.set('k2', 'v')
+    assert cached_keys() == ['k', 'k2']
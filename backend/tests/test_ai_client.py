@@ -0,0 +1,261 @@
+"""
+Resilient AI client tests
+Circuit breaker transitions on a fake clock, retries and Retry-After,
+hedged requests, and task deadlines for streams
+"""
+
+import threading
+import time
+import types
+
+import httpx
+import openai
+import pytest
+
+from ai_client import AIUnavailableError, CircuitBreaker, DeadlineExceeded, ResilientChatClient, degraded_reason
+from benchmarks.fake_openai import FakeOpenAIClient
+
+REQUEST = httpx.Request('POST', 'https://api.openai.com/v1/chat/completions')
+
+
+def status_error(status, retry_after=None):
+    headers = {'retry-after': str(retry_after)} if retry_after is not None else {}
+    response = httpx.Response(status, headers=headers, request=REQUEST)
+    error_class = {400: openai.BadRequestError, 429: openai.RateLimitError}.get(status, openai.InternalServerError)
+    return error_class(f'HTTP {status}', response=response, body=None)
+
+
+class ScriptedClient:
+    """OpenAI stand-in whose calls follow a script of errors and (delay, reply) steps"""
+
+    def __init__(self, *steps):
+        self.steps = list(steps)
+        self.calls = 0
+        self.timeouts = []
+        self._lock = threading.Lock()
+        self.chat = types.SimpleNamespace(completions=types.SimpleNamespace(create=self.create))
+
+    def create(self, timeout=None, **kwargs):
+        with self._lock:
+            self.calls += 1
+            self.timeouts.append(timeout)
+            step = self.steps.pop(0) if len(self.steps) > 1 else self.steps[0]
+        if isinstance(step, Exception):
+            raise step
+        delay, reply = step
+        time.sleep(delay)
+        return reply
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+# Circuit breaker
+def test_breaker_opens_after_consecutive_failures():
+    clock = Clock()
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30, clock=clock)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.opened == 1
+    assert not breaker.allow()
+
+
+def test_half_open_breaker_lets_one_probe_through():
+    clock = Clock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30, clock=clock)
+    breaker.record_failure()
+    clock.now = 29.9
+    assert not breaker.allow()
+    clock.now = 30
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow() and breaker.allow()
+
+
+def test_failed_probe_reopens_the_breaker():
+    clock = Clock()
+    breaker = CircuitBreaker(failure_threshold=5, reset_timeout=10, clock=clock)
+    for _ in range(5):
+        breaker.record_failure()
+    clock.now = 10
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.opened == 2
+    clock.now = 19
+    assert not breaker.allow()
+    clock.now = 20
+    assert breaker.allow()
+
+
+# Retries
+def test_retryable_errors_are_retried_until_success():
+    upstream = ScriptedClient(status_error(503), openai.APITimeoutError(REQUEST), (0, 'ok'))
+    client = ResilientChatClient(upstream, max_retries=2, backoff_base=0.001)
+    assert client.create('analysis', model='gpt-4') == 'ok'
+    assert upstream.calls == 3
+    stats = client.stats()
+    assert stats['retries'] == 2 and stats['upstream_errors'] == 1 and stats['timeouts'] == 1
+    assert client.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_each_attempt_gets_the_remaining_deadline():
+    upstream = ScriptedClient(status_error(500), (0, 'ok'))
+    client = ResilientChatClient(upstream, deadlines={'analysis': 5}, backoff_base=0.001)
+    client.create('analysis')
+    assert 4 < upstream.timeouts[1] <= upstream.timeouts[0] <= 5
+
+
+def test_retry_after_is_honored():
+    upstream = ScriptedClient(status_error(429, retry_after=0.2), (0, 'ok'))
+    client = ResilientChatClient(upstream, max_retries=1, backoff_base=0.001)
+    start = time.monotonic()
+    assert client.create('analysis') == 'ok'
+    assert time.monotonic() - start >= 0.2
+
+
+def test_retry_after_beyond_the_deadline_gives_up():
+    upstream = ScriptedClient(status_error(429, retry_after=60), (0, 'ok'))
+    client = ResilientChatClient(upstream, deadlines={'analysis': 1}, max_retries=3)
+    with pytest.raises(openai.RateLimitError):
+        client.create('analysis')
+    assert upstream.calls == 1
+    assert client.stats()['failed'] == 1
+
+
+def test_backoff_is_jittered_and_capped():
+    client = ResilientChatClient(ScriptedClient((0, 'ok')), backoff_base=0.5, backoff_max=2)
+    delays = [client._backoff(attempt, RuntimeError(), remaining=100) for attempt in range(1, 8) for _ in range(20)]
+    assert all(0 <= delay <= 2 for delay in delays)
+    assert client._backoff(1, status_error(503, retry_after=3), remaining=100) >= 3
+    assert client._backoff(1, status_error(503, retry_after='soon'), remaining=100) <= 0.5
+
+
+def test_client_errors_are_not_retried_and_do_not_trip_the_breaker():
+    upstream = ScriptedClient(status_error(400))
+    client = ResilientChatClient(upstream, breaker=CircuitBreaker(failure_threshold=1))
+    for _ in range(3):
+        with pytest.raises(openai.BadRequestError):
+            client.create('analysis')
+    assert upstream.calls == 3
+    assert client.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_exhausted_retries_open_the_breaker_and_later_calls_fail_fast():
+    upstream = ScriptedClient(status_error(502))
+    client = ResilientChatClient(upstream, max_retries=1, backoff_base=0.001,
+                                 breaker=CircuitBreaker(failure_threshold=2, reset_timeout=60))
+    for _ in range(2):
+        with pytest.raises(openai.InternalServerError):
+            client.create('analysis')
+    assert upstream.calls == 4
+    assert client.is_open()
+
+    with pytest.raises(AIUnavailableError) as raised:
+        client.create('analysis')
+    assert degraded_reason(raised.value) == 'circuit_open'
+    assert upstream.calls == 4
+    assert client.stats()['short_circuited'] == 1
+
+
+# Hedging
+def test_fast_primary_is_not_hedged():
+    upstream = ScriptedClient((0, 'primary'))
+    client = ResilientChatClient(upstream, hedge_after=0.2)
+    assert client.create('analysis') == 'primary'
+    assert upstream.calls == 1
+    assert 'hedged' not in client.stats()
+
+
+def test_hedge_wins_against_a_slow_primary():
+    upstream = ScriptedClient((1.0, 'primary'), (0, 'hedge'))
+    client = ResilientChatClient(upstream, hedge_after=0.05)
+    start = time.monotonic()
+    assert client.create('analysis') == 'hedge'
+    assert time.monotonic() - start < 0.5
+    stats = client.stats()
+    assert stats['hedged'] == 1 and stats['hedge_wins'] == 1
+
+
+def test_primary_can_still_win_after_hedging():
+    upstream = ScriptedClient((0.15, 'primary'), (1.0, 'hedge'))
+    client = ResilientChatClient(upstream, hedge_after=0.05)
+    assert client.create('analysis') == 'primary'
+    assert client.stats()['hedged'] == 1
+    assert 'hedge_wins' not in client.stats()
+
+
+def test_hedged_attempts_that_outlive_the_deadline_time_out():
+    upstream = ScriptedClient((2.0, 'too late'))
+    client = ResilientChatClient(upstream, deadlines={'analysis': 0.3}, hedge_after=0.05, max_retries=0)
+    start = time.monotonic()
+    with pytest.raises(DeadlineExceeded) as raised:
+        client.create('analysis')
+    assert time.monotonic() - start < 1.0
+    assert degraded_reason(raised.value) == 'timeout'
+    assert upstream.calls == 2
+    assert client.stats()['timeouts'] == 1
+    assert client.breaker._failures == 1
+
+
+# Streaming
+def test_stream_success_closes_a_half_open_breaker():
+    clock = Clock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=5, clock=clock)
+    breaker.record_failure()
+    clock.now = 5
+    client = ResilientChatClient(FakeOpenAIClient('{"flashcards": []}'), breaker=breaker)
+    chunks = list(client.stream('flashcards', model='gpt-4', messages=[{'role': 'user', 'content': 'hi'}]))
+    assert ''.join(chunk.choices[0].delta.content or '' for chunk in chunks) == '{"flashcards": []}'
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_trickling_stream_is_cut_at_the_task_deadline():
+    fake = FakeOpenAIClient('x' * 200, chunk_size=1, token_delay=0.01)
+    client = ResilientChatClient(fake, deadlines={'flashcards': 0.2}, breaker=CircuitBreaker(failure_threshold=1))
+    received = 0
+    start = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        for _ in client.stream('flashcards', model='gpt-4', messages=[{'role': 'user', 'content': 'hi'}]):
+            received += 1
+    assert time.monotonic() - start < 0.5
+    assert 0 < received < 200
+    assert client.stats()['timeouts'] == 1
+    assert client.is_open()
+
+
+def test_stream_refused_while_open():
+    client = ResilientChatClient(FakeOpenAIClient(), breaker=CircuitBreaker(failure_threshold=1))
+    client.breaker.record_failure()
+    with pytest.raises(AIUnavailableError):
+        client.stream('flashcards', model='gpt-4', messages=[])
+
+
+def test_abandoned_probe_stream_releases_the_breaker():
+    clock = Clock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=5, clock=clock)
+    breaker.record_failure()
+    clock.now = 5
+    fake = FakeOpenAIClient('x' * 50, chunk_size=1)
+    client = ResilientChatClient(fake, breaker=breaker)
+    chunks = client.stream('flashcards', model='gpt-4', messages=[{'role': 'user', 'content': 'hi'}])
+    next(chunks)
+    assert not breaker.allow()
+    chunks.close()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow()
+    assert client.stats()['abandoned'] == 1
@@ -0,0 +1,43 @@
+"""
+AI route error handling tests
+Oversized prompts are refused with 413 instead of being served a fallback
+"""
+
+import pytest
+
+import main
+from ai_client import ResilientChatClient
+from benchmarks.fake_openai import FakeOpenAIClient
+from model_router import PromptTooLargeError
+
+TEXT = 'Photosynthesis turns light energy into chemical energy in the chloroplasts.'
+
+
+@pytest.fixture
+def fake(monkeypatch):
+    fake = FakeOpenAIClient()
+    monkeypatch.setattr(main, 'client', ResilientChatClient(fake, max_retries=0))
+    main.ai_cache.clear()
+    yield fake
+    main.ai_cache.clear()
+
+
+@pytest.mark.parametrize('path', ['/api/ai/analyze-text', '/api/ai/generate-flashcards', '/api/ai/generate-quiz'])
+def test_prompt_too_large_is_a_413_not_a_fallback(path, fake, monkeypatch):
+    def route(task, text, **counts):
+        raise PromptTooLargeError('Input too large for any model (~99,999 tokens)')
+
+    monkeypatch.setattr(main.model_router, 'route', route)
+    response = main.app.test_client().post(path, json={'text': TEXT, 'count': 2})
+    assert response.status_code == 413
+    assert response.get_json() == {'error': 'Input too large for any model (~99,999 tokens)'}
+    assert 'X-AI-Degraded' not in response.headers
+    assert fake.calls == []
+
+
+@pytest.mark.parametrize('path', ['/api/ai/analyze-text', '/api/ai/generate-flashcards', '/api/ai/generate-quiz'])
+def test_upstream_errors_still_serve_the_fallback(path, fake):
+    fake.error = RuntimeError('upstream exploded')
+    response = main.app.test_client().post(path, json={'text': TEXT, 'count': 2})
+    assert response.status_code == 200
+    assert response.headers['X-AI-Degraded'] == 'ai_error'
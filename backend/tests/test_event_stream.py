@@ -0,0 +1,123 @@
+"""
+Streamed flashcard and quiz tests
+Drives event_stream_response through the flashcard and quiz routes with the
+in-process fake OpenAI client
+"""
+
+import json
+
+import pytest
+
+import main
+from ai_client import ResilientChatClient
+from benchmarks.fake_openai import FakeOpenAIClient, fake_content
+
+TEXT = 'Photosynthesis turns light energy into chemical energy in the chloroplasts. ' * 5
+
+
+@pytest.fixture
+def fake(monkeypatch):
+    """Install a fake OpenAI client (1-character chunks) behind the resilient wrapper"""
+    fake = FakeOpenAIClient(chunk_size=1)
+    monkeypatch.setattr(main, 'client', ResilientChatClient(fake, max_retries=0))
+    main.ai_cache.clear()
+    yield fake
+    main.ai_cache.clear()
+
+
+@pytest.fixture
+def client():
+    return main.app.test_client()
+
+
+def events(response):
+    """[(event, data)] of an SSE response body"""
+    parsed = []
+    for block in response.get_data(as_text=True).split('\n\n'):
+        if not block.strip():
+            continue
+        fields = dict(line.split(': ', 1) for line in block.splitlines())
+        parsed.append((fields['event'], json.loads(fields['data'])))
+    return parsed
+
+
+def stream_flashcards(client, count=3, text=TEXT):
+    response = client.post('/api/ai/generate-flashcards?stream=1', json={'text': text, 'count': count})
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+    return events(response)
+
+
+def test_items_are_streamed_then_replayed_from_cache(fake, client):
+    expected = json.loads(fake_content('Create 3 flashcards'))['flashcards']
+    first = stream_flashcards(client)
+    assert first == [('flashcard', card) for card in expected] + [('done', {'count': 3, 'cached': False})]
+    assert fake.calls[0]['stream'] is True
+
+    second = stream_flashcards(client)
+    assert second[:-1] == first[:-1]
+    assert second[-1] == ('done', {'count': 3, 'cached': True})
+    assert len(fake.calls) == 1
+
+
+def test_quiz_streams_when_the_client_accepts_event_streams(fake, client):
+    response = client.post('/api/ai/generate-quiz', json={'text': TEXT, 'count': 2},
+                           headers={'Accept': 'text/event-stream'})
+    parsed = events(response)
+    assert [event for event, _ in parsed] == ['question', 'question', 'done']
+    assert parsed[0][1]['options'] == ['A', 'B', 'C', 'D']
+
+
+def test_truncated_output_keeps_the_complete_items_but_is_not_cached(fake, client):
+    document = fake_content('Create 3 flashcards')
+    fake.responder = document[:document.index('Question 3')]
+    stores = main.ai_cache.stats()['stores']
+    parsed = stream_flashcards(client)
+    assert [event for event, _ in parsed] == ['flashcard', 'flashcard', 'done']
+    assert parsed[-1][1] == {'count': 2, 'cached': False, 'truncated': True}
+    assert main.ai_cache.stats()['stores'] == stores
+
+    fake.responder = document
+    assert stream_flashcards(client)[-1] == ('done', {'count': 3, 'cached': False})
+    assert len(fake.calls) == 2
+
+
+def test_upstream_error_before_any_item_serves_the_fallback(fake, client):
+    fake.error = RuntimeError('upstream exploded')
+    parsed = stream_flashcards(client)
+    assert parsed[:-1] == [('flashcard', card) for card in main.FALLBACK_FLASHCARDS]
+    assert parsed[-1] == ('done', {'count': len(main.FALLBACK_FLASHCARDS), 'fallback': True})
+
+
+def test_output_without_items_serves_the_fallback(fake, client):
+    fake.responder = "Sorry, I can't help with that."
+    parsed = stream_flashcards(client)
+    assert parsed[-1][1]['fallback'] is True
+
+
+def test_failure_mid_stream_reports_the_interruption(fake, client, monkeypatch):
+    create = fake.chat.completions.create
+    cut = fake_content('Create 3 flashcards').index('Question 2')
+
+    def failing_create(**kwargs):
+        chunks = create(**kwargs)
+
+        def failing():
+            for index, chunk in enumerate(chunks):
+                if index == cut:
+                    raise ConnectionResetError('connection reset by peer')
+                yield chunk
+        return failing()
+
+    monkeypatch.setattr(fake.chat.completions, 'create', failing_create)
+    parsed = stream_flashcards(client)
+    assert [event for event, _ in parsed] == ['flashcard', 'error']
+    assert parsed[-1][1] == {'error': 'Generation interrupted', 'count': 1}
+    # A partial result is not cached
+    assert stream_flashcards(client)[-1][0] == 'error'
+
+
+def test_without_an_api_key_the_fallback_is_served(client, monkeypatch):
+    monkeypatch.setattr(main, 'client', None)
+    parsed = stream_flashcards(client, text='Unique text for the disabled client test.')
+    assert parsed[-1] == ('done', {'count': len(main.FALLBACK_FLASHCARDS), 'fallback': True})
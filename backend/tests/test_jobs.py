@@ -0,0 +1,110 @@
+"""
+Job store lease tests
+complete() and fail() only land for the worker that still holds the job's
+lease; a worker whose lease expired and was re-claimed changes nothing
+"""
+
+import uuid
+
+import pytest
+
+import auth_sqlite
+from jobs import COMPLETED, QUEUED, RUNNING, JobQueue, MemoryJobStore, SqliteJobStore
+
+
+@pytest.fixture(autouse=True)
+def database(tmp_path):
+    """A job table of our own, so other tests' jobs are never claimed here"""
+    previous = auth_sqlite.DATABASE_PATH
+    auth_sqlite.set_database_path(str(tmp_path / 'jobs.db'))
+    try:
+        yield
+    finally:
+        auth_sqlite.close_thread_connection()
+        auth_sqlite.set_database_path(previous)
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def store(request):
+    if request.param == 'memory':
+        return MemoryJobStore()
+    return SqliteJobStore(auth_sqlite.db_connection)
+
+
+@pytest.fixture
+def user_id():
+    user = auth_sqlite.create_user(f'jobs-{uuid.uuid4().hex[:12]}@example.com', 'secret1', 'Ada', 'L', 'high')
+    return user['id']
+
+
+def reclaimed(store, user_id):
+    """A job whose first attempt was handed back and claimed again"""
+    job = store.enqueue('analysis', user_id, {'text': 'x'}, max_attempts=3)
+    first = store.claim(lease_seconds=60)
+    assert first['id'] == job['id'] and first['attempts'] == 1
+    assert store.fail(job['id'], 1, 'worker stalled', retry_in=0)
+    second = store.claim(lease_seconds=60)
+    assert second['id'] == job['id'] and second['attempts'] == 2
+    return first, second
+
+
+def test_a_stale_attempt_cannot_complete_or_fail_the_job(store, user_id):
+    first, second = reclaimed(store, user_id)
+
+    assert not store.complete(first['id'], 1, {'stale': True})
+    assert not store.fail(first['id'], 1, 'stale error')
+    assert not store.fail(first['id'], 1, 'stale error', retry_in=0)
+    job = store.get(first['id'])
+    assert job['status'] == RUNNING and job['result'] is None and job['error'] == 'worker stalled'
+
+    assert store.complete(second['id'], 2, {'fresh': True})
+    assert store.get(second['id'])['result'] == {'fresh': True}
+    # Finished jobs can't be finished again
+    assert not store.complete(second['id'], 2, {'again': True})
+    assert not store.fail(second['id'], 2, 'late error')
+
+
+def test_an_expired_lease_is_reclaimed_and_the_old_worker_is_ignored(user_id):
+    store = SqliteJobStore(auth_sqlite.db_connection)
+    queue = JobQueue(store, workers=0)
+    job = store.enqueue('analysis', user_id, {'text': 'x'}, max_attempts=3)
+
+    def handler(claimed):
+        # The lease runs out while this attempt is still working
+        with auth_sqlite.db_connection() as conn:
+            conn.execute("UPDATE analysis_jobs SET locked_until = '2000-01-01 00:00:00.000' WHERE id = ?",
+                         (claimed['id'],))
+            conn.commit()
+        other = store.claim(lease_seconds=60)
+        assert other['id'] == claimed['id'] and other['attempts'] == 2
+        return {'from': 'first worker'}
+
+    queue.register('analysis', handler)
+    queue.process(store.claim(lease_seconds=60))
+    stats = queue.stats()
+    assert stats['lease_lost'] == 1 and stats['completed'] == 0
+    assert store.get(job['id'])['status'] == RUNNING
+
+    def failing(claimed):
+        raise RuntimeError('model error')
+
+    queue.register('analysis', failing)
+    stale = dict(store.get(job['id']), attempts=1)
+    queue.process(stale)
+    assert queue.stats()['lease_lost'] == 2 and queue.stats()['retried'] == 0
+    assert store.get(job['id'])['status'] == RUNNING
+
+
+def test_the_lease_holder_records_its_outcome(store, user_id):
+    queue = JobQueue(store, workers=0)
+    queue.register('analysis', lambda job: {'ok': True})
+    job = store.enqueue('analysis', user_id, {'text': 'x'}, max_attempts=3)
+    queue.process(store.claim(lease_seconds=60))
+    assert store.get(job['id'])['status'] == COMPLETED
+    assert queue.stats()['completed'] == 1 and queue.stats()['lease_lost'] == 0
+
+    queue.register('analysis', lambda job: 1 / 0)
+    job = store.enqueue('analysis', user_id, {'text': 'y'}, max_attempts=3)
+    queue.process(store.claim(lease_seconds=60))
+    assert store.get(job['id'])['status'] == QUEUED
+    assert queue.stats()['retried'] == 1
@@ -0,0 +1,314 @@
+"""
+Map-reduce analysis tests
+Chunk boundaries, the merge/dedup reduce steps and partial failures, with
+the model replaced by the in-process fake OpenAI client
+"""
+
+import re
+import json
+import threading
+import time
+from contextvars import ContextVar
+
+import pytest
+
+import main
+from ai_client import ResilientChatClient
+from ai_concurrency import AIBusyError
+from benchmarks.fake_openai import FakeOpenAIClient
+from map_reduce import (
+    CHARS_PER_TOKEN, chunk_text, estimate_tokens, map_chunks, merge_ranked, merge_syllabus_analyses,
+    merge_text_analyses, most_common
+)
+from model_router import PromptTooLargeError
+from token_budget import TokenBudgetExceeded
+
+
+def paragraphs(count, sentences=6):
+    return '\n\n'.join(
+        ' '.join(f'Section {p} sentence {s} talks about topic {p}.' for s in range(sentences))
+        for p in range(count)
+    )
+
+
+# Chunking
+def test_short_text_is_one_chunk():
+    assert chunk_text('One short paragraph.', chunk_tokens=100, overlap_tokens=10) == ['One short paragraph.']
+    assert chunk_text('', chunk_tokens=100, overlap_tokens=10) == []
+
+
+@pytest.mark.parametrize('chunk_tokens, overlap_tokens', [(50, 0), (50, 10), (120, 30), (400, 50)])
+def test_chunks_respect_the_budget_and_cover_every_sentence(chunk_tokens, overlap_tokens):
+    text = paragraphs(20)
+    chunks = chunk_text(text, chunk_tokens=chunk_tokens, overlap_tokens=overlap_tokens)
+    assert len(chunks) > 1
+    assert all(len(chunk) <= chunk_tokens * CHARS_PER_TOKEN for chunk in chunks)
+    joined = '\n'.join(chunks)
+    for p in range(20):
+        for s in range(6):
+            assert f'Section {p} sentence {s} ' in joined
+
+
+def test_consecutive_chunks_overlap():
+    chunks = chunk_text(paragraphs(20), chunk_tokens=120, overlap_tokens=30)
+    for previous, current in zip(chunks, chunks[1:]):
+        head = current.split('\n\n', 1)[0]
+        assert head and previous.endswith(head)
+        assert len(head) <= 30 * CHARS_PER_TOKEN
+
+
+def test_no_overlap_does_not_repeat_text():
+    text = paragraphs(20)
+    chunks = chunk_text(text, chunk_tokens=120, overlap_tokens=0)
+    assert '\n\n'.join(chunks).replace('\n\n', ' ').split() == text.replace('\n\n', ' ').split()
+
+
+def test_paragraph_boundaries_are_preferred():
+    chunks = chunk_text(paragraphs(6, sentences=3), chunk_tokens=80, overlap_tokens=0)
+    for chunk in chunks:
+        assert chunk.startswith('Section ')
+        assert chunk.endswith('.')
+
+
+def test_text_without_breaks_is_hard_sliced():
+    word = 'x' * 1000
+    chunks = chunk_text(word, chunk_tokens=50, overlap_tokens=0)
+    assert all(len(chunk) <= 200 for chunk in chunks)
+    assert ''.join(chunks) == word
+
+
+def test_overlap_must_be_smaller_than_the_chunk():
+    with pytest.raises(ValueError):
+        chunk_text('text', chunk_tokens=10, overlap_tokens=10)
+
+
+def test_estimate_tokens():
+    assert estimate_tokens('') == 0
+    assert estimate_tokens('abc') == 1
+    assert estimate_tokens('a' * 400) == 100
+
+
+# Map step
+def test_results_keep_chunk_order_and_parallelism_is_bounded():
+    running, peak, lock = [0], [0], threading.Lock()
+
+    def analyze(chunk, index, total):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.01 * (total - index))
+        with lock:
+            running[0] -= 1
+        return (chunk, index, total)
+
+    results = map_chunks(list('abcdef'), analyze, max_parallel=2)
+    assert results == [(c, i, 6) for i, c in enumerate('abcdef')]
+    assert peak[0] == 2
+
+
+def test_chunks_see_the_callers_context():
+    caller = ContextVar('caller', default=None)
+    caller.set('user:1')
+    assert map_chunks(['a', 'b'], lambda chunk, index, total: caller.get()) == ['user:1', 'user:1']
+
+
+def test_failed_chunks_are_skipped():
+    def analyze(chunk, index, total):
+        if index == 1:
+            raise RuntimeError('chunk failed')
+        return chunk
+
+    assert map_chunks(['a', 'b', 'c'], analyze) == ['a', 'c']
+
+
+def test_all_chunks_failing_raises_the_first_error():
+    def analyze(chunk, index, total):
+        raise ValueError(f'chunk {index} failed')
+
+    with pytest.raises(ValueError, match='chunk 0 failed'):
+        map_chunks(['a', 'b', 'c'], analyze, max_parallel=1)
+
+
+# Reduce step
+def test_merge_ranked_dedups_and_ranks_by_chunk_count():
+    merged = merge_ranked([
+        ['Cells', 'Genetics', 'cells'],
+        ['  genetics ', 'Evolution'],
+        ['GENETICS', 'Ecology', 'Cells'],
+        'Evolution',
+        None,
+        [42, '', 'Plants'],
+    ], limit=10)
+    assert merged == ['Genetics', 'Cells', 'Evolution', 'Ecology', 'Plants']
+    assert merge_ranked([['a', 'b', 'c']], limit=2) == ['a', 'b']
+
+
+def test_most_common():
+    assert most_common(['High School', None, 'Middle School', 'High School', '']) == 'High School'
+    assert most_common([None, ''], default='Unknown') == 'Unknown'
+    assert most_common([3, '3', 4]) == 3
+
+
+def test_merge_syllabus_analyses():
+    merged = merge_syllabus_analyses([
+        {'subject': 'Biology', 'level': 'High School', 'topics': ['Cells', 'DNA'], 'learning_objectives': ['Explain cells']},
+        {'subject': 'Biology', 'level': None, 'duration': '1 semester', 'topics': ['dna', 'Evolution']},
+        {'subject': 'Chemistry', 'topics': 'Bonds'},
+    ])
+    assert merged == {
+        'subject': 'Biology',
+        'level': 'High School',
+        'duration': '1 semester',
+        'topics': ['DNA', 'Cells', 'Evolution', 'Bonds'],
+        'learning_objectives': ['Explain cells'],
+        'chunks_analyzed': 3,
+    }
+
+
+def test_merge_text_analyses():
+    text = 'word ' * 1000
+    merged = merge_text_analyses([
+        {'reading_level': 'Middle School', 'complexity_score': 4, 'key_topics': ['Energy'], 'recommendations': ['Review']},
+        {'reading_level': 'Middle School', 'complexity_score': '7', 'key_topics': ['energy', 'Heat']},
+        {'reading_level': 'High School', 'complexity_score': 'hard'},
+    ], text)
+    assert merged['reading_level'] == 'Middle School'
+    assert merged['complexity_score'] == 6
+    assert merged['key_topics'] == ['Energy', 'Heat']
+    assert merged['recommendations'] == ['Review']
+    assert merged['estimated_reading_time'] == 5
+    assert merged['chunks_analyzed'] == 3
+
+
+# End to end through the routes
+def section_topics(prompt):
+    """The 'Topic N' of every section quoted in the prompt"""
+    return sorted({f'Topic {n}' for n in re.findall(r'about topic (\d+)\.', prompt)}, key=lambda t: int(t[6:]))
+
+
+@pytest.fixture
+def fake(monkeypatch):
+    fake = FakeOpenAIClient()
+    monkeypatch.setattr(main, 'client', ResilientChatClient(fake, max_retries=0))
+    main.ai_cache.clear()
+    yield fake
+    main.ai_cache.clear()
+
+
+def test_long_text_is_analyzed_per_chunk_and_merged(fake, monkeypatch):
+    monkeypatch.setattr(main, 'chunk_text', lambda text: chunk_text(text, chunk_tokens=200, overlap_tokens=20))
+    monkeypatch.setattr(main, 'CHUNK_TOKENS', 200)
+    fake.responder = lambda prompt: json.dumps({
+        'reading_level': 'Middle School', 'complexity_score': 5,
+        'key_topics': section_topics(prompt), 'recommendations': ['Review key terms'],
+    })
+    text = paragraphs(12)
+    chunks = chunk_text(text, chunk_tokens=200, overlap_tokens=20)
+
+    response = main.app.test_client().post('/api/ai/analyze-text', json={'text': text})
+    analysis = response.get_json()
+    assert response.status_code == 200
+    assert len(fake.calls) == len(chunks) > 1
+    assert analysis['chunks_analyzed'] == len(chunks)
+    assert sorted(analysis['key_topics']) == sorted(f'Topic {p}' for p in range(12))
+    assert analysis['recommendations'] == ['Review key terms']
+    assert 'degraded' not in analysis
+
+
+def test_a_failed_chunk_is_left_out_of_the_merge(fake, monkeypatch):
+    monkeypatch.setattr(main, 'chunk_text', lambda text: chunk_text(text, chunk_tokens=200, overlap_tokens=0))
+    monkeypatch.setattr(main, 'CHUNK_TOKENS', 200)
+
+    def respond(prompt):
+        if 'Section 5 ' in prompt:
+            raise RuntimeError('model error')
+        return json.dumps({'subject': 'Biology', 'level': 'High School', 'topics': section_topics(prompt)})
+
+    fake.responder = respond
+    text = paragraphs(12)
+    chunks = chunk_text(text, chunk_tokens=200, overlap_tokens=0)
+    failing = sum('Section 5 ' in chunk for chunk in chunks)
+    assert 0 < failing < len(chunks)
+
+    analysis = main.run_syllabus_analysis('bio.txt', text)
+    assert analysis['chunks_analyzed'] == len(chunks) - failing
+    assert 'Topic 5' not in analysis['topics']
+    assert 'Topic 0' in analysis['topics'] and 'Topic 11' in analysis['topics']
+
+
+def test_every_chunk_failing_raises_so_the_job_retries(fake, monkeypatch):
+    monkeypatch.setattr(main, 'chunk_text', lambda text: chunk_text(text, chunk_tokens=200, overlap_tokens=0))
+    monkeypatch.setattr(main, 'CHUNK_TOKENS', 200)
+    fake.error = RuntimeError('model error')
+    with pytest.raises(RuntimeError, match='model error'):
+        main.run_syllabus_analysis('bio.txt', paragraphs(12))
+
+
+def test_propagated_errors_are_raised_even_when_other_chunks_succeed():
+    def analyze(chunk, index, total):
+        if index == 2:
+            raise KeyError('fatal')
+        if index == 1:
+            raise RuntimeError('skipped')
+        return chunk
+
+    with pytest.raises(KeyError):
+        map_chunks(list('abcdef'), analyze, max_parallel=1, propagate=(KeyError,))
+
+
+@pytest.mark.parametrize('error, status', [
+    (TokenBudgetExceeded('Daily AI budget used up', retry_after=60), 429),
+    (AIBusyError('AI queue full', retry_after=2), 503),
+    (PromptTooLargeError('Input too large for any model'), 413),
+])
+def test_budget_queue_and_size_errors_in_a_chunk_answer_the_request(error, status, fake, monkeypatch):
+    monkeypatch.setattr(main, 'chunk_text', lambda text: chunk_text(text, chunk_tokens=200, overlap_tokens=0))
+    monkeypatch.setattr(main, 'CHUNK_TOKENS', 200)
+    analyze = main.request_text_analysis
+
+    def request_text_analysis(text, age_group):
+        if 'Section 5 ' in text:
+            raise error
+        return analyze(text, age_group)
+
+    monkeypatch.setattr(main, 'request_text_analysis', request_text_analysis)
+    response = main.app.test_client().post('/api/ai/analyze-text', json={'text': paragraphs(12)})
+    assert response.status_code == status
+
+
+def test_partial_text_analysis_is_marked_degraded(fake, monkeypatch):
+    monkeypatch.setattr(main, 'chunk_text', lambda text: chunk_text(text, chunk_tokens=200, overlap_tokens=0))
+    monkeypatch.setattr(main, 'CHUNK_TOKENS', 200)
+
+    def respond(prompt):
+        if 'Section 5 ' in prompt:
+            raise RuntimeError('model error')
+        return json.dumps({'reading_level': 'Middle School', 'complexity_score': 5,
+                           'key_topics': section_topics(prompt)})
+
+    fake.responder = respond
+    response = main.app.test_client().post('/api/ai/analyze-text', json={'text': paragraphs(12)})
+    assert response.status_code == 200
+    assert response.headers['X-AI-Degraded'] == 'partial'
+    assert response.get_json()['degraded'] is True
+
+
+def test_partial_syllabus_job_is_not_stored_under_the_content_hash(fake, monkeypatch):
+    monkeypatch.setattr(main, 'chunk_text', lambda text: chunk_text(text, chunk_tokens=200, overlap_tokens=0))
+    monkeypatch.setattr(main, 'CHUNK_TOKENS', 200)
+    saved = []
+    monkeypatch.setattr(main, 'save_syllabus_upload',
+                        lambda user_id, filename, text, data, content_hash: saved.append(content_hash) or {'id': 1})
+
+    def respond(prompt):
+        if 'Section 5 ' in prompt:
+            raise RuntimeError('model error')
+        return json.dumps({'subject': 'Biology', 'topics': section_topics(prompt)})
+
+    job = {'user_id': 1, 'attempts': 0, 'max_attempts': 3,
+           'payload': {'filename': 'bio.txt', 'text': paragraphs(12), 'content_hash': 'abc'}}
+    fake.responder = respond
+    assert main.process_syllabus_job(dict(job))['degraded'] is True
+    fake.responder = lambda prompt: json.dumps({'subject': 'Biology', 'topics': section_topics(prompt)})
+    assert main.process_syllabus_job(dict(job))['degraded'] is False
+    assert saved == [None, 'abc']
@@ -0,0 +1,57 @@
+"""
+Metrics and stats endpoint tests
+The exposition labels every series with its worker, and the operator
+endpoints are only served with the admin token
+"""
+
+import os
+
+import pytest
+
+import main
+from metrics import Counter, Histogram, MetricsRegistry
+
+OPERATOR_ENDPOINTS = [
+    '/api/metrics',
+    '/api/auth/hashing-stats',
+    '/api/auth/rate-limit-stats',
+    '/api/auth/progress/buffer-stats',
+    '/api/ai/cache-stats',
+    '/api/ai/usage-stats',
+    '/api/ai/prompt-stats',
+    '/api/ai/client-stats',
+    '/api/ai/concurrency-stats',
+    '/api/jobs/stats',
+]
+
+
+def test_every_series_carries_the_worker_label():
+    registry = MetricsRegistry(namespace='test')
+    counter = registry.register(Counter('logins_total', 'Logins', ('outcome',)))
+    histogram = registry.register(Histogram('latency_seconds', 'Latency', (0.1, 1)))
+    counter.inc(outcome='ok')
+    histogram.observe(0.5)
+    worker = f'worker="{os.getpid()}"'
+    samples = [line for line in registry.exposition().splitlines() if not line.startswith('#')]
+    assert len(samples) == 6
+    assert all(worker in line for line in samples)
+    assert f'test_logins_total{{{worker},outcome="ok"}} 1' in samples
+    assert f'test_latency_seconds_bucket{{{worker},le="1"}} 1' in samples
+
+
+def test_worker_label_can_be_turned_off():
+    registry = MetricsRegistry(namespace='test', worker_label=None)
+    registry.register(Counter('jobs_total', 'Jobs')).inc()
+    assert 'test_jobs_total 1' in registry.exposition().splitlines()
+
+
+@pytest.mark.parametrize('path', OPERATOR_ENDPOINTS)
+def test_operator_endpoints_need_the_admin_token(path, monkeypatch):
+    client = main.app.test_client()
+    monkeypatch.delenv('ADMIN_TOKEN', raising=False)
+    assert client.get(path).status_code == 404
+
+    monkeypatch.setenv('ADMIN_TOKEN', 'secret')
+    assert client.get(path).status_code == 401
+    assert client.get(path, headers={'X-Admin-Token': 'wrong'}).status_code == 401
+    assert client.get(path, headers={'X-Admin-Token': 'secret'}).status_code == 200
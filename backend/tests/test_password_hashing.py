@@ -0,0 +1,47 @@
+"""
+Password hashing pool tests
+Hashing on the process pool, and recovery when a pool process dies
+"""
+
+import os
+import signal
+
+import pytest
+
+from password_hashing import PasswordHasher, PasswordHashingBusyError, hash_rounds
+
+
+@pytest.fixture
+def hasher():
+    hasher = PasswordHasher(rounds=4, workers=1)
+    yield hasher
+    hasher.close()
+
+
+def test_pool_hashes_and_verifies(hasher):
+    password_hash = hasher.hash('correct horse')
+    assert hash_rounds(password_hash) == 4
+    assert hasher.verify('correct horse', password_hash)
+    assert not hasher.verify('wrong horse', password_hash)
+    assert hasher._executor._mp_context.get_start_method() in ('forkserver', 'spawn')
+
+
+def test_broken_pool_is_shut_down_and_replaced(hasher):
+    hasher.hash('warm up')
+    broken = hasher._executor
+    for pid in list(broken._processes):
+        os.kill(pid, signal.SIGKILL)
+
+    password_hash = hasher.hash('still works')
+    assert hasher._executor is not broken
+    assert broken._shutdown_thread
+    assert hasher.verify('still works', password_hash)
+
+
+def test_inline_hashing_and_busy_rejection():
+    hasher = PasswordHasher(rounds=4, workers=0, max_queue=0, queue_timeout=0.01)
+    assert hasher.verify('pw', hasher.hash('pw'))
+    hasher._admission.acquire()
+    with pytest.raises(PasswordHashingBusyError):
+        hasher.hash('pw')
+    assert hasher.stats()['rejected'] == 1
@@ -0,0 +1,150 @@
+"""
+Progress write buffer tests
+An unreachable database requeues events with backoff, a bad event is
+dead-lettered without holding back its batch and can be replayed, and
+buffered events keep the time they were accepted
+"""
+
+import time
+import sqlite3
+from datetime import datetime
+
+import pytest
+
+import main
+from progress_buffer import ProgressWriteBuffer
+
+
+class Store:
+    """flush_fn that records written events and rejects the 'bad' ones"""
+
+    def __init__(self):
+        self.error = None
+        self.fail_after = None
+        self.reject_bad = True
+        self.calls = []
+        self.written = []
+
+    def __call__(self, events):
+        self.calls.append(len(events))
+        if self.error is not None:
+            raise self.error
+        if self.fail_after is not None and len(self.calls) > self.fail_after:
+            raise ConnectionError('database went away')
+        if self.reject_bad and any(event.get('bad') for event in events):
+            raise ValueError('invalid event')
+        self.written.extend(events)
+        return len(events)
+
+
+def events(count, bad=()):
+    return [{'n': n, 'bad': n in bad} for n in range(count)]
+
+
+def test_batches_are_written_in_bulk():
+    store = Store()
+    buffer = ProgressWriteBuffer(store, max_events=4)
+    buffer._events.extend(events(10))
+    assert buffer.flush() == 10
+    assert store.calls == [4, 4, 2]
+    assert buffer.stats()['flush_errors'] == 0
+
+
+def test_a_bad_event_does_not_hold_back_the_batch():
+    store = Store()
+    buffer = ProgressWriteBuffer(store, max_events=4)
+    buffer._events.extend(events(8, bad={2}))
+    assert buffer.flush() == 7
+    assert [event['n'] for event in store.written] == [0, 1, 3, 4, 5, 6, 7]
+    assert store.calls == [4, 1, 1, 1, 1, 4]
+    assert [(event['n'], error) for event, error in buffer.dead_letters()] == [(2, 'invalid event')]
+
+    stats = buffer.stats()
+    assert stats['flush_errors'] == 1 and stats['dead_lettered'] == 1 and stats['pending'] == 0
+    # Nothing is left to retry
+    assert buffer.flush() == 0
+
+
+@pytest.mark.parametrize('error', [ConnectionError('database unavailable'),
+                                   sqlite3.OperationalError('database is locked')])
+def test_an_unreachable_database_requeues_with_backoff(error):
+    store = Store()
+    buffer = ProgressWriteBuffer(store, max_events=10, max_delay=1, retry_max_delay=4)
+    buffer._events.extend(events(5))
+    store.error = error
+    assert buffer.flush() == 0
+    # One attempt for the batch, no per-event retries against a dead database
+    assert store.calls == [5]
+    stats = buffer.stats()
+    assert stats['pending'] == 5 and stats['requeued'] == 5 and stats['dead_lettered'] == 0
+
+    delays = []
+    for _ in range(4):
+        buffer.flush()
+        delays.append(buffer._retry_at - time.monotonic())
+    assert [round(delay) for delay in delays] == [2, 4, 4, 4]
+
+    store.error = None
+    buffer.add([{'n': 5, 'bad': False}])
+    assert buffer.flush() == 6
+    assert [event['n'] for event in store.written] == [0, 1, 2, 3, 4, 5]
+    assert buffer._retry_at == 0.0
+
+
+def test_an_outage_during_per_event_retries_requeues_the_rest():
+    store = Store()
+    buffer = ProgressWriteBuffer(store, max_events=10)
+    buffer._events.extend(events(5, bad={0}))
+    store.fail_after = 3
+    assert buffer.flush() == 1
+    assert buffer.dead_letters() == []
+    assert [event['n'] for event in buffer._events] == [0, 2, 3, 4]
+
+
+def test_a_batch_of_only_bad_events_is_retried_not_dead_lettered():
+    buffer = ProgressWriteBuffer(Store(), max_events=10)
+    buffer._events.extend(events(2, bad={0, 1}))
+    assert buffer.flush() == 0
+    assert buffer.dead_letters() == []
+    assert buffer.stats()['pending'] == 2
+
+
+def test_dead_letters_can_be_replayed(monkeypatch):
+    store = Store()
+    buffer = ProgressWriteBuffer(store, max_events=10, max_delay=60)
+    buffer._events.extend(events(3, bad={1}))
+    buffer.flush()
+    monkeypatch.setenv('ADMIN_TOKEN', 'secret')
+    monkeypatch.setattr(main, 'progress_buffer', buffer)
+    client = main.app.test_client()
+    headers = {'X-Admin-Token': 'secret'}
+
+    listed = client.get('/api/admin/progress/dead-letters', headers=headers).get_json()
+    assert listed['events'] == [{'event': {'n': 1, 'bad': True}, 'error': 'invalid event'}]
+
+    store.reject_bad = False
+    assert client.post('/api/admin/progress/dead-letters/replay', headers=headers).get_json()['replayed'] == 1
+    assert buffer.flush() == 1
+    assert buffer.dead_letters() == []
+    assert [event['n'] for event in store.written] == [0, 2, 1]
+
+
+def test_buffered_events_are_stamped_when_accepted(monkeypatch):
+    store = Store()
+    monkeypatch.setattr(main, 'progress_buffer', ProgressWriteBuffer(store, max_delay=60))
+    client = main.app.test_client()
+    token = client.post('/api/auth/register', json={
+        'email': 'buffer@example.com', 'password': 'secret1', 'first_name': 'Ada', 'last_name': 'L'
+    }).get_json()['token']
+
+    before = datetime.utcnow()
+    response = client.post('/api/auth/progress', headers={'Authorization': f'Bearer {token}'}, json={'events': [
+        {'activity_type': 'quiz', 'score': 80},
+        {'activity_type': 'quiz', 'completed_at': '2024-01-14T14:20:00Z'},
+    ]})
+    assert response.status_code == 202
+    main.progress_buffer.flush()
+
+    stamped, given = store.written
+    assert before <= stamped['completed_at'] <= datetime.utcnow()
+    assert given['completed_at'] == datetime(2024, 1, 14, 14, 20)
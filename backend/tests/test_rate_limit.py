@@ -0,0 +1,83 @@
+"""
+Rate limiter tests
+Buckets idle long enough to have refilled are pruned so per-IP and
+per-email state doesn't grow forever
+"""
+
+import pytest
+
+from rate_limit import MemoryBucketStore, Policy, RateLimiter, RateLimitExceeded
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def limiter(clock, **kwargs):
+    store = MemoryBucketStore(clock=clock)
+    return RateLimiter([Policy('login_ip', 2, 60), Policy('login_email', 1, 300)], store=store, **kwargs)
+
+
+def test_buckets_idle_for_a_full_period_are_pruned():
+    clock = Clock()
+    rate_limiter = limiter(clock, prune_every=0)
+    rate_limiter.hit('login_ip', '10.0.0.1')
+    rate_limiter.hit('login_email', 'ada@example.com')
+    clock.now = 30
+    rate_limiter.hit('login_ip', '10.0.0.2')
+
+    clock.now = 60
+    # 10.0.0.1 is full again; 10.0.0.2 and the email are still refilling
+    assert rate_limiter.prune() == 1
+    assert sorted(rate_limiter.store._buckets) == ['login_email:ada@example.com', 'login_ip:10.0.0.2']
+
+    clock.now = 300
+    assert rate_limiter.prune() == 2
+    assert len(rate_limiter.store) == 0
+    assert rate_limiter.stats()['pruned'] == 3
+
+
+def test_only_buckets_that_would_be_full_are_pruned():
+    clock = Clock()
+    rate_limiter = limiter(clock, prune_every=0)
+    policy = rate_limiter.policies['login_ip']
+    for step in range(200):
+        clock.now = step * 1.7
+        try:
+            rate_limiter.hit('login_ip', f'10.0.0.{step % 13}')
+        except RateLimitExceeded:
+            pass
+    clock.now += 45
+    before = dict(rate_limiter.store._buckets)
+    rate_limiter.prune()
+    pruned = set(before) - set(rate_limiter.store._buckets)
+
+    assert pruned and len(pruned) < len(before)
+    for key in pruned:
+        tokens, updated_at = before[key]
+        assert tokens + (clock.now - updated_at) * policy.rate >= policy.capacity
+
+
+def test_hits_prune_a_bounded_batch_every_n_requests():
+    clock = Clock()
+    rate_limiter = limiter(clock, prune_every=5, prune_limit=2)
+    for n in range(4):
+        rate_limiter.hit('login_ip', f'10.0.0.{n}')
+    clock.now = 61
+    rate_limiter.hit('login_ip', '10.0.1.0')
+    assert rate_limiter.stats()['pruned'] == 2
+    assert len(rate_limiter.store) == 3
+
+
+def test_prune_errors_are_counted_not_raised():
+    class BrokenStore(MemoryBucketStore):
+        def prune(self, prefix, idle_for, limit):
+            raise RuntimeError('database unavailable')
+
+    rate_limiter = RateLimiter([Policy('login_ip', 2, 60)], store=BrokenStore(), prune_every=1)
+    rate_limiter.hit('login_ip', '10.0.0.1')
+    assert rate_limiter.stats()['store_errors'] == 1
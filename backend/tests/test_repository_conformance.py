@@ -0,0 +1,260 @@
+"""
+Storage backend conformance tests
+Runs the same checks against every module in auth.BACKENDS: each function
+in REPOSITORY_FUNCTIONS returns plain dicts (or lists of dicts) with parsed
+datetimes and JSON, and None for "not found". PostgreSQL is skipped unless
+DATABASE_URL is set.
+"""
+
+import os
+import uuid
+from datetime import date, datetime, timedelta
+
+import pytest
+
+import auth
+
+PASSWORD = 'conformance-password-1'
+
+# Functions exercised below; test_every_function_is_covered keeps this in
+# step with the interface
+COVERED = {
+    'init_db', 'create_user', 'authenticate_user', 'get_user_profile', 'update_user_profile',
+    'deactivate_user', 'save_user_progress', 'save_progress_events', 'get_user_progress',
+    'get_progress_version', 'save_syllabus_upload', 'save_report_card', 'find_stored_analysis',
+    'list_stored_analyses', 'reserve_token_usage', 'add_token_usage', 'get_token_usage', 'ping',
+}
+
+
+@pytest.fixture(params=sorted(auth.BACKENDS))
+def repo(request, tmp_path):
+    """A backend module with its schema applied"""
+    if request.param == 'postgres':
+        if not os.environ.get('DATABASE_URL'):
+            pytest.skip('DATABASE_URL not set')
+        pytest.importorskip('psycopg2')
+        module = auth.load_repository('postgres')
+        module.init_db()
+        yield module
+        return
+
+    module = auth.load_repository('sqlite')
+    previous = module.DATABASE_PATH
+    module.set_database_path(str(tmp_path / 'conformance.db'))
+    module.init_db()
+    try:
+        yield module
+    finally:
+        module.close_thread_connection()
+        module.set_database_path(previous)
+
+
+@pytest.fixture
+def user(repo):
+    email = f'conformance-{uuid.uuid4().hex[:12]}@example.com'
+    created = repo.create_user(email, PASSWORD, 'Ada', 'Lovelace', 'high')
+    assert created is not None
+    return dict(created, email=email)
+
+
+def unique(prefix):
+    return f'{prefix}-{uuid.uuid4().hex[:12]}'
+
+
+def test_every_function_is_covered():
+    assert COVERED == set(auth.REPOSITORY_FUNCTIONS)
+
+
+def test_init_db_is_idempotent(repo):
+    repo.init_db()
+    repo.ping()
+
+
+def test_create_user(repo):
+    email = f'{unique("new")}@example.com'
+    user = repo.create_user(email, PASSWORD, 'Ada', 'Lovelace', 'middle')
+    assert isinstance(user, dict)
+    assert user['email'] == email
+    assert user['age_group'] == 'middle'
+    assert isinstance(user['id'], int)
+    assert isinstance(user['created_at'], datetime)
+    assert 'password_hash' not in user
+    assert repo.create_user(email, PASSWORD, 'Other', 'Person', 'high') is None
+
+
+def test_authenticate_user(repo, user):
+    authenticated = repo.authenticate_user(user['email'], PASSWORD)
+    assert isinstance(authenticated, dict)
+    assert authenticated['id'] == user['id']
+    assert authenticated['is_active'] is True
+    assert 'password_hash' not in authenticated
+    assert repo.authenticate_user(user['email'], 'wrong-password') is None
+    assert repo.authenticate_user(f'{unique("missing")}@example.com', PASSWORD) is None
+
+
+def test_get_user_profile(repo, user):
+    repo.authenticate_user(user['email'], PASSWORD)
+    profile = repo.get_user_profile(user['id'])
+    assert isinstance(profile, dict)
+    assert profile['email'] == user['email']
+    assert profile['profile_data'] == {}
+    assert isinstance(profile['last_login'], datetime)
+    assert 'password_hash' not in profile
+    assert repo.get_user_profile(2 ** 31 - 1) is None
+
+
+def test_update_user_profile(repo, user):
+    profile = repo.update_user_profile(user['id'], first_name='Grace', profile_data={'theme': 'dark'},
+                                       email='ignored@example.com')
+    assert profile['first_name'] == 'Grace'
+    assert profile['profile_data'] == {'theme': 'dark'}
+    assert profile['email'] == user['email']
+    assert repo.update_user_profile(user['id'])['first_name'] == 'Grace'
+
+
+def test_deactivate_user(repo, user):
+    assert repo.deactivate_user(user['id']) is True
+    assert repo.get_user_profile(user['id']) is None
+    assert repo.authenticate_user(user['email'], PASSWORD) is None
+    assert repo.deactivate_user(2 ** 31 - 1) is False
+
+
+def test_progress(repo, user):
+    saved = repo.save_user_progress(user['id'], 'Math', 'quiz', 'fractions', 80)
+    assert isinstance(saved, dict)
+    assert isinstance(saved['id'], int)
+    assert isinstance(saved['completed_at'], datetime)
+
+    completed_at = datetime(2024, 3, 1, 12, 30)
+    written = repo.save_progress_events([
+        {'user_id': user['id'], 'subject': 'Science', 'activity_type': 'flashcards', 'score': 60,
+         'completed_at': completed_at},
+        {'user_id': user['id'], 'subject': 'Math', 'activity_type': 'quiz', 'score': None},
+    ])
+    assert written == 2
+    assert repo.save_progress_events([]) == 0
+
+    progress = repo.get_user_progress(user['id'])
+    assert set(progress) == {'stats', 'recent_activities'}
+    stats = progress['stats']
+    assert stats['total_sessions'] == 3
+    assert stats['subjects_studied'] == 2
+    assert float(stats['average_score']) == pytest.approx(70)
+    assert isinstance(stats['last_activity'], datetime)
+    recent = progress['recent_activities']
+    assert isinstance(recent, list) and len(recent) == 3
+    assert all(isinstance(row, dict) and isinstance(row['completed_at'], datetime) for row in recent)
+    assert recent[-1]['completed_at'] == completed_at
+
+    version = repo.get_progress_version(user['id'])
+    assert version['total_sessions'] == 3
+    assert version['last_activity'] == stats['last_activity']
+
+
+def test_progress_version_follows_every_write(repo, user):
+    """The version row must agree with the aggregate the full response is built from"""
+    other = repo.create_user(f'{unique("other")}@example.com', PASSWORD, 'Alan', 'Turing', 'high')
+    newest = datetime.utcnow().replace(microsecond=0) - timedelta(minutes=1)
+    repo.save_progress_events([
+        {'user_id': user['id'], 'subject': 'Math', 'activity_type': 'quiz', 'completed_at': newest},
+        {'user_id': other['id'], 'subject': 'Math', 'activity_type': 'quiz', 'completed_at': None},
+        {'user_id': user['id'], 'subject': 'Art', 'activity_type': 'quiz',
+         'completed_at': newest - timedelta(days=3)},
+    ])
+    version = repo.get_progress_version(user['id'])
+    assert version == {'total_sessions': 2, 'last_activity': newest}
+
+    # Backfilled history moves the session count but not the latest activity
+    repo.save_progress_events([{'user_id': user['id'], 'subject': 'Art', 'activity_type': 'quiz',
+                                'completed_at': newest - timedelta(days=30)}])
+    assert repo.get_progress_version(user['id']) == {'total_sessions': 3, 'last_activity': newest}
+
+    repo.save_user_progress(user['id'], 'Math', 'quiz')
+    for account in (user, other):
+        stats = repo.get_user_progress(account['id'])['stats']
+        version = repo.get_progress_version(account['id'])
+        assert version == {'total_sessions': stats['total_sessions'], 'last_activity': stats['last_activity']}
+
+
+def test_sqlite_version_rows_are_backfilled(tmp_path):
+    module = auth.load_repository('sqlite')
+    previous = module.DATABASE_PATH
+    module.set_database_path(str(tmp_path / 'backfill.db'))
+    try:
+        module.init_db()
+        user = module.create_user(f'{unique("backfill")}@example.com', PASSWORD, 'Ada', 'Lovelace', 'high')
+        module.save_progress_events([{'user_id': user['id'], 'subject': 'Math', 'activity_type': 'quiz'}] * 2)
+        with module.db_connection() as conn:
+            conn.execute('DELETE FROM user_progress_stats')
+            module.create_progress_version_table(conn.cursor())
+            conn.commit()
+        stats = module.get_user_progress(user['id'])['stats']
+        assert module.get_progress_version(user['id']) == {'total_sessions': 2,
+                                                           'last_activity': stats['last_activity']}
+    finally:
+        module.close_thread_connection()
+        module.set_database_path(previous)
+
+
+def test_progress_of_new_user_is_empty(repo, user):
+    progress = repo.get_user_progress(user['id'])
+    assert progress['stats']['total_sessions'] == 0
+    assert progress['stats']['last_activity'] is None
+    assert progress['recent_activities'] == []
+    assert repo.get_progress_version(user['id']) == {'total_sessions': 0, 'last_activity': None}
+
+
+def test_stored_analyses(repo, user):
+    content_hash = unique('hash')
+    analysis = {'subject': 'Biology', 'topics': ['Cells']}
+    saved = repo.save_syllabus_upload(user['id'], 'bio.txt', 'text', analysis, content_hash)
+    assert isinstance(saved['id'], int)
+    assert isinstance(saved['uploaded_at'], datetime)
+    report = repo.save_report_card(user['id'], 'card.pdf', {'subjects': [{'name': 'Math'}], 'recommendations': []},
+                                   content_hash)
+    assert isinstance(report['id'], int)
+
+    found = repo.find_stored_analysis('syllabus_uploads', content_hash, user['id'])
+    assert found['id'] == saved['id']
+    assert found['user_id'] == user['id']
+    assert found['analysis'] == analysis
+    assert isinstance(found['uploaded_at'], datetime)
+    assert repo.find_stored_analysis('syllabus_uploads', content_hash)['id'] == saved['id']
+    assert repo.find_stored_analysis('report_cards', content_hash, user['id'])['id'] == report['id']
+    assert repo.find_stored_analysis('syllabus_uploads', content_hash, 2 ** 31 - 1) is None
+    assert repo.find_stored_analysis('syllabus_uploads', unique('missing')) is None
+    # Uploads saved without a hash (e.g. fallback analyses) never match
+    repo.save_syllabus_upload(user['id'], 'none.txt', 'text', analysis, None)
+    assert repo.find_stored_analysis('syllabus_uploads', None, user['id']) is None
+    with pytest.raises(ValueError):
+        repo.find_stored_analysis('users', content_hash)
+
+
+def test_list_stored_analyses_pages_newest_first(repo, user):
+    ids = [repo.save_syllabus_upload(user['id'], f'{n}.txt', None, {'n': n})['id'] for n in range(5)]
+    page, has_more = repo.list_stored_analyses('syllabus_uploads', user['id'], limit=3)
+    assert has_more is True
+    assert [row['id'] for row in page] == ids[::-1][:3]
+    assert all(isinstance(row['analysis'], dict) and isinstance(row['uploaded_at'], datetime) for row in page)
+
+    last = page[-1]
+    page, has_more = repo.list_stored_analyses('syllabus_uploads', user['id'], limit=3,
+                                               before=(last['uploaded_at'], last['id']))
+    assert has_more is False
+    assert [row['id'] for row in page] == ids[::-1][3:]
+    assert repo.list_stored_analyses('report_cards', user['id']) == ([], False)
+    with pytest.raises(ValueError):
+        repo.list_stored_analyses('users', user['id'])
+
+
+def test_token_usage(repo):
+    subject, day = unique('user'), date(2024, 5, 1)
+    assert repo.get_token_usage(subject, day) == 0
+    assert repo.reserve_token_usage(subject, day, 600, 1000) == {'allowed': True, 'tokens': 600}
+    assert repo.reserve_token_usage(subject, day, 600, 1000) == {'allowed': False, 'tokens': 600}
+    assert repo.reserve_token_usage(subject, day, 2000, 1000) == {'allowed': False, 'tokens': 600}
+    assert repo.add_token_usage(subject, day, -100) == 500
+    assert repo.add_token_usage(subject, day, -1000) == 0
+    assert repo.add_token_usage(subject, day + timedelta(days=1), 50) == 50
+    assert repo.get_token_usage(subject, day) == 0
+    assert repo.get_token_usage(subject, day + timedelta(days=1)) == 50
@@ -0,0 +1,102 @@
+"""
+ArrayItemStreamParser tests
+Items must come out the same however the model's output is split into
+chunks, including splits inside keys, strings and escape sequences
+"""
+
+import json
+
+import pytest
+
+from stream_json import ArrayItemStreamParser
+
+CARDS = [
+    {'question': 'What is "energy"?', 'answer': 'The ability to do work', 'hint': 'Think {work}'},
+    {'question': 'Brackets ] and } in text', 'answer': 'a \\ backslash', 'hint': 'Unicode: café'},
+    {'question': 'Nested?', 'answer': {'parts': [1, {'deep': [2, 3]}], 'note': '[]{}'}, 'hint': None},
+]
+DOCUMENT = json.dumps({'flashcards': CARDS}, indent=2)
+
+
+def feed_all(parser, chunks):
+    items = []
+    for chunk in chunks:
+        items.extend(parser.feed(chunk))
+    return items
+
+
+def split(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def test_whole_document():
+    parser = ArrayItemStreamParser('flashcards')
+    assert parser.feed(DOCUMENT) == CARDS
+    assert parser.done
+    assert parser.items_parsed == 3
+
+
+@pytest.mark.parametrize('size', [1, 2, 3, 7, 16, 64])
+def test_any_chunking_gives_the_same_items(size):
+    parser = ArrayItemStreamParser('flashcards')
+    assert feed_all(parser, split(DOCUMENT, size)) == CARDS
+    assert parser.done
+
+
+def test_items_are_emitted_as_soon_as_they_close():
+    parser = ArrayItemStreamParser('flashcards')
+    first_end = DOCUMENT.index('}', DOCUMENT.index('{work}') + len('{work}')) + 1
+    assert parser.feed(DOCUMENT[:first_end - 1]) == []
+    assert parser.feed(DOCUMENT[first_end - 1:first_end]) == [CARDS[0]]
+    assert not parser.done
+
+
+def test_escaped_quotes_and_backslashes_split_mid_escape():
+    text = json.dumps({'questions': [{'q': 'say \\"hi\\" \\\\'}, {'q': 'end'}]})
+    escape = text.index('\\')
+    parser = ArrayItemStreamParser('questions')
+    items = feed_all(parser, [text[:escape + 1], text[escape + 1:]])
+    assert items == [{'q': 'say \\"hi\\" \\\\'}, {'q': 'end'}]
+
+
+def test_key_split_across_chunks():
+    parser = ArrayItemStreamParser('flashcards')
+    assert parser.feed('{"flash') == []
+    assert parser.feed('cards": [{"a": 1}') == [{'a': 1}]
+
+
+def test_other_arrays_before_the_key_are_ignored():
+    text = json.dumps({'topics': [{'x': 1}], 'questions': [{'q': 1}]})
+    assert ArrayItemStreamParser('questions').feed(text) == [{'q': 1}]
+
+
+def test_bare_array_and_code_fence():
+    assert ArrayItemStreamParser('flashcards').feed('[{"a": 1}, {"b": 2}]') == [{'a': 1}, {'b': 2}]
+    fenced = '```json\n[{"a": 1}]\n```'
+    assert feed_all(ArrayItemStreamParser('flashcards'), split(fenced, 3)) == [{'a': 1}]
+
+
+def test_truncated_array_returns_complete_items_only():
+    truncated = DOCUMENT[:DOCUMENT.index('Nested')]
+    parser = ArrayItemStreamParser('flashcards')
+    assert feed_all(parser, split(truncated, 5)) == CARDS[:2]
+    assert not parser.done
+
+
+def test_unparseable_item_is_skipped():
+    parser = ArrayItemStreamParser('flashcards')
+    assert parser.feed('{"flashcards": [{"a": 1}, {"b": tru}, {"c": 3}]}') == [{'a': 1}, {'c': 3}]
+    assert parser.items_skipped == 1
+
+
+def test_input_after_the_array_is_ignored():
+    parser = ArrayItemStreamParser('flashcards')
+    assert parser.feed('{"flashcards": [{"a": 1}], "more": [{"b": 2}]}') == [{'a': 1}]
+    assert parser.feed('[{"c": 3}]') == []
+
+
+def test_no_array_yet():
+    parser = ArrayItemStreamParser('flashcards')
+    assert parser.feed('Sure! Here are your cards: ') == []
+    assert parser.feed('') == []
+    assert not parser.done
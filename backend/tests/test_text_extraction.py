@@ -0,0 +1,55 @@
+"""
+Legacy .doc extraction tests
+Text runs must come out whole and exactly once however the file is split
+into reads
+"""
+
+import io
+import random
+
+import pytest
+
+import text_extraction
+from text_extraction import _DOC_TEXT_RUN, extract_text
+
+
+def binary_doc(seed=7):
+    """Binary noise and zero padding around ASCII and UTF-16 text runs of many lengths"""
+    rng = random.Random(seed)
+    parts, runs = [], []
+    for index in range(300):
+        words = ' '.join(f'run{index}word{w}' for w in range(rng.randint(1, 40)))
+        runs.append(words)
+        parts.append(words.encode('utf-16-le') if index % 2 else words.encode('latin-1'))
+        parts.append(bytes(rng.choice([0x01, 0x02, 0x7f, 0xff, 0x9c]) for _ in range(rng.randint(1, 5))))
+        if index % 7 == 0:
+            parts.append(b'\x00' * rng.randint(2, 600))
+    return b''.join(parts), runs
+
+
+def whole_file_runs(data):
+    """Text runs found by scanning the file in one piece"""
+    texts = []
+    for match in _DOC_TEXT_RUN.finditer(data):
+        run = match.group()
+        texts.append(run.decode('utf-16-le', errors='ignore') if b'\x00' in run else run.decode('latin-1'))
+    return texts
+
+
+@pytest.mark.parametrize('chunk_size', [7, 64, 257, 1000, 4096, 1 << 20])
+def test_runs_are_not_split_or_duplicated_across_reads(chunk_size, monkeypatch):
+    monkeypatch.setattr(text_extraction, 'READ_CHUNK_SIZE', chunk_size)
+    data, runs = binary_doc()
+    assert whole_file_runs(data) == runs
+
+    result = extract_text(io.BytesIO(data), 'notes.doc', max_chars=10 ** 7)
+    assert result['text'] == ' '.join(runs)
+    assert not result['truncated']
+
+
+def test_a_run_longer_than_the_budget_stops_the_scan(monkeypatch):
+    monkeypatch.setattr(text_extraction, 'READ_CHUNK_SIZE', 100)
+    data = b'\x01' + b'All work and no play. ' * 1000
+    result = extract_text(io.BytesIO(data), 'long.doc', max_chars=500)
+    assert result['truncated']
+    assert result['text'] == ('All work and no play. ' * 1000)[:500].strip()
@@ -0,0 +1,194 @@
+"""
+StudyVerse Text Extraction
+Streams text out of uploaded .txt, .docx, .pdf and legacy .doc files,
+stopping as soon as enough characters have been collected
+"""
+
+import os
+import re
+import codecs
+import hashlib
+import zipfile
+from xml.etree import ElementTree
+
+try:
+    from pypdf import PdfReader
+except ImportError:  # PDF support is optional
+    PdfReader = None
+
+READ_CHUNK_SIZE = 64 * 1024
+DEFAULT_MAX_CHARS = int(os.environ.get('SYLLABUS_MAX_CHARS', 100000))
+
+_WORD_NS = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+_WHITESPACE = re.compile(r'[ \t\r\f\v]+')
+_BLANK_LINES = re.compile(r'\n\s*\n+')
+
+
+class ExtractionError(Exception):
+    """Raised when an upload cannot be turned into text"""
+
+
+class _TextCollector:
+    """Accumulates text pieces up to a character budget"""
+
+    def __init__(self, max_chars):
+        self.max_chars = max_chars
+        self.parts = []
+        self.length = 0
+
+    @property
+    def full(self):
+        return self.length >= self.max_chars
+
+    def add(self, text):
+        if not text or self.full:
+            return
+        remaining = self.max_chars - self.length
+        piece = text[:remaining]
+        self.parts.append(piece)
+        self.length += len(piece)
+
+    def text(self):
+        text = _WHITESPACE.sub(' ', ''.join(self.parts))
+        return _BLANK_LINES.sub('\n\n', text).strip()
+
+
+def stream_size(stream):
+    """Size in bytes of a seekable stream without reading it"""
+    position = stream.tell()
+    stream.seek(0, os.SEEK_END)
+    size = stream.tell()
+    stream.seek(position)
+    return size
+
+
+def stream_sha256(stream):
+    """SHA-256 hex digest of a seekable stream, read in chunks and rewound"""
+    digest = hashlib.sha256()
+    stream.seek(0)
+    for chunk in iter(lambda: stream.read(READ_CHUNK_SIZE), b''):
+        digest.update(chunk)
+    stream.seek(0)
+    return digest.hexdigest()
+
+
+def extract_txt(stream, max_chars):
+    """Incrementally decode a plain-text upload"""
+    collector = _TextCollector(max_chars)
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    while not collector.full:
+        chunk = stream.read(READ_CHUNK_SIZE)
+        if not chunk:
+            collector.add(decoder.decode(b'', final=True))
+            break
+        collector.add(decoder.decode(chunk))
+    return collector
+
+
+def extract_docx(stream, max_chars):
+    """Walk word/document.xml with iterparse instead of loading the whole tree"""
+    collector = _TextCollector(max_chars)
+    try:
+        archive = zipfile.ZipFile(stream)
+        document = archive.open('word/document.xml')
+    except (zipfile.BadZipFile, KeyError) as e:
+        raise ExtractionError(f"Not a valid .docx file: {e}")
+
+    with archive, document:
+        for event, element in ElementTree.iterparse(document, events=('end',)):
+            tag = element.tag
+            if tag == _WORD_NS + 't':
+                collector.add(element.text)
+            elif tag == _WORD_NS + 'tab':
+                collector.add('\t')
+            elif tag in (_WORD_NS + 'p', _WORD_NS + 'br'):
+                collector.add('\n')
+                element.clear()
+            if collector.full:
+                break
+    return collector
+
+
+def extract_pdf(stream, max_chars):
+    """Extract page text lazily, stopping once the budget is reached"""
+    if PdfReader is None:
+        raise ExtractionError("PDF support requires the 'pypdf' package")
+    collector = _TextCollector(max_chars)
+    try:
+        reader = PdfReader(stream)
+        for page in reader.pages:
+            collector.add(page.extract_text() or '')
+            collector.add('\n\n')
+            if collector.full:
+                break
+    except ExtractionError:
+        raise
+    except Exception as e:
+        raise ExtractionError(f"Could not read PDF: {e}")
+    return collector
+
+
+_DOC_TEXT_RUN = re.compile(rb'(?:[\x20-\x7e\r\n\t]\x00){4,}|[\x20-\x7e\r\n\t]{8,}')
+# Every byte that can occur inside a run (UTF-16 runs add the NUL high bytes)
+_DOC_RUN_BYTES = bytes(range(0x20, 0x7f)) + b'\r\n\t\x00'
+
+
+def _add_doc_runs(collector, data, end):
+    """Add the text runs found in ``data[:end]``"""
+    for match in _DOC_TEXT_RUN.finditer(data, 0, end):
+        run = match.group()
+        text = run.decode('utf-16-le', errors='ignore') if b'\x00' in run else run.decode('latin-1')
+        collector.add(text + ' ')
+        if collector.full:
+            break
+
+
+def extract_doc(stream, max_chars):
+    """Best-effort text from legacy binary .doc files by scanning for text runs"""
+    collector = _TextCollector(max_chars)
+    carry = b''
+    while not collector.full:
+        chunk = stream.read(READ_CHUNK_SIZE)
+        if not chunk:
+            _add_doc_runs(collector, carry, len(carry))
+            break
+        data = carry + chunk
+        # No run spans a byte that cannot be part of one, nor two NULs in a
+        # row (zero padding), so everything before the last such boundary is
+        # final; the rest may continue in the next read and is carried over
+        end = max(len(data.rstrip(_DOC_RUN_BYTES)), data.rfind(b'\x00\x00') + 1)
+        if len(data) - end > 2 * max_chars:
+            # A single run longer than the whole budget fills it already
+            end = len(data)
+        _add_doc_runs(collector, data, end)
+        carry = data[end:]
+    return collector
+
+
+EXTRACTORS = {
+    '.txt': extract_txt,
+    '.docx': extract_docx,
+    '.pdf': extract_pdf,
+    '.doc': extract_doc,
+}
+
+
+def extract_text(stream, filename, max_chars=None):
+    """Extract up to ``max_chars`` characters of text from an uploaded file.
+
+    ``stream`` must be a seekable binary file object such as the spooled
+    temporary file behind a werkzeug FileStorage. Returns a dict with the
+    text and whether it was truncated at the budget.
+    """
+    max_chars = max_chars or DEFAULT_MAX_CHARS
+    ext = os.path.splitext(filename)[1].lower()
+    extractor = EXTRACTORS.get(ext)
+    if extractor is None:
+        raise ExtractionError(f"Unsupported file type: {ext}")
+
+    stream.seek(0)
+    collector = extractor(stream, max_chars)
+    return {
+        'text': collector.text(),
+        'truncated': collector.full,
+    }
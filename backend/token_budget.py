@@ -0,0 +1,120 @@
+"""
+StudyVerse Token Budgets
+Daily OpenAI token allowances per signed-in user and per anonymous client
+IP, stored in the database, reserved before each call and settled against
+the usage the API reports
+"""
+
+import os
+import threading
+from collections import namedtuple
+from contextvars import ContextVar
+from datetime import datetime, timedelta, timezone
+from ai_concurrency import AIBusyError
+
+# Who an AI call is made for: the budget subject ("user:<id>" or
+# "ip:<address>") and the route it is attributed to in the histograms.
+# Set by the request (or job) and copied into worker threads.
+Caller = namedtuple('Caller', 'subject route')
+current_caller = ContextVar('ai_caller', default=None)
+
+Reservation = namedtuple('Reservation', 'subject day tokens')
+
+
+class TokenBudgetExceeded(AIBusyError):
+    """Raised when a caller's remaining daily budget cannot cover a call"""
+
+
+def utc_today():
+    return datetime.now(timezone.utc).date()
+
+def seconds_until_reset():
+    """Seconds until budgets roll over at midnight UTC"""
+    now = datetime.now(timezone.utc)
+    tomorrow = datetime.combine(now.date() + timedelta(days=1), datetime.min.time(), tzinfo=timezone.utc)
+    return max(1, int((tomorrow - now).total_seconds()))
+
+
+class TokenBudget:
+    """Per-subject daily token limits backed by the auth storage backend.
+
+    ``reserve`` charges a call's worst case (input estimate plus max_tokens)
+    atomically against the limit and ``settle`` corrects it to the real
+    usage, so concurrent calls cannot overshoot a budget. If the database
+    is unavailable calls are allowed through rather than failing.
+    """
+
+    def __init__(self, repository, user_limit, ip_limit, enabled=True):
+        self.repository = repository
+        self.user_limit = user_limit
+        self.ip_limit = ip_limit
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._stats = {'reserved': 0, 'rejected': 0, 'settled_tokens': 0, 'store_errors': 0}
+
+    def limit_for(self, subject):
+        return self.user_limit if subject.startswith('user:') else self.ip_limit
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._stats[name] += amount
+
+    def reserve(self, caller, tokens):
+        """Reserve ``tokens`` for ``caller`` or raise TokenBudgetExceeded; None if unmetered"""
+        if not self.enabled or caller is None:
+            return None
+        limit = self.limit_for(caller.subject)
+        if not limit:
+            return None
+        day = utc_today()
+        result = self.repository.reserve_token_usage(caller.subject, day, tokens, limit)
+        if result is None:
+            self._count('store_errors')
+            return None
+        if not result['allowed']:
+            self._count('rejected')
+            raise TokenBudgetExceeded(
+                f"Daily AI token budget exceeded ({result['tokens']:,} of {limit:,} tokens used today)",
+                retry_after=seconds_until_reset()
+            )
+        self._count('reserved')
+        return Reservation(caller.subject, day, tokens)
+
+    def settle(self, reservation, used):
+        """Replace a reservation with the tokens the call actually used"""
+        if reservation is None:
+            return
+        self._count('settled_tokens', used)
+        delta = used - reservation.tokens
+        if delta and self.repository.add_token_usage(reservation.subject, reservation.day, delta) is None:
+            self._count('store_errors')
+
+    def usage(self, subject):
+        """Today's usage, limit and remaining tokens for one subject"""
+        limit = self.limit_for(subject) if self.enabled else 0
+        used = self.repository.get_token_usage(subject, utc_today()) or 0
+        return {
+            'used': used,
+            'limit': limit or None,
+            'remaining': max(0, limit - used) if limit else None,
+            'resets_in': seconds_until_reset(),
+        }
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['enabled'] = self.enabled
+        stats['user_limit'] = self.user_limit
+        stats['ip_limit'] = self.ip_limit
+        return stats
+
+
+def token_budget_from_env():
+    """Build daily budgets from AI_TOKEN_BUDGET_* environment variables (0 = unlimited)"""
+    import auth
+    return TokenBudget(
+        auth,
+        user_limit=int(os.environ.get('AI_TOKEN_BUDGET_USER', 200000)),
+        ip_limit=int(os.environ.get('AI_TOKEN_BUDGET_IP', 50000)),
+        enabled=os.environ.get('AI_TOKEN_BUDGET_ENABLED', 'true').lower() in ('1', 'true', 'yes'),
+    )
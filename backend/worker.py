@@ -0,0 +1,14 @@
+"""
+StudyVerse Job Worker
+Runs the background analysis queue in a dedicated process:
+
+    JOB_WORKERS=4 python worker.py
+
+Jobs are shared with the web service through the Postgres or SQLite job table.
+"""
+
+from main import job_queue
+
+if __name__ == '__main__':
+    print(f"🚀 Job worker started ({job_queue.workers} threads, {job_queue.store.name} store)")
+    job_queue.run_forever()
@@ -46,7 +46,7 @@ const Dashboard = () => {
       if (response.ok) {
         const data = await response.json();
         setProgress(data.progress);
-        calculateStats(data.progress);
+        calculateStats(data.progress, data.stats);
       }
     } catch (error) {
       console.error('Failed to fetch progress:', error);
@@ -55,15 +55,16 @@ const Dashboard = () => {
     }
   };
 
-  const calculateStats = (progressData) => {
+  const calculateStats = (progressData, serverStats) => {
     if (!progressData.length) return;
 
-    const totalSessions = progressData.length;
+    // Prefer the server's all-time totals; the list only holds recent activity
+    const totalSessions = serverStats?.total_sessions ?? progressData.length;
     const totalTime = progressData.reduce((sum, item) => sum + (item.duration || 5), 0); // Assume 5 min per session
     const scoresWithValues = progressData.filter(item => item.score !== null);
-    const averageScore = scoresWithValues.length > 0 
+    const averageScore = serverStats?.average_score ?? (scoresWithValues.length > 0 
       ? scoresWithValues.reduce((sum, item) => sum + item.score, 0) / scoresWithValues.length 
-      : 0;
+      : 0);
 
     // Calculate streak (consecutive days with activity)
     const today = new Date();
@@ -18,6 +18,7 @@ import {
   AlertTriangle,
   Lightbulb
 } from 'lucide-react';
+import { waitForJob } from '../lib/jobs';
 
 const ReportCardAnalysis = ({ onAnalysisComplete }) => {
   const [file, setFile] = useState(null);
@@ -76,7 +77,11 @@ const ReportCardAnalysis = ({ onAnalysisComplete }) => {
         throw new Error('Analysis failed');
       }
 
-      const result = await response.json();
+      let result = await response.json();
+      if (response.status === 202) {
+        // Analysis runs in the background; poll until it is ready
+        result = await waitForJob(API_BASE_URL, result.job_id);
+      }
       setAnalysisData(result.analysis);
       setUploadStatus('success');
       
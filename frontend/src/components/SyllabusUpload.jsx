@@ -13,6 +13,7 @@ import {
   Calendar,
   GraduationCap
 } from 'lucide-react';
+import { waitForJob } from '../lib/jobs';
 
 const SyllabusUpload = ({ onSyllabusUploaded }) => {
   const [file, setFile] = useState(null);
@@ -71,7 +72,11 @@ const SyllabusUpload = ({ onSyllabusUploaded }) => {
         throw new Error('Upload failed');
       }
 
-      const result = await response.json();
+      let result = await response.json();
+      if (response.status === 202) {
+        // Analysis runs in the background; poll until it is ready
+        result = await waitForJob(API_BASE_URL, result.job_id);
+      }
       setSyllabusData(result.syllabus_data);
       setUploadStatus('success');
       
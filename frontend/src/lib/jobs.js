@@ -0,0 +1,28 @@
+// Polls a background analysis job until it completes or fails
+export async function waitForJob(apiBaseUrl, jobId, { intervalMs = 2000, timeoutMs = 180000 } = {}) {
+  const deadline = Date.now() + timeoutMs;
+
+  while (Date.now() < deadline) {
+    const response = await fetch(`${apiBaseUrl}/api/jobs/${jobId}`, {
+      headers: {
+        'Authorization': `Bearer ${localStorage.getItem('token')}`
+      }
+    });
+
+    if (!response.ok) {
+      throw new Error('Failed to fetch job status');
+    }
+
+    const { job } = await response.json();
+    if (job.status === 'completed') {
+      return job.result;
+    }
+    if (job.status === 'failed') {
+      throw new Error(job.error || 'Analysis failed');
+    }
+
+    await new Promise((resolve) => setTimeout(resolve, intervalMs));
+  }
+
+  throw new Error('Analysis timed out');
+}